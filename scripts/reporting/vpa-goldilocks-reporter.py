@@ -14,11 +14,16 @@ Usage:
 import argparse
 import json
 import logging
+import random
+import sqlite3
+import statistics
 import sys
+import time
 import warnings
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Tuple
 import yaml
 
 # Suppress SSL warnings for self-signed certificates
@@ -28,6 +33,7 @@ urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 try:
     from kubernetes import client, config
     from kubernetes.client.rest import ApiException
+    from kubernetes.utils import parse_quantity
 except ImportError:
     print("Error: kubernetes package not found. Install with: pip install kubernetes")
     sys.exit(1)
@@ -35,7 +41,7 @@ except ImportError:
 try:
     from rich.console import Console
     from rich.table import Table
-    from rich.progress import track
+    from rich.progress import Progress
     from rich import print as rprint
 except ImportError:
     print("Error: rich package not found. Install with: pip install rich")
@@ -45,32 +51,79 @@ except ImportError:
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+VPA_GROUP = "autoscaling.k8s.io"
+VPA_VERSION = "v1"
+VPA_PLURAL = "verticalpodautoscalers"
+DEFAULT_PAGE_SIZE = 500
+DEFAULT_PARALLEL = 8
+
+# Backoff for 429 Too Many Requests (API priority and fairness)
+MAX_RETRIES = 6
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 30.0
+
+# Files written by --dump, one kubectl-style List per resource
+DUMP_FILES = {
+    'VerticalPodAutoscaler': ('verticalpodautoscalers.json', f"{VPA_GROUP}/{VPA_VERSION}"),
+    'Deployment': ('deployments.json', 'apps/v1'),
+    'StatefulSet': ('statefulsets.json', 'apps/v1'),
+    'DaemonSet': ('daemonsets.json', 'apps/v1'),
+}
+
+DEFAULT_HISTORY_DB = "vpa-history.db"
+DEFAULT_TREND_DAYS = 30
+DEFAULT_DRIFT_THRESHOLD = 10.0
+
+# VPA target kinds -> AppsV1Api list methods (all namespaces, single namespace)
+WORKLOAD_LIST_METHODS = {
+    'Deployment': ('list_deployment_for_all_namespaces', 'list_namespaced_deployment'),
+    'StatefulSet': ('list_stateful_set_for_all_namespaces', 'list_namespaced_stateful_set'),
+    'DaemonSet': ('list_daemon_set_for_all_namespaces', 'list_namespaced_daemon_set'),
+}
+
 class VPARecommendationReporter:
     """Main class for generating VPA resource recommendation reports."""
 
-    def __init__(self, kubeconfig_path: Optional[str] = None, insecure: bool = False):
-        """Initialize the reporter with Kubernetes configuration."""
+    def __init__(self, kubeconfig_path: Optional[str] = None, insecure: bool = False,
+                 page_size: int = DEFAULT_PAGE_SIZE, parallel: int = DEFAULT_PARALLEL,
+                 from_dump: Optional[str] = None):
+        """Initialize the reporter with Kubernetes configuration, or offline from a dump directory."""
         self.console = Console()
+        self.page_size = page_size
+        self.parallel = max(1, parallel)
+        self.workloads: Dict[Tuple[str, str, str], Dict] = {}
+        self.raw_vpas: List[Dict] = []
+        self.dump_vpas: Optional[List[Dict]] = None
         self.k8s_client = None
         self.custom_objects_api = None
+        self.cluster_name = 'in-cluster'
+
+        if from_dump:
+            self._load_dump(from_dump)
+            return
 
         # Load Kubernetes configuration
         try:
             if kubeconfig_path:
                 config.load_kube_config(config_file=kubeconfig_path)
+                self.cluster_name = self._kubeconfig_cluster_name(kubeconfig_path)
             else:
                 try:
                     config.load_incluster_config()
                 except config.ConfigException:
                     config.load_kube_config()
+                    self.cluster_name = self._kubeconfig_cluster_name()
+
+            configuration = client.Configuration.get_default_copy()
+            # One pooled connection per parallel request
+            configuration.connection_pool_maxsize = max(configuration.connection_pool_maxsize or 0, self.parallel)
 
             # Configure SSL verification if needed
             if insecure:
                 # Disable SSL verification for self-signed certificates
-                configuration = client.Configuration.get_default_copy()
                 configuration.verify_ssl = False
                 configuration.ssl_ca_cert = None
-                client.Configuration.set_default(configuration)
+            client.Configuration.set_default(configuration)
 
             self.k8s_client = client.ApiClient()
             self.custom_objects_api = client.CustomObjectsApi()
@@ -82,6 +135,12 @@ class VPARecommendationReporter:
             logger.error(f"Failed to connect to Kubernetes: {e}")
             raise
 
+    @staticmethod
+    def _kubeconfig_cluster_name(kubeconfig_path: Optional[str] = None) -> str:
+        """Name of the cluster in the active kubeconfig context."""
+        _, active_context = config.list_kube_config_contexts(config_file=kubeconfig_path)
+        return active_context.get('context', {}).get('cluster') or active_context.get('name', 'unknown')
+
     @staticmethod
     def format_resource_value(value: str, resource_type: str) -> str:
         """Format resource values to standard Kubernetes formats."""
@@ -196,39 +255,197 @@ class VPARecommendationReporter:
                 return f"{int((mem_gb + 1) // 2 * 2)}Gi"  # Round to nearest 2Gi
 
     def get_vpa_recommendations(self, namespace: Optional[str] = None) -> List[Dict]:
-        """Fetch VPA recommendations from the cluster."""
-        vpas = []
+        """Fetch VPA recommendations from the cluster.
+
+        All namespaces are read with a single paginated cluster-scoped LIST. Only
+        when RBAC forbids that (403) does it fall back to listing each namespace
+        the caller can see.
+        """
+        if self.dump_vpas is not None:
+            raw_vpas = [vpa for vpa in self.dump_vpas
+                        if not namespace or vpa.get('metadata', {}).get('namespace') == namespace]
+            return self._process_vpas(raw_vpas)
 
         try:
             if namespace:
-                namespaces = [namespace]
+                raw_vpas = self._list_namespaced_vpas(namespace)
             else:
-                # Get all namespaces
-                ns_response = self.core_v1.list_namespace()
-                namespaces = [ns.metadata.name for ns in ns_response.items]
-
-            for ns in track(namespaces, description="Fetching VPA recommendations..."):
                 try:
-                    vpa_response = self.custom_objects_api.list_namespaced_custom_object(
-                        group="autoscaling.k8s.io",
-                        version="v1",
-                        namespace=ns,
-                        plural="verticalpodautoscalers"
+                    raw_vpas = self._list_paginated(
+                        self.custom_objects_api.list_cluster_custom_object,
+                        group=VPA_GROUP,
+                        version=VPA_VERSION,
+                        plural=VPA_PLURAL
                     )
-
-                    for vpa in vpa_response.get('items', []):
-                        vpas.append(self._process_vpa(vpa, ns))
-
                 except ApiException as e:
-                    if e.status != 404:  # Ignore namespaces without VPAs
-                        logger.warning(f"Could not fetch VPAs from namespace {ns}: {e}")
+                    if e.status != 403:
+                        raise
+                    logger.info("Cluster-wide VPA list forbidden, falling back to per-namespace requests")
+                    raw_vpas = self._list_vpas_per_namespace()
 
         except Exception as e:
             logger.error(f"Error fetching VPA recommendations: {e}")
             raise
 
+        logger.debug(f"Fetched {len(raw_vpas)} VPAs")
+        self.load_workloads(raw_vpas, namespace)
+        return self._process_vpas(raw_vpas)
+
+    def _process_vpas(self, raw_vpas: List[Dict]) -> List[Dict]:
+        """Join raw VPAs with the workload index; no API calls are made."""
+        self.raw_vpas = raw_vpas
+        started = time.perf_counter()
+        vpas = [self._process_vpa(vpa, vpa.get('metadata', {}).get('namespace')) for vpa in raw_vpas]
+        logger.debug(f"Processed {len(vpas)} VPAs in {(time.perf_counter() - started) * 1000:.1f}ms")
         return vpas
 
+    def _load_dump(self, directory: str) -> None:
+        """Load VPAs and workloads from JSON or YAML files captured with `kubectl get -o json|yaml`.
+
+        Files may hold a List (kubectl output), a typed list such as
+        DeploymentList (raw API response), single objects, or several YAML
+        documents. Objects of other kinds are ignored.
+        """
+        dump_dir = Path(directory)
+        if not dump_dir.is_dir():
+            raise FileNotFoundError(f"Dump directory not found: {directory}")
+
+        self.cluster_name = dump_dir.resolve().name
+        self.dump_vpas = []
+        for path in sorted(dump_dir.iterdir()):
+            if path.suffix == '.json':
+                with path.open() as f:
+                    documents = [json.load(f)]
+            elif path.suffix in ['.yaml', '.yml']:
+                with path.open() as f:
+                    documents = list(yaml.safe_load_all(f))
+            else:
+                continue
+
+            for document in documents:
+                if not isinstance(document, dict):
+                    continue
+                document_kind = document.get('kind', '')
+                if document_kind.endswith('List'):
+                    # Items of typed lists (DeploymentList) carry no kind of their own
+                    item_kind = document_kind[:-len('List')] or None
+                    objects = [{'kind': item_kind, **item} for item in document.get('items') or []]
+                else:
+                    objects = [document]
+
+                for obj in objects:
+                    kind = obj.get('kind')
+                    metadata = obj.get('metadata', {})
+                    if kind == 'VerticalPodAutoscaler':
+                        self.dump_vpas.append(obj)
+                    elif kind in WORKLOAD_LIST_METHODS:
+                        self.workloads[(kind, metadata.get('namespace'), metadata.get('name'))] = obj
+
+        logger.info(f"Loaded {len(self.dump_vpas)} VPAs and {len(self.workloads)} workloads from {directory}")
+
+    def write_dump(self, directory: str) -> None:
+        """Write the raw VPAs and workloads of the last fetch as kubectl-style Lists, readable by --from-dump."""
+        dump_dir = Path(directory)
+        dump_dir.mkdir(parents=True, exist_ok=True)
+
+        objects: Dict[str, List[Dict]] = {kind: [] for kind in DUMP_FILES}
+        objects['VerticalPodAutoscaler'] = self.raw_vpas
+        for (kind, _, _), workload in sorted(self.workloads.items(), key=lambda entry: entry[0]):
+            objects[kind].append(workload)
+
+        for kind, (filename, api_version) in DUMP_FILES.items():
+            dump = {
+                'apiVersion': 'v1',
+                'kind': 'List',
+                'metadata': {'resourceVersion': ''},
+                # Typed API lists omit kind and apiVersion on their items; kubectl adds them back
+                'items': [{'apiVersion': api_version, 'kind': kind, **item} for item in objects[kind]]
+            }
+            with (dump_dir / filename).open('w') as f:
+                json.dump(dump, f, indent=2, default=str)
+
+        self.console.print(f"[green]Cluster dump written: {directory}[/green]")
+
+    def _list_paginated(self, list_func, **kwargs) -> List[Dict]:
+        """Call a LIST function page by page and return every item as a plain dict.
+
+        Typed responses (e.g. V1DeploymentList) are converted to the same
+        camelCase dicts the API returns for custom objects.
+        """
+        items = []
+        continue_token = None
+        while True:
+            if continue_token:
+                kwargs['_continue'] = continue_token
+            response = self._call_with_backoff(list_func, limit=self.page_size, **kwargs)
+            if not isinstance(response, dict):
+                response = self.k8s_client.sanitize_for_serialization(response)
+            items.extend(response.get('items', []))
+            continue_token = response.get('metadata', {}).get('continue')
+            if not continue_token:
+                return items
+
+    @staticmethod
+    def _call_with_backoff(func, **kwargs):
+        """Call an API function, backing off and retrying while the server answers 429.
+
+        The API server's priority and fairness rejects excess requests with 429
+        and usually a Retry-After header, which is honoured; otherwise the delay
+        grows exponentially with jitter.
+        """
+        for attempt in range(MAX_RETRIES + 1):
+            try:
+                return func(**kwargs)
+            except ApiException as e:
+                if e.status != 429 or attempt == MAX_RETRIES:
+                    raise
+                retry_after = (e.headers or {}).get('Retry-After')
+                try:
+                    delay = float(retry_after)
+                except (TypeError, ValueError):
+                    delay = BACKOFF_BASE_SECONDS * 2 ** attempt
+                delay = min(BACKOFF_MAX_SECONDS, delay) * random.uniform(1.0, 1.2)
+                logger.debug(f"API server throttled {func.__name__}, retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+    def _map_namespaces(self, namespaces: List[str], func, description: str) -> List[Dict]:
+        """Run func(namespace) for each namespace on up to `parallel` threads.
+
+        Results are concatenated in namespace order; the progress bar advances as
+        each namespace completes.
+        """
+        results: Dict[str, List[Dict]] = {}
+        with Progress(console=self.console, transient=True) as progress:
+            task = progress.add_task(description, total=len(namespaces))
+            with ThreadPoolExecutor(max_workers=self.parallel) as executor:
+                futures = {executor.submit(func, ns): ns for ns in namespaces}
+                for future in as_completed(futures):
+                    results[futures[future]] = future.result()
+                    progress.advance(task)
+
+        return [item for ns in namespaces for item in results[ns]]
+
+    def _list_namespaced_vpas(self, namespace: str) -> List[Dict]:
+        """List the VPAs of one namespace; a namespace without VPAs yields none."""
+        try:
+            return self._list_paginated(
+                self.custom_objects_api.list_namespaced_custom_object,
+                group=VPA_GROUP,
+                version=VPA_VERSION,
+                namespace=namespace,
+                plural=VPA_PLURAL
+            )
+        except ApiException as e:
+            if e.status != 404:  # Ignore namespaces without VPAs
+                logger.warning(f"Could not fetch VPAs from namespace {namespace}: {e}")
+            return []
+
+    def _list_vpas_per_namespace(self) -> List[Dict]:
+        """List VPAs one namespace at a time, for callers without cluster-wide access."""
+        namespaces = [ns['metadata']['name'] for ns in self._list_paginated(self.core_v1.list_namespace)]
+
+        return self._map_namespaces(namespaces, self._list_namespaced_vpas, "Fetching VPA recommendations...")
+
     def _process_vpa(self, vpa: Dict, namespace: str) -> Dict:
         """Process a single VPA object and extract relevant information."""
         metadata = vpa.get('metadata', {})
@@ -276,35 +493,67 @@ class VPARecommendationReporter:
             'conditions': status.get('conditions', [])
         }
 
-    def _get_current_resources(self, namespace: str, kind: str, name: str) -> Dict:
-        """Get current resource configuration for the target workload."""
-        try:
-            if kind == 'Deployment':
-                deployment = self.apps_v1.read_namespaced_deployment(name, namespace)
-                containers = deployment.spec.template.spec.containers
-            elif kind == 'StatefulSet':
-                statefulset = self.apps_v1.read_namespaced_stateful_set(name, namespace)
-                containers = statefulset.spec.template.spec.containers
-            elif kind == 'DaemonSet':
-                daemonset = self.apps_v1.read_namespaced_daemon_set(name, namespace)
-                containers = daemonset.spec.template.spec.containers
-            else:
-                return {}
-
-            current_resources = {}
-            for container in containers:
-                resources = container.resources
-                current_resources[container.name] = {
-                    'requests': resources.requests or {},
-                    'limits': resources.limits or {}
-                }
+    def load_workloads(self, vpas: List[Dict], namespace: Optional[str] = None) -> None:
+        """Index the workloads targeted by the given VPAs by (kind, namespace, name).
 
-            return current_resources
+        Each targeted kind is listed once, cluster-wide (or in `namespace`), so
+        VPA processing needs no further API calls. If the cluster-wide list is
+        forbidden, only the namespaces that contain VPAs are listed.
+        """
+        targets: Dict[str, set] = {}
+        for vpa in vpas:
+            kind = vpa.get('spec', {}).get('targetRef', {}).get('kind')
+            if kind in WORKLOAD_LIST_METHODS:
+                targets.setdefault(kind, set()).add(vpa.get('metadata', {}).get('namespace'))
 
-        except Exception as e:
-            logger.warning(f"Could not fetch current resources for {kind}/{name} in {namespace}: {e}")
+        for kind, vpa_namespaces in targets.items():
+            all_namespaces_method, namespaced_method = WORKLOAD_LIST_METHODS[kind]
+            try:
+                if namespace:
+                    items = self._list_paginated(getattr(self.apps_v1, namespaced_method), namespace=namespace)
+                else:
+                    try:
+                        items = self._list_paginated(getattr(self.apps_v1, all_namespaces_method))
+                    except ApiException as e:
+                        if e.status != 403:
+                            raise
+                        logger.info(f"Cluster-wide {kind} list forbidden, listing {len(vpa_namespaces)} namespaces")
+                        list_func = getattr(self.apps_v1, namespaced_method)
+                        items = self._map_namespaces(
+                            sorted(vpa_namespaces),
+                            lambda ns: self._list_paginated(list_func, namespace=ns),
+                            f"Fetching {kind} workloads..."
+                        )
+            except ApiException as e:
+                logger.warning(f"Could not list {kind} workloads: {e}")
+                continue
+
+            for item in items:
+                metadata = item.get('metadata', {})
+                self.workloads[(kind, metadata.get('namespace'), metadata.get('name'))] = item
+            logger.debug(f"Indexed {len(items)} {kind} workloads")
+
+    def _get_current_resources(self, namespace: str, kind: str, name: str) -> Dict:
+        """Get current resource configuration for the target workload from the workload index."""
+        if kind not in WORKLOAD_LIST_METHODS:
+            return {}
+
+        workload = self.workloads.get((kind, namespace, name))
+        if workload is None:
+            logger.warning(f"Could not find current resources for {kind}/{name} in {namespace}")
             return {}
 
+        containers = workload.get('spec', {}).get('template', {}).get('spec', {}).get('containers', [])
+        current_resources = {}
+        for container in containers:
+            resources = container.get('resources') or {}
+            current_resources[container.get('name')] = {
+                'requests': resources.get('requests') or {},
+                'limits': resources.get('limits') or {}
+            }
+
+        return current_resources
+
     def generate_console_report(self, vpas: List[Dict]) -> None:
         """Generate a console report using Rich tables."""
         if not vpas:
@@ -524,6 +773,227 @@ kubectl patch {target['kind'].lower()} {target['name']} -n {namespace} --type='j
         self.console.print(f"[green]Kubectl patch commands generated: {output_path}[/green]")
 
 
+class RecommendationHistory:
+    """SQLite store of recorded VPA recommendations for trend analysis.
+
+    Each --record run adds one row per container, with CPU normalized to
+    millicores and memory to bytes, indexed by cluster, namespace, workload,
+    container and timestamp.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS recommendations (
+            cluster TEXT NOT NULL,
+            namespace TEXT NOT NULL,
+            workload_kind TEXT,
+            workload TEXT NOT NULL,
+            container TEXT NOT NULL,
+            recorded_at TEXT NOT NULL,
+            cpu_lower_m REAL,
+            cpu_target_m REAL,
+            cpu_upper_m REAL,
+            cpu_request_m REAL,
+            memory_lower_bytes REAL,
+            memory_target_bytes REAL,
+            memory_upper_bytes REAL,
+            memory_request_bytes REAL
+        );
+        CREATE INDEX IF NOT EXISTS recommendations_series
+            ON recommendations (cluster, namespace, workload, container, recorded_at);
+        CREATE INDEX IF NOT EXISTS recommendations_recorded_at
+            ON recommendations (recorded_at);
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.row_factory = sqlite3.Row
+        self.db.executescript(self.SCHEMA)
+
+    def close(self) -> None:
+        self.db.close()
+
+    @staticmethod
+    def _quantity(value: Optional[str], resource_type: str) -> Optional[float]:
+        """Parse a Kubernetes quantity into millicores (cpu) or bytes (memory)."""
+        if value in ['N/A', '', None]:
+            return None
+        try:
+            quantity = parse_quantity(value)
+        except (ValueError, TypeError):
+            return None
+        return float(quantity * 1000) if resource_type == 'cpu' else float(quantity)
+
+    def record(self, vpas: List[Dict], cluster: str, recorded_at: Optional[datetime] = None) -> int:
+        """Append the recommendations of one run and return the number of rows written."""
+        timestamp = (recorded_at or datetime.now(timezone.utc)).isoformat(timespec='seconds')
+        rows = []
+        for vpa in vpas:
+            for container_name, rec in vpa['recommendations'].items():
+                requests = vpa['currentResources'].get(container_name, {}).get('requests', {})
+                rows.append((
+                    cluster, vpa['namespace'], vpa['target']['kind'], vpa['target']['name'], container_name,
+                    timestamp,
+                    self._quantity(rec['lowerBound'].get('cpu'), 'cpu'),
+                    self._quantity(rec['target'].get('cpu'), 'cpu'),
+                    self._quantity(rec['upperBound'].get('cpu'), 'cpu'),
+                    self._quantity(requests.get('cpu'), 'cpu'),
+                    self._quantity(rec['lowerBound'].get('memory'), 'memory'),
+                    self._quantity(rec['target'].get('memory'), 'memory'),
+                    self._quantity(rec['upperBound'].get('memory'), 'memory'),
+                    self._quantity(requests.get('memory'), 'memory'),
+                ))
+
+        with self.db:
+            self.db.executemany(
+                "INSERT INTO recommendations VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        return len(rows)
+
+    @staticmethod
+    def _percentile(values: List[float], percentile: float) -> Optional[float]:
+        """Percentile with linear interpolation between the closest ranks."""
+        if not values:
+            return None
+        values = sorted(values)
+        position = (len(values) - 1) * percentile / 100
+        lower = int(position)
+        upper = min(lower + 1, len(values) - 1)
+        return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+    @classmethod
+    def _series_trend(cls, samples: List[Optional[float]], threshold: float) -> Dict:
+        """p50/p95 of a series of targets and the drift of its median over the window.
+
+        Drift compares the median of the most recent half of the samples with
+        the median of the earlier half, in percent.
+        """
+        values = [value for value in samples if value is not None]
+        trend = {
+            'p50': cls._percentile(values, 50),
+            'p95': cls._percentile(values, 95),
+            'latest': values[-1] if values else None,
+            'driftPercent': None,
+            'stable': None
+        }
+        if len(values) >= 2:
+            half = len(values) // 2
+            earlier = statistics.median(values[:half])
+            recent = statistics.median(values[-half:])
+            if earlier:
+                trend['driftPercent'] = round((recent - earlier) / earlier * 100, 1)
+                trend['stable'] = abs(trend['driftPercent']) <= threshold
+        return trend
+
+    def trends(self, cluster: Optional[str] = None, namespace: Optional[str] = None,
+               days: int = DEFAULT_TREND_DAYS, threshold: float = DEFAULT_DRIFT_THRESHOLD) -> List[Dict]:
+        """Per-container p50/p95 of the recorded CPU and memory targets over the last `days`."""
+        since = (datetime.now(timezone.utc) - timedelta(days=days)).isoformat(timespec='seconds')
+        query = "SELECT * FROM recommendations WHERE recorded_at >= ?"
+        params: List[Any] = [since]
+        if cluster:
+            query += " AND cluster = ?"
+            params.append(cluster)
+        if namespace:
+            query += " AND namespace = ?"
+            params.append(namespace)
+        query += " ORDER BY cluster, namespace, workload, container, recorded_at"
+
+        series: Dict[Tuple[str, str, str, str], List[sqlite3.Row]] = {}
+        for row in self.db.execute(query, params):
+            series.setdefault((row['cluster'], row['namespace'], row['workload'], row['container']), []).append(row)
+
+        trends = []
+        for (cluster_name, ns, workload, container), rows in series.items():
+            latest = rows[-1]
+            trends.append({
+                'cluster': cluster_name,
+                'namespace': ns,
+                'workload': {'kind': latest['workload_kind'], 'name': workload},
+                'container': container,
+                'samples': len(rows),
+                'firstRecorded': rows[0]['recorded_at'],
+                'lastRecorded': latest['recorded_at'],
+                'cpu': {
+                    **self._series_trend([row['cpu_target_m'] for row in rows], threshold),
+                    'request': latest['cpu_request_m']
+                },
+                'memory': {
+                    **self._series_trend([row['memory_target_bytes'] for row in rows], threshold),
+                    'request': latest['memory_request_bytes']
+                }
+            })
+        return trends
+
+    @staticmethod
+    def format_cpu(millicores: Optional[float]) -> str:
+        return 'N/A' if millicores is None else f"{millicores:.0f}m"
+
+    @staticmethod
+    def format_memory(memory_bytes: Optional[float]) -> str:
+        return 'N/A' if memory_bytes is None else f"{memory_bytes / (1024 * 1024):.0f}Mi"
+
+    @staticmethod
+    def format_drift(trend: Dict) -> str:
+        if trend['driftPercent'] is None:
+            return 'N/A'
+        style = 'green' if trend['stable'] else 'red'
+        return f"[{style}]{trend['driftPercent']:+.1f}%[/{style}]"
+
+    def generate_console_trend_report(self, trends: List[Dict], console: Console) -> None:
+        """Print recorded recommendation trends as a Rich table."""
+        if not trends:
+            console.print("[yellow]No recorded VPA recommendations found. Record some runs with --record.[/yellow]")
+            return
+
+        table = Table(title="VPA Recommendation Trends")
+        table.add_column("Workload", style="cyan")
+        table.add_column("Container", style="green")
+        table.add_column("Samples", justify="right")
+        table.add_column("CPU p50 / p95", justify="right")
+        table.add_column("CPU Drift", justify="right")
+        table.add_column("Memory p50 / p95", justify="right")
+        table.add_column("Memory Drift", justify="right")
+        table.add_column("Current Request", style="yellow")
+
+        for trend in trends:
+            cpu, memory = trend['cpu'], trend['memory']
+            table.add_row(
+                f"{trend['namespace']}/{trend['workload']['name']}",
+                trend['container'],
+                str(trend['samples']),
+                f"{self.format_cpu(cpu['p50'])} / {self.format_cpu(cpu['p95'])}",
+                self.format_drift(cpu),
+                f"{self.format_memory(memory['p50'])} / {self.format_memory(memory['p95'])}",
+                self.format_drift(memory),
+                f"{self.format_cpu(cpu['request'])} / {self.format_memory(memory['request'])}"
+            )
+
+        console.print(table)
+
+    def generate_trend_file(self, trends: List[Dict], output_format: str, output_path: str,
+                            days: int, console: Console) -> None:
+        """Write recorded recommendation trends as JSON or YAML."""
+        report = {
+            'metadata': {
+                'generatedAt': datetime.now().isoformat(),
+                'windowDays': days,
+                'totalSeries': len(trends),
+                'units': {'cpu': 'millicores', 'memory': 'bytes'},
+                'generator': 'vpa-goldilocks-reporter'
+            },
+            'trends': trends
+        }
+
+        output_file = Path(output_path)
+        with output_file.open('w') as f:
+            if output_format == 'json':
+                json.dump(report, f, indent=2, default=str)
+            else:
+                yaml.dump(report, f, indent=2, default_flow_style=False)
+
+        console.print(f"[green]{output_format.upper()} trend report generated: {output_path}[/green]")
+
+
 def main():
     """Main entry point for the script."""
     parser = argparse.ArgumentParser(
@@ -537,6 +1007,10 @@ Examples:
   %(prog)s --format yaml --output vpa-report.yaml --kubeconfig ~/.kube/config
   %(prog)s --format kubectl --output apply-recommendations.sh
   %(prog)s --format console --insecure  # For clusters with self-signed certificates
+  %(prog)s --record --history-db vpa-history.db  # Report and append to the history store
+  %(prog)s --trend --trend-days 14 --namespace media
+  %(prog)s --dump ./cluster-dump  # Save the raw API objects while reporting
+  %(prog)s --from-dump ./cluster-dump --format markdown --output report.md  # No cluster needed
         """
     )
 
@@ -562,6 +1036,69 @@ Examples:
         help='Path to kubeconfig file (default: use in-cluster or default kubeconfig)'
     )
 
+    parser.add_argument(
+        '--page-size',
+        type=int,
+        default=DEFAULT_PAGE_SIZE,
+        help=f'Objects per page when listing from the API server (default: {DEFAULT_PAGE_SIZE})'
+    )
+
+    parser.add_argument(
+        '--parallel',
+        type=int,
+        default=DEFAULT_PARALLEL,
+        help=f'Concurrent API requests when namespaces must be listed one by one (default: {DEFAULT_PARALLEL})'
+    )
+
+    parser.add_argument(
+        '--dump',
+        metavar='DIR',
+        help='Also write the raw VPA and workload objects to DIR for later --from-dump runs'
+    )
+
+    parser.add_argument(
+        '--from-dump',
+        metavar='DIR',
+        help='Read VPAs and workloads from kubectl get -o json/yaml files in DIR instead of the cluster'
+    )
+
+    parser.add_argument(
+        '--record',
+        action='store_true',
+        help='Append this run\'s recommendations to the history database'
+    )
+
+    parser.add_argument(
+        '--trend',
+        action='store_true',
+        help='Report p50/p95 and drift of recorded recommendations instead of querying the cluster'
+    )
+
+    parser.add_argument(
+        '--history-db',
+        default=DEFAULT_HISTORY_DB,
+        help=f'SQLite history database for --record and --trend (default: {DEFAULT_HISTORY_DB})'
+    )
+
+    parser.add_argument(
+        '--cluster',
+        help='Cluster name to record under or filter trends by (default: current kubeconfig cluster; all for --trend)'
+    )
+
+    parser.add_argument(
+        '--trend-days',
+        type=int,
+        default=DEFAULT_TREND_DAYS,
+        help=f'Days of history included in --trend (default: {DEFAULT_TREND_DAYS})'
+    )
+
+    parser.add_argument(
+        '--drift-threshold',
+        type=float,
+        default=DEFAULT_DRIFT_THRESHOLD,
+        help=f'Median drift in percent above which a trend is flagged as unstable (default: {DEFAULT_DRIFT_THRESHOLD:g})'
+    )
+
     parser.add_argument(
         '--verbose', '-v',
         action='store_true',
@@ -593,10 +1130,40 @@ Examples:
     if args.format != 'console' and not args.output:
         parser.error(f"--output is required when using --format {args.format}")
 
+    if args.dump and args.from_dump:
+        parser.error("--dump and --from-dump cannot be combined")
+
+    if args.trend:
+        if args.record:
+            parser.error("--trend and --record cannot be combined")
+        if args.format not in ['console', 'json', 'yaml']:
+            parser.error("--trend supports --format console, json or yaml")
+
     try:
-        reporter = VPARecommendationReporter(args.kubeconfig, args.insecure)
+        if args.trend:
+            history = RecommendationHistory(args.history_db)
+            trends = history.trends(args.cluster, args.namespace, args.trend_days, args.drift_threshold)
+            if args.format == 'console':
+                history.generate_console_trend_report(trends, Console())
+            else:
+                history.generate_trend_file(trends, args.format, args.output, args.trend_days, Console())
+            history.close()
+            return
+
+        reporter = VPARecommendationReporter(args.kubeconfig, args.insecure, args.page_size, args.parallel,
+                                             args.from_dump)
         vpas = reporter.get_vpa_recommendations(args.namespace)
 
+        if args.dump:
+            reporter.write_dump(args.dump)
+
+        if args.record:
+            history = RecommendationHistory(args.history_db)
+            cluster = args.cluster or reporter.cluster_name
+            recorded = history.record(vpas, cluster)
+            history.close()
+            logger.info(f"Recorded {recorded} container recommendations for cluster {cluster} in {args.history_db}")
+
         if args.format == 'console':
             reporter.generate_console_report(vpas)
         elif args.format == 'json':
@@ -4,11 +4,29 @@ Glue Worker: Flask webhook orchestrator for Paperless document pipeline
 Routes documents through GPT processing and AI reindexing
 """
 import os
+import json
+import time
 import logging
-from flask import Flask, request, jsonify
+import dataclasses
+from flask import Flask, Response, g, request, jsonify, stream_with_context
 import requests
+import urllib3
+from prometheus_client import CONTENT_TYPE_LATEST
 from datetime import datetime
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
+
+import metrics
+from batch import BatchCheckpoint, new_batch_id, resolve_document_ids, run_batch
+from batcher import MicroBatcher
+from breaker import CircuitBreaker, CircuitOpenError, STATE_VALUES, all_stats as breaker_stats
+from deadletter import DeadLetterStore, PIPELINE_STEP, STATUS_PENDING, entry_to_dict
+from dedupe import Deduplicator, RecentEvents, SQLiteRecentEvents, DECISION_QUEUED
+from jobqueue import (JobQueue, LANE_BACKFILL, LANE_INTERACTIVE, STATUS_COMPLETED, STATUS_FAILED,
+                      create_job_store, job_to_dict, parse_lane_settings)
+from pipeline import PipelineExecutor, PipelineStep, STATUS_QUEUED
+from ratelimit import TokenBucket
+from steps import StepSpec, build_steps, load_step_specs, register_step_type
+from upstream import UpstreamClient, all_stats as upstream_stats
 
 # Configure logging
 logging.basicConfig(
@@ -26,6 +44,132 @@ PAPERLESS_AI_URL = os.getenv('PAPERLESS_AI_URL', 'http://paperless-ai:8000')
 FLASK_ENV = os.getenv('FLASK_ENV', 'production')
 ENABLE_GPT_ROUTING = os.getenv('ENABLE_GPT_ROUTING', 'true').lower() == 'true'
 ENABLE_AI_REINDEX = os.getenv('ENABLE_AI_REINDEX', 'true').lower() == 'true'
+DATA_DIR = os.getenv('DATA_DIR', '/data')
+JOB_STORE_BACKEND = os.getenv('JOB_STORE_BACKEND', 'sqlite')
+JOB_STORE_PATH = os.getenv(
+    'JOB_STORE_PATH',
+    os.path.join(DATA_DIR, 'jobs.db' if JOB_STORE_BACKEND == 'sqlite' else 'jobs')
+)
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', '4'))
+JOB_LEASE_SECONDS = int(os.getenv('JOB_LEASE_SECONDS', '600'))
+JOB_RETENTION_SECONDS = int(os.getenv('JOB_RETENTION_SECONDS', '86400'))
+JOB_LANE_WEIGHTS = parse_lane_settings(os.getenv('JOB_LANE_WEIGHTS', 'interactive=8,live=4,backfill=1'))
+JOB_LANE_LIMITS = parse_lane_settings(os.getenv('JOB_LANE_LIMITS', ''))
+PROCESS_WAIT_SECONDS = float(os.getenv('PROCESS_WAIT_SECONDS', '120'))
+PIPELINE_MODE = os.getenv('PIPELINE_MODE', 'concurrent').lower()
+PIPELINE_MAX_WORKERS = int(os.getenv('PIPELINE_MAX_WORKERS', '8'))
+PIPELINE_CONFIG = os.getenv('PIPELINE_CONFIG', '')
+AI_BATCH_WINDOW_MS = int(os.getenv('AI_BATCH_WINDOW_MS', '1000'))
+AI_BATCH_MAX_SIZE = int(os.getenv('AI_BATCH_MAX_SIZE', '100'))
+DEDUPE_ENABLED = os.getenv('DEDUPE_ENABLED', 'true').lower() == 'true'
+DEDUPE_TTL_SECONDS = int(os.getenv('DEDUPE_TTL_SECONDS', '300'))
+DEDUPE_MAX_ENTRIES = int(os.getenv('DEDUPE_MAX_ENTRIES', '10000'))
+DEDUPE_BACKEND = os.getenv('DEDUPE_BACKEND', 'memory')
+DEDUPE_PATH = os.getenv('DEDUPE_PATH', os.path.join(DATA_DIR, 'dedupe.db'))
+DEDUPE_HASH_FIELDS = [f.strip() for f in os.getenv('DEDUPE_HASH_FIELDS', 'title,content').split(',') if f.strip()]
+UPSTREAM_RETRIES = int(os.getenv('UPSTREAM_RETRIES', '2'))
+UPSTREAM_BACKOFF_BASE = float(os.getenv('UPSTREAM_BACKOFF_BASE', '0.5'))
+UPSTREAM_BACKOFF_MAX = float(os.getenv('UPSTREAM_BACKOFF_MAX', '10'))
+BREAKER_FAILURE_THRESHOLD = int(os.getenv('BREAKER_FAILURE_THRESHOLD', '5'))
+BREAKER_RESET_TIMEOUT = float(os.getenv('BREAKER_RESET_TIMEOUT', '30'))
+BREAKER_MAX_RESET_TIMEOUT = float(os.getenv('BREAKER_MAX_RESET_TIMEOUT', '600'))
+PAPERLESS_GPT_RATE_LIMIT = float(os.getenv('PAPERLESS_GPT_RATE_LIMIT', '0'))
+PAPERLESS_AI_RATE_LIMIT = float(os.getenv('PAPERLESS_AI_RATE_LIMIT', '0'))
+BATCH_CONCURRENCY = int(os.getenv('BATCH_CONCURRENCY', '4'))
+BATCH_MAX_CONCURRENCY = int(os.getenv('BATCH_MAX_CONCURRENCY', '16'))
+BATCH_CHECKPOINT_DIR = os.getenv('BATCH_CHECKPOINT_DIR', os.path.join(DATA_DIR, 'batches'))
+BATCH_JOB_TIMEOUT = float(os.getenv('BATCH_JOB_TIMEOUT', '900'))
+DEADLETTER_ENABLED = os.getenv('DEADLETTER_ENABLED', 'true').lower() == 'true'
+DEADLETTER_PATH = os.getenv('DEADLETTER_PATH', os.path.join(DATA_DIR, 'deadletter.db'))
+DEADLETTER_RETENTION_SECONDS = int(os.getenv('DEADLETTER_RETENTION_SECONDS', '2592000'))
+DEADLETTER_REPLAY_LIMIT = int(os.getenv('DEADLETTER_REPLAY_LIMIT', '10000'))
+# Replay jobs carry the steps to run again in their event: "replay:paperless-gpt,paperless-ai"
+REPLAY_EVENT_PREFIX = 'replay:'
+WEB_WORKER_PROCESSES = max(1, int(os.getenv('WEB_WORKER_PROCESSES', '1')))
+
+if WEB_WORKER_PROCESSES > 1:
+    if DEDUPE_BACKEND == 'memory':
+        # An in-memory window only sees the webhooks of its own process
+        logger.warning(f"Using DEDUPE_BACKEND=sqlite: {WEB_WORKER_PROCESSES} worker processes share deduplication")
+        DEDUPE_BACKEND = 'sqlite'
+    logger.warning(f"{WEB_WORKER_PROCESSES} worker processes: /metrics and /stats report the process that answers")
+
+# Pooled keep-alive clients, one per upstream
+paperless_api = UpstreamClient.from_env('paperless-ngx', 'PAPERLESS_API', PAPERLESS_API_URL, read_timeout=30)
+paperless_gpt = UpstreamClient.from_env('paperless-gpt', 'PAPERLESS_GPT', PAPERLESS_GPT_URL)
+paperless_ai = UpstreamClient.from_env('paperless-ai', 'PAPERLESS_AI', PAPERLESS_AI_URL)
+
+# Circuit breakers so an unavailable upstream fails fast instead of stalling workers
+breakers = {
+    name: CircuitBreaker(
+        name,
+        failure_threshold=BREAKER_FAILURE_THRESHOLD,
+        reset_timeout=BREAKER_RESET_TIMEOUT,
+        max_reset_timeout=BREAKER_MAX_RESET_TIMEOUT
+    )
+    for name in ('paperless-gpt', 'paperless-ai')
+}
+
+# Requests per second allowed to each upstream (0 means unlimited), split between worker processes
+rate_limiters = {
+    'paperless-gpt': TokenBucket(PAPERLESS_GPT_RATE_LIMIT / WEB_WORKER_PROCESSES),
+    'paperless-ai': TokenBucket(PAPERLESS_AI_RATE_LIMIT / WEB_WORKER_PROCESSES)
+}
+
+# Paperless `modified` timestamp of documents whose job is running in this process, sent
+# to paperless-gpt so it can serve an unchanged document from its cache
+document_versions: Dict[int, str] = {}
+
+
+def is_connect_error(error: Optional[BaseException]) -> bool:
+    """
+    True when the request never reached the upstream, so sending it again is safe
+    """
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    if isinstance(error, requests.exceptions.ConnectionError) and error.args:
+        return isinstance(getattr(error.args[0], 'reason', None), urllib3.exceptions.NewConnectionError)
+    return False
+
+
+def call_upstream(name: str, func, idempotent: bool = False):
+    """
+    Call an upstream through its rate limiter and circuit breaker. 5xx
+    responses count as failures.
+
+    Connection failures are retried with jittered exponential backoff; 5xx
+    and 429 responses only when the call is idempotent. Read timeouts are
+    never retried: the upstream may still be working on the request.
+    """
+    def limited():
+        rate_limiters[name].acquire()
+        return func()
+
+    def should_retry(response, error):
+        if error is not None:
+            return is_connect_error(error)
+        return idempotent and (response.status_code >= 500 or response.status_code == 429)
+
+    return breakers[name].call(
+        limited,
+        is_failure=lambda response: response.status_code >= 500,
+        retries=UPSTREAM_RETRIES,
+        backoff_base=UPSTREAM_BACKOFF_BASE,
+        backoff_cap=UPSTREAM_BACKOFF_MAX,
+        should_retry=should_retry
+    )
+
+
+@app.after_request
+def count_request(response):
+    """Count every handled request by route and event type"""
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    metrics.REQUESTS.labels(
+        route=route,
+        event=g.get('event', 'none'),
+        status=str(response.status_code)
+    ).inc()
+    return response
 
 
 @app.route('/')
@@ -40,8 +184,19 @@ def index():
             'paperless_gpt': PAPERLESS_GPT_URL,
             'paperless_ai': PAPERLESS_AI_URL,
             'gpt_routing_enabled': ENABLE_GPT_ROUTING,
-            'ai_reindex_enabled': ENABLE_AI_REINDEX
-        }
+            'ai_reindex_enabled': ENABLE_AI_REINDEX,
+            'job_store_backend': JOB_STORE_BACKEND,
+            'job_workers': JOB_WORKERS,
+            'pipeline_mode': PIPELINE_MODE,
+            'pipeline_steps': [step.service for step in pipeline_steps],
+            'ai_batch_window_ms': AI_BATCH_WINDOW_MS,
+            'ai_batch_max_size': AI_BATCH_MAX_SIZE,
+            'dedupe_enabled': DEDUPE_ENABLED,
+            'deadletter_enabled': DEADLETTER_ENABLED,
+            'dedupe_ttl_seconds': DEDUPE_TTL_SECONDS
+        },
+        'upstreams': upstream_stats(),
+        'circuit_breakers': breaker_stats()
     })
 
 
@@ -73,43 +228,86 @@ def webhook_document():
 
     event = data.get('event', 'unknown')
     document_id = data['document_id']
+    modified = (data.get('document') or {}).get('modified')
+    g.event = event
 
     logger.info(f"Received webhook event '{event}' for document {document_id}")
 
     try:
-        # Route document through processing pipeline
-        result = process_pipeline(document_id, event)
+        # Queue document for the processing pipeline; workers drain it in the background
+        if deduplicator is not None:
+            decision, job = deduplicator.submit(document_id, event, data.get('document'))
+        else:
+            decision, job = DECISION_QUEUED, job_queue.submit(document_id, event, modified=modified)
+
+        if decision != DECISION_QUEUED:
+            metrics.WEBHOOKS_DEDUPLICATED.labels(reason=decision).inc()
 
         return jsonify({
-            'status': 'success',
+            'status': decision,
             'document_id': document_id,
             'event': event,
-            'pipeline_result': result,
-            'processed_at': datetime.utcnow().isoformat()
-        }), 200
+            'job_id': job['id'],
+            'status_url': f"/jobs/{job['id']}",
+            'queued_at': datetime.utcnow().isoformat()
+        }), 202
 
     except Exception as e:
-        logger.error(f"Error processing webhook for document {document_id}: {str(e)}")
+        logger.error(f"Error queueing webhook for document {document_id}: {str(e)}")
         return jsonify({
             'error': str(e),
             'status': 'error'
         }), 500
 
 
+@app.route('/jobs/<job_id>')
+def job_status(job_id: str):
+    """
+    Report the status of a queued pipeline job
+    """
+    job = job_queue.get(job_id)
+
+    if job is None:
+        return jsonify({
+            'error': f'Job {job_id} not found',
+            'status': 'error'
+        }), 404
+
+    return jsonify(job_to_dict(job)), 200
+
+
 @app.route('/process/<int:document_id>', methods=['POST'])
 def process_document(document_id: int):
     """
     Manually trigger processing for a specific document
+
+    The job runs in the interactive lane, ahead of webhook and backfill work,
+    and the response waits for it. If it takes longer than
+    PROCESS_WAIT_SECONDS, 202 is returned with a status URL instead.
     """
     logger.info(f"Manual processing triggered for document {document_id}")
+    g.event = 'manual'
 
     try:
-        result = process_pipeline(document_id, 'manual')
+        job = job_queue.submit(document_id, 'manual', lane=LANE_INTERACTIVE)
+        job = job_queue.wait(job['id'], PROCESS_WAIT_SECONDS) or job
+
+        if job['status'] == STATUS_FAILED:
+            raise RuntimeError(job['error'])
+
+        if job['status'] != STATUS_COMPLETED:
+            return jsonify({
+                'status': 'queued',
+                'document_id': document_id,
+                'job_id': job['id'],
+                'status_url': f"/jobs/{job['id']}"
+            }), 202
 
         return jsonify({
             'status': 'success',
             'document_id': document_id,
-            'pipeline_result': result,
+            'job_id': job['id'],
+            'pipeline_result': job['result'],
             'processed_at': datetime.utcnow().isoformat()
         }), 200
 
@@ -121,52 +319,197 @@ def process_document(document_id: int):
         }), 500
 
 
-def process_pipeline(document_id: int, event: str) -> Dict[str, Any]:
+@app.route('/process/batch', methods=['POST'])
+def process_batch():
+    """
+    Reprocess many documents, streaming progress as NDJSON
+
+    Expected payload (one of document_ids, query or resume):
+    {
+        "document_ids": [1, 2, 3],
+        "query": {"tags__id__all": 3} | "tags__id__all=3&created__date__gt=2024-01-01",
+        "batch_id": "optional id; generated if omitted",
+        "resume": true,
+        "concurrency": 4
+    }
+    """
+    data = request.get_json(silent=True) or {}
+    g.event = 'batch'
+
+    batch_id = str(data.get('batch_id') or new_batch_id())
+    if not batch_id.replace('-', '').replace('_', '').isalnum():
+        return jsonify({'error': 'batch_id may only contain letters, digits, - and _', 'status': 'error'}), 400
+
+    checkpoint = BatchCheckpoint(BATCH_CHECKPOINT_DIR, batch_id)
+    skip = set()
+
+    if not data.get('resume') and checkpoint.exists():
+        return jsonify({
+            'error': f'Batch {batch_id} already exists; pass "resume": true to continue it or use a new batch_id',
+            'status': 'error'
+        }), 409
+
+    try:
+        concurrency = max(1, min(int(data.get('concurrency', BATCH_CONCURRENCY)), BATCH_MAX_CONCURRENCY))
+        if data.get('resume'):
+            if not checkpoint.exists():
+                return jsonify({'error': f'No checkpoint for batch {batch_id}', 'status': 'error'}), 404
+            document_ids = checkpoint.load_ids()
+            skip = checkpoint.completed()
+        elif 'document_ids' in data:
+            document_ids = [int(doc_id) for doc_id in data['document_ids']]
+        elif 'query' in data:
+            document_ids = resolve_document_ids(paperless_api, data['query'])
+        else:
+            return jsonify({
+                'error': 'Provide document_ids, query, or batch_id with resume',
+                'status': 'error'
+            }), 400
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': f'Invalid batch request: {str(e)}', 'status': 'error'}), 400
+    except requests.exceptions.RequestException as e:
+        logger.error(f"Error resolving batch query against Paperless: {str(e)}")
+        return jsonify({'error': str(e), 'status': 'error'}), 502
+
+    if not data.get('resume'):
+        checkpoint.save_ids(document_ids)
+
+    logger.info(f"Starting batch {batch_id}: {len(document_ids)} documents, "
+                f"{len(skip)} already done, concurrency {concurrency}")
+
+    def generate():
+        for event in run_batch(document_ids, run_backfill_job, checkpoint, concurrency=concurrency, skip=skip):
+            yield json.dumps(event) + '\n'
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='application/x-ndjson',
+        headers={'X-Batch-Id': batch_id}
+    )
+
+
+def run_backfill_job(document_id: int, event: str = 'batch') -> Dict[str, Any]:
     """
-    Route document through the processing pipeline:
-    1. GPT processing (if enabled)
-    2. AI reindexing (if enabled)
+    Run one batch document through the job queue's backfill lane and wait for it
     """
+    job = job_queue.submit(document_id, event, lane=LANE_BACKFILL)
+    job = job_queue.wait(job['id'], BATCH_JOB_TIMEOUT) or job
+    if job['status'] == STATUS_COMPLETED:
+        return job['result']
+    if job['status'] == STATUS_FAILED:
+        raise RuntimeError(job['error'])
+    raise TimeoutError(f"Job {job['id']} still {job['status']} after {BATCH_JOB_TIMEOUT:.0f}s")
+
+
+def run_job(document_id: int, event: str, modified: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Job queue handler: replay jobs run their failed steps, everything else the pipeline
+    """
+    if event.startswith(REPLAY_EVENT_PREFIX):
+        return replay_document(document_id, event[len(REPLAY_EVENT_PREFIX):].split(','))
+    return process_pipeline(document_id, event, modified=modified)
+
+
+def process_pipeline(document_id: int, event: str, steps: Optional[List[PipelineStep]] = None,
+                     modified: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Route document through the configured pipeline steps
+
+    By default these are GPT processing and then AI reindexing (if enabled);
+    PIPELINE_CONFIG or PIPELINE_STEPS replace them (see steps.py).
+    With PIPELINE_MODE=concurrent independent steps run at the same time;
+    with PIPELINE_MODE=sequential they run one after the other.
+
+    Steps that do not succeed are written to the dead-letter store; replays
+    pass only the steps that failed. modified, the document version from the
+    webhook, is passed on to paperless-gpt while the steps run.
+    """
+    full_run = steps is None
+    steps = pipeline_steps if steps is None else steps
     pipeline_result = {
         'document_id': document_id,
         'event': event,
         'steps': []
     }
 
-    # Step 1: Send to GPT for OCR and metadata extraction
-    if ENABLE_GPT_ROUTING:
-        logger.info(f"Routing document {document_id} to paperless-gpt")
-        gpt_result = route_to_gpt(document_id)
-        pipeline_result['steps'].append({
-            'service': 'paperless-gpt',
-            'result': gpt_result
-        })
-
-    # Step 2: Send to AI for embeddings and classification
-    if ENABLE_AI_REINDEX:
-        logger.info(f"Routing document {document_id} to paperless-ai for reindexing")
-        ai_result = route_to_ai(document_id)
-        pipeline_result['steps'].append({
-            'service': 'paperless-ai',
-            'result': ai_result
-        })
+    logger.info(f"Routing document {document_id} through "
+                f"{', '.join(s.service for s in steps) or 'no steps'}")
+    started = time.monotonic()
+    if modified:
+        document_versions[document_id] = modified
+    try:
+        pipeline_result['steps'] = pipeline_executor.run(steps, document_id, PIPELINE_MODE)
+    except Exception as e:
+        metrics.DOCUMENTS_PROCESSED.labels(outcome='exception').inc()
+        record_dead_letters(document_id, event, None, error=str(e))
+        raise
+    finally:
+        if modified and document_versions.get(document_id) == modified:
+            del document_versions[document_id]
+    record_dead_letters(document_id, event, pipeline_result['steps'], full_run=full_run)
+    pipeline_result['duration_ms'] = round((time.monotonic() - started) * 1000, 1)
+
+    statuses = {step['result'].get('status') for step in pipeline_result['steps']}
+    if statuses - {'success', STATUS_QUEUED}:
+        outcome = 'error'
+    elif STATUS_QUEUED in statuses:
+        # The rest is counted in BATCHED_STEPS once the batch has run
+        outcome = 'queued'
+    else:
+        outcome = 'success'
+    metrics.DOCUMENTS_PROCESSED.labels(outcome=outcome).inc()
 
     return pipeline_result
 
 
+def record_dead_letters(document_id: int, event: str, step_runs: Optional[List[Dict[str, Any]]],
+                        error: str = '', full_run: bool = False) -> None:
+    """
+    Dead-letter the steps that did not succeed and resolve those that did
+
+    step_runs is None when the pipeline raised before producing results.
+    Queued steps are left alone; record_batched_reindex settles them once
+    their batch has run.
+    """
+    if dead_letters is None:
+        return
+    payload = {'document_id': document_id, 'event': event}
+    try:
+        if step_runs is None:
+            dead_letters.record(document_id, PIPELINE_STEP, event, payload, error[:2000])
+            return
+
+        succeeded = [run['service'] for run in step_runs if run['result'].get('status') == 'success']
+        if full_run:
+            succeeded.append(PIPELINE_STEP)
+        dead_letters.resolve(document_id, succeeded)
+
+        for run in step_runs:
+            result = run['result']
+            if result.get('status') in ('success', STATUS_QUEUED):
+                continue
+            message = str(result.get('message') or f"status {result.get('code', result.get('status'))}")
+            dead_letters.record(document_id, run['service'], event, payload, message[:2000], result)
+            logger.warning(f"Dead-lettered step {run['service']} for document {document_id}: {message[:200]}")
+    except Exception as e:
+        logger.error(f"Error writing dead letters for document {document_id}: {str(e)}")
+
+
 def route_to_gpt(document_id: int) -> Dict[str, Any]:
     """
     Send document to paperless-gpt for processing
+
+    The webhook's `modified` timestamp goes along as document_modified, so
+    paperless-gpt can skip refetching a document it has cached.
     """
+    payload = {
+        'document_id': document_id,
+        'action': 'both'
+    }
+    if document_id in document_versions:
+        payload['document_modified'] = document_versions[document_id]
     try:
-        response = requests.post(
-            f"{PAPERLESS_GPT_URL}/process",
-            json={
-                'document_id': document_id,
-                'action': 'both'
-            },
-            timeout=60
-        )
+        response = call_upstream('paperless-gpt', lambda: paperless_gpt.post('/process', json=payload))
 
         if response.status_code == 200:
             return {
@@ -175,66 +518,315 @@ def route_to_gpt(document_id: int) -> Dict[str, Any]:
             }
         else:
             logger.warning(f"GPT processing returned status {response.status_code}")
+            metrics.UPSTREAM_ERRORS.labels(upstream='paperless-gpt', status_code=str(response.status_code)).inc()
             return {
                 'status': 'error',
                 'code': response.status_code,
                 'message': response.text
             }
 
+    except CircuitOpenError as e:
+        logger.warning(str(e))
+        metrics.UPSTREAM_ERRORS.labels(upstream='paperless-gpt', status_code='circuit_open').inc()
+        return {
+            'status': 'error',
+            'message': str(e),
+            'retry_after': round(e.retry_after, 1)
+        }
+
     except requests.exceptions.RequestException as e:
         logger.error(f"Error connecting to paperless-gpt: {str(e)}")
+        metrics.UPSTREAM_ERRORS.labels(upstream='paperless-gpt', status_code='connection').inc()
         return {
             'status': 'error',
             'message': str(e)
         }
 
 
-def route_to_ai(document_id: int) -> Dict[str, Any]:
+def route_to_ai(document_id: int, step: str = 'paperless-ai') -> Dict[str, Any]:
     """
     Send document to paperless-ai for embeddings and classification
+
+    When AI_BATCH_WINDOW_MS is set, the document is queued for the next
+    reindex batch and the step returns status "queued" at once, so a batch
+    can collect documents from many jobs instead of only those running at
+    the same moment. The outcome is recorded when the batch has run.
+    """
+    if ai_batcher is None:
+        return reindex_documents([document_id])[document_id]
+
+    submitted = time.monotonic()
+    future = ai_batcher.submit(document_id)
+    future.add_done_callback(lambda done: record_batched_reindex(document_id, step, done, submitted))
+    return {
+        'status': STATUS_QUEUED,
+        'message': f'Document {document_id} queued for batched AI reindexing',
+        'batched': True
+    }
+
+
+def record_batched_reindex(document_id: int, step: str, future, submitted: float) -> None:
+    """
+    Record the outcome of a batched reindex for one document
+
+    Success resolves any dead letter pending for the step; failure writes one.
+    """
+    try:
+        result = future.result() or {'status': 'error', 'message': 'Reindex batch returned no result'}
+    except Exception as e:
+        result = {'status': 'error', 'message': str(e)}
+    succeeded = result.get('status') == 'success'
+    metrics.STEP_LATENCY.labels(step=step).observe(time.monotonic() - submitted)
+    metrics.BATCHED_STEPS.labels(step=step, outcome='success' if succeeded else 'error').inc()
+
+    if succeeded:
+        if dead_letters is not None:
+            try:
+                dead_letters.resolve(document_id, [step])
+            except Exception as e:
+                logger.error(f"Error resolving dead letter for document {document_id}: {str(e)}")
+        return
+
+    message = str(result.get('message') or f"status {result.get('code', result.get('status'))}")
+    logger.warning(f"Batched AI reindex failed for document {document_id}: {message[:200]}")
+    if dead_letters is None:
+        return
+    try:
+        dead_letters.record(document_id, step, 'reindex', {'document_id': document_id, 'event': 'reindex'},
+                            message[:2000], result)
+    except Exception as e:
+        logger.error(f"Error writing dead letter for document {document_id}: {str(e)}")
+
+
+def reindex_documents(document_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+    """
+    Ask paperless-ai to reindex a batch of documents, reporting per document
     """
     try:
         # Paperless-AI uses the same API structure as paperless-ngx
         # We can trigger reindexing via its API
-        response = requests.post(
-            f"{PAPERLESS_AI_URL}/api/index/",
+        # Reindexing the same documents twice is harmless, so 5xx answers are retried
+        response = call_upstream('paperless-ai', lambda: paperless_ai.post(
+            '/api/index/',
             json={
-                'document_ids': [document_id]
-            },
-            timeout=60
-        )
+                'document_ids': document_ids
+            }
+        ), idempotent=True)
 
         if response.status_code in [200, 201, 204]:
             return {
-                'status': 'success',
-                'message': f'Document {document_id} queued for AI reindexing'
+                document_id: {
+                    'status': 'success',
+                    'message': f'Document {document_id} queued for AI reindexing',
+                    'batch_size': len(document_ids)
+                }
+                for document_id in document_ids
             }
         else:
-            logger.warning(f"AI reindexing returned status {response.status_code}")
-            return {
+            logger.warning(f"AI reindexing returned status {response.status_code} "
+                           f"for batch of {len(document_ids)} documents")
+            metrics.UPSTREAM_ERRORS.labels(upstream='paperless-ai', status_code=str(response.status_code)).inc()
+            result = {
                 'status': 'error',
                 'code': response.status_code,
                 'message': response.text
             }
 
+    except CircuitOpenError as e:
+        logger.warning(str(e))
+        metrics.UPSTREAM_ERRORS.labels(upstream='paperless-ai', status_code='circuit_open').inc()
+        result = {
+            'status': 'error',
+            'message': str(e),
+            'retry_after': round(e.retry_after, 1)
+        }
+
     except requests.exceptions.RequestException as e:
         logger.error(f"Error connecting to paperless-ai: {str(e)}")
-        return {
+        metrics.UPSTREAM_ERRORS.labels(upstream='paperless-ai', status_code='connection').inc()
+        result = {
             'status': 'error',
             'message': str(e)
         }
 
+    return {document_id: dict(result) for document_id in document_ids}
+
+
+def dead_letters_disabled():
+    return jsonify({'error': 'Dead-letter store is disabled', 'status': 'error'}), 404
+
+
+def int_list(value: Any) -> Optional[List[int]]:
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = [item for item in value.split(',') if item.strip()]
+    return [int(item) for item in value]
+
+
+@app.route('/deadletters')
+def list_dead_letters():
+    """
+    List dead-lettered pipeline steps
+
+    Query parameters: status (pending, resolved, discarded or all; default
+    pending), step, document_id (comma-separated), limit and offset.
+    """
+    if dead_letters is None:
+        return dead_letters_disabled()
+
+    status = request.args.get('status', STATUS_PENDING)
+    status = None if status == 'all' else status
+    step = request.args.get('step') or None
+    try:
+        document_ids = int_list(request.args.get('document_id'))
+        limit = max(1, min(int(request.args.get('limit', 100)), 1000))
+        offset = max(0, int(request.args.get('offset', 0)))
+    except ValueError as e:
+        return jsonify({'error': f'Invalid query: {str(e)}', 'status': 'error'}), 400
+
+    entries = dead_letters.list(status, step, document_ids, limit=limit, offset=offset)
+    return jsonify({
+        'entries': [entry_to_dict(entry) for entry in entries],
+        'total': dead_letters.count(status, step, document_ids),
+        'limit': limit,
+        'offset': offset
+    }), 200
+
+
+@app.route('/deadletters/<int:entry_id>', methods=['GET', 'DELETE'])
+def dead_letter(entry_id: int):
+    """
+    Show a dead letter, or discard it (DELETE) so it is no longer replayed
+    """
+    if dead_letters is None:
+        return dead_letters_disabled()
+
+    if request.method == 'DELETE' and not dead_letters.discard(entry_id):
+        return jsonify({'error': f'No pending dead letter {entry_id}', 'status': 'error'}), 404
+
+    entry = dead_letters.get(entry_id)
+    if entry is None:
+        return jsonify({'error': f'Dead letter {entry_id} not found', 'status': 'error'}), 404
+    return jsonify(entry_to_dict(entry)), 200
+
+
+@app.route('/deadletters/replay', methods=['POST'])
+def replay_dead_letters():
+    """
+    Replay pending dead letters, streaming one NDJSON line per document
+
+    Expected payload (every field optional; default replays all pending):
+    {
+        "ids": [1, 2],
+        "document_ids": [123],
+        "step": "paperless-ai",
+        "limit": 1000,
+        "concurrency": 4
+    }
+
+    Only the steps that failed are run again for each document. Entries of
+    steps that succeed are resolved; failures stay pending. Replays are jobs
+    in the backfill lane, so they survive a restart and cannot crowd out
+    webhook work.
+    """
+    if dead_letters is None:
+        return dead_letters_disabled()
+
+    data = request.get_json(silent=True) or {}
+    g.event = 'replay'
+
+    try:
+        concurrency = max(1, min(int(data.get('concurrency', BATCH_CONCURRENCY)), BATCH_MAX_CONCURRENCY))
+        limit = max(1, min(int(data.get('limit', DEADLETTER_REPLAY_LIMIT)), DEADLETTER_REPLAY_LIMIT))
+        entries = dead_letters.list(
+            STATUS_PENDING,
+            data.get('step') or None,
+            int_list(data.get('document_ids')),
+            int_list(data.get('ids')),
+            limit=limit
+        )
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': f'Invalid replay request: {str(e)}', 'status': 'error'}), 400
+
+    failed_steps: Dict[int, List[str]] = {}
+    for entry in entries:
+        failed_steps.setdefault(entry['document_id'], []).append(entry['step'])
+    dead_letters.mark_replayed(entry['id'] for entry in entries)
+
+    batch_id = f'replay-{new_batch_id()}'
+    logger.info(f"Replaying {len(entries)} dead letters for {len(failed_steps)} documents "
+                f"({batch_id}, concurrency {concurrency})")
+
+    def generate():
+        def replay_job(doc_id):
+            return run_backfill_job(doc_id, REPLAY_EVENT_PREFIX + ','.join(failed_steps[doc_id]))
+
+        for event in run_batch(list(failed_steps), replay_job, None, concurrency=concurrency, batch_id=batch_id):
+            yield json.dumps(event) + '\n'
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='application/x-ndjson',
+        headers={'X-Batch-Id': batch_id}
+    )
+
+
+def replay_document(document_id: int, failed: List[str]) -> Dict[str, Any]:
+    """
+    Run the failed steps of a document again
+
+    A "pipeline" entry replays every step. Dependencies outside the replayed
+    set already succeeded, so they are dropped. Steps that are no longer
+    configured are reported as errors and left pending.
+    """
+    if PIPELINE_STEP in failed:
+        return process_pipeline(document_id, 'replay')
+
+    steps = [
+        dataclasses.replace(step, depends_on=[dep for dep in step.depends_on if dep in failed])
+        for step in pipeline_steps if step.service in failed
+    ]
+    result = process_pipeline(document_id, 'replay', steps) if steps else {
+        'document_id': document_id, 'event': 'replay', 'steps': []
+    }
+    configured = {step.service for step in steps}
+    for name in failed:
+        if name not in configured:
+            result['steps'].append({
+                'service': name,
+                'result': {'status': 'error', 'message': f'Step {name} is no longer configured'},
+                'duration_ms': 0,
+                'attempts': 0
+            })
+    return result
+
 
 @app.route('/stats')
 def stats():
     """
-    Get processing statistics
+    Get processing statistics from the live metrics of this worker process
     """
-    # In production, this would query a database or cache
+    outcomes = metrics.counter_values(metrics.DOCUMENTS_PROCESSED, 'outcome')
     return jsonify({
         'service': 'glue-worker',
-        'uptime': 'simulated',
-        'documents_processed': 0,
+        'uptime_seconds': round(time.time() - metrics.START_TIME, 1),
+        'documents_processed': int(sum(outcomes.values())),
+        'documents_by_outcome': {key: int(value) for key, value in outcomes.items()},
+        'requests_by_route': {
+            key: int(value) for key, value in metrics.counter_values(metrics.REQUESTS, 'route').items()
+        },
+        'upstream_errors': {
+            key: int(value) for key, value in metrics.counter_values(metrics.UPSTREAM_ERRORS, 'upstream').items()
+        },
+        'batched_steps_by_outcome': {
+            key: int(value) for key, value in metrics.counter_values(metrics.BATCHED_STEPS, 'outcome').items()
+        },
+        'step_latency': metrics.histogram_summary(metrics.STEP_LATENCY, 'step'),
+        'queue_depth': job_queue.depth(),
+        'jobs_in_flight': job_queue.in_flight,
+        'lanes': job_queue.lane_stats(),
+        'dead_letters': dead_letters.stats() if dead_letters is not None else None,
         'pipeline_enabled': {
             'gpt': ENABLE_GPT_ROUTING,
             'ai': ENABLE_AI_REINDEX
@@ -242,6 +834,86 @@ def stats():
     })
 
 
+@app.route('/metrics')
+def prometheus_metrics():
+    """
+    Prometheus metrics in text exposition format
+    """
+    return Response(metrics.render(), mimetype=CONTENT_TYPE_LATEST)
+
+
+ai_batcher = MicroBatcher(
+    'paperless-ai',
+    reindex_documents,
+    window_seconds=AI_BATCH_WINDOW_MS / 1000,
+    max_batch_size=AI_BATCH_MAX_SIZE
+) if AI_BATCH_WINDOW_MS > 0 else None
+
+# Built-in step types; http and plugin steps come from steps.py
+register_step_type('paperless-gpt', lambda spec: route_to_gpt)
+register_step_type('paperless-ai', lambda spec: lambda document_id: route_to_ai(document_id, spec.name))
+
+step_specs = load_step_specs(PIPELINE_CONFIG)
+if step_specs is None:
+    step_specs = [
+        StepSpec(name='paperless-gpt', type='paperless-gpt', enabled=ENABLE_GPT_ROUTING),
+        # Reindex only after GPT has written its metadata, or AI indexes stale tags
+        StepSpec(name='paperless-ai', type='paperless-ai', enabled=ENABLE_AI_REINDEX,
+                 depends_on=['paperless-gpt'] if ENABLE_GPT_ROUTING else [])
+    ]
+pipeline_steps = build_steps(step_specs)
+
+dead_letters = DeadLetterStore(DEADLETTER_PATH, DEADLETTER_RETENTION_SECONDS) if DEADLETTER_ENABLED else None
+
+pipeline_executor = PipelineExecutor(
+    max_workers=PIPELINE_MAX_WORKERS,
+    on_step_finished=lambda step, seconds: metrics.STEP_LATENCY.labels(step=step).observe(seconds)
+)
+
+job_queue = JobQueue(
+    create_job_store(JOB_STORE_BACKEND, JOB_STORE_PATH),
+    run_job,
+    max_workers=JOB_WORKERS,
+    lease_seconds=JOB_LEASE_SECONDS,
+    retention_seconds=JOB_RETENTION_SECONDS,
+    lane_weights=JOB_LANE_WEIGHTS,
+    lane_limits=JOB_LANE_LIMITS
+)
+job_queue.start()
+
+if DEDUPE_ENABLED:
+    if DEDUPE_BACKEND == 'sqlite':
+        recent_events = SQLiteRecentEvents(DEDUPE_PATH, DEDUPE_TTL_SECONDS, DEDUPE_MAX_ENTRIES)
+    else:
+        recent_events = RecentEvents(DEDUPE_TTL_SECONDS, DEDUPE_MAX_ENTRIES)
+    deduplicator = Deduplicator(job_queue, recent_events, DEDUPE_HASH_FIELDS)
+else:
+    deduplicator = None
+
+metrics.QUEUE_DEPTH.set_function(job_queue.depth)
+metrics.IN_FLIGHT.set_function(lambda: job_queue.in_flight)
+if dead_letters is not None:
+    metrics.DEAD_LETTERS.set_function(dead_letters.count)
+metrics.register_collector(metrics.UpstreamPoolCollector(upstream_stats))
+metrics.register_collector(metrics.CircuitBreakerCollector(breaker_stats, STATE_VALUES))
+metrics.register_collector(metrics.LaneCollector(job_queue.lane_stats))
+
+
+def shutdown(wait: bool = True) -> None:
+    """
+    Stop claiming jobs and let the ones in flight finish
+
+    Called by the production server when a worker exits; queued jobs stay
+    in the store for other processes.
+    """
+    logger.info(f"Shutting down: draining {job_queue.in_flight} in-flight jobs")
+    job_queue.shutdown(wait=wait)
+    if ai_batcher is not None:
+        ai_batcher.shutdown()
+    pipeline_executor.shutdown(wait=wait)
+    logger.info("Shutdown complete")
+
+
 if __name__ == '__main__':
     port = int(os.getenv('PORT', 5000))
     app.run(host='0.0.0.0', port=port, debug=(FLASK_ENV == 'development'))
@@ -0,0 +1,176 @@
+"""
+Bulk reprocessing for glue-worker
+
+A batch is a list of document IDs, given explicitly or resolved from a
+Paperless document query. Documents run through the pipeline with bounded
+concurrency and progress is streamed back as NDJSON. Every finished document
+is appended to a checkpoint file, so an interrupted batch can be resumed by
+its batch_id without redoing completed documents. A step that was queued for
+later work (see pipeline.py) counts as done; its failures are dead-lettered.
+"""
+import os
+import json
+import time
+import uuid
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, Any, Callable, Iterator, List, Optional, Set
+from urllib.parse import parse_qsl
+
+from pipeline import STATUS_QUEUED
+from upstream import UpstreamClient
+
+logger = logging.getLogger(__name__)
+
+
+def resolve_document_ids(paperless_api: UpstreamClient, query: Any,
+                         page_size: int = 100) -> List[int]:
+    """
+    Resolve a Paperless document filter to the list of matching document IDs
+
+    query is either a dict of filter parameters or a query string such as
+    "tags__id__all=3&created__date__gt=2024-01-01".
+    """
+    params = dict(parse_qsl(query.lstrip('?'))) if isinstance(query, str) else dict(query)
+    params.update({'page_size': page_size, 'fields': 'id'})
+
+    response = paperless_api.get('/api/documents/', params=params)
+    response.raise_for_status()
+    page = response.json()
+
+    # Paperless returns every matching ID in 'all'; fall back to paging otherwise
+    if 'all' in page:
+        return list(page['all'])
+
+    document_ids = [doc['id'] for doc in page.get('results', [])]
+    while page.get('next'):
+        response = paperless_api.get(page['next'])
+        response.raise_for_status()
+        page = response.json()
+        document_ids.extend(doc['id'] for doc in page.get('results', []))
+    return document_ids
+
+
+class BatchCheckpoint:
+    """
+    On-disk progress of a batch: the ID list plus an append-only log of
+    finished documents
+    """
+
+    def __init__(self, directory: str, batch_id: str):
+        self.batch_id = batch_id
+        os.makedirs(directory, exist_ok=True)
+        self.ids_path = os.path.join(directory, f'{batch_id}.ids.json')
+        self.log_path = os.path.join(directory, f'{batch_id}.done.ndjson')
+        self._lock = threading.Lock()
+
+    def exists(self) -> bool:
+        return os.path.exists(self.ids_path)
+
+    def save_ids(self, document_ids: List[int]) -> None:
+        tmp = f'{self.ids_path}.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(document_ids, f)
+        os.replace(tmp, self.ids_path)
+
+    def load_ids(self) -> List[int]:
+        with open(self.ids_path) as f:
+            return json.load(f)
+
+    def completed(self) -> Set[int]:
+        """
+        IDs that finished successfully in earlier runs of this batch
+        """
+        done = set()
+        if not os.path.exists(self.log_path):
+            return done
+        with open(self.log_path) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # Partial line from an interrupted write
+                if entry.get('status') == 'success':
+                    done.add(entry['document_id'])
+                else:
+                    done.discard(entry['document_id'])
+        return done
+
+    def record(self, document_id: int, status: str) -> None:
+        with self._lock, open(self.log_path, 'a') as f:
+            f.write(json.dumps({'document_id': document_id, 'status': status, 'at': time.time()}) + '\n')
+
+
+def new_batch_id() -> str:
+    return uuid.uuid4().hex
+
+
+def run_batch(document_ids: List[int], handler: Callable[[int], Dict[str, Any]],
+              checkpoint: Optional[BatchCheckpoint], concurrency: int = 4,
+              skip: Optional[Set[int]] = None, batch_id: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Process documents with bounded concurrency, yielding NDJSON-ready events
+
+    Only `concurrency` documents are in flight at any time, so memory use
+    does not grow with the size of the batch. Without a checkpoint progress
+    is not recorded and `batch_id` names the run in the events.
+    """
+    batch_id = checkpoint.batch_id if checkpoint is not None else batch_id
+    skip = skip or set()
+    pending_ids = iter([doc_id for doc_id in document_ids if doc_id not in skip])
+    total = len(document_ids)
+    done = len(skip)
+    succeeded = failed = 0
+    started = time.monotonic()
+
+    yield {
+        'type': 'start',
+        'batch_id': batch_id,
+        'total': total,
+        'skipped': len(skip),
+        'concurrency': concurrency
+    }
+
+    def submit_next(executor, in_flight):
+        for document_id in pending_ids:
+            in_flight[executor.submit(handler, document_id)] = document_id
+            return True
+        return False
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='batch') as executor:
+        in_flight = {}
+        while len(in_flight) < concurrency and submit_next(executor, in_flight):
+            pass
+
+        while in_flight:
+            finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                document_id = in_flight.pop(future)
+                try:
+                    result = future.result()
+                    ok = all(step['result'].get('status') in ('success', STATUS_QUEUED) for step in result['steps'])
+                    event = {'status': 'success' if ok else 'error', 'pipeline_result': result}
+                except Exception as e:
+                    logger.error(f"Batch {batch_id}: document {document_id} failed: {str(e)}")
+                    event = {'status': 'error', 'error': str(e)}
+
+                if checkpoint is not None:
+                    checkpoint.record(document_id, event['status'])
+                done += 1
+                if event['status'] == 'success':
+                    succeeded += 1
+                else:
+                    failed += 1
+                yield dict(event, type='result', document_id=document_id, done=done, total=total)
+                submit_next(executor, in_flight)
+
+    yield {
+        'type': 'summary',
+        'batch_id': batch_id,
+        'total': total,
+        'skipped': len(skip),
+        'succeeded': succeeded,
+        'failed': failed,
+        'elapsed_seconds': round(time.monotonic() - started, 1)
+    }
@@ -0,0 +1,122 @@
+"""
+Micro-batcher for glue-worker upstream calls
+
+Callers submit single items and get a future; a collector thread groups
+items that arrive within a short window (or until the batch is full) and
+hands each group to a flush function in one upstream request. Callers that
+do not wait on the future (add_done_callback instead) let a batch grow
+beyond the number of threads submitting to it.
+
+On shutdown everything still queued is flushed, so no future is left
+unresolved.
+"""
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Hashable
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """
+    Coalesces individual submissions into batched flush calls
+
+    flush_func receives the list of unique items in a batch and returns a dict
+    mapping each item to its own result. Items missing from the returned dict
+    resolve to None.
+    """
+
+    def __init__(self, name: str, flush_func: Callable[[List[Hashable]], Dict[Hashable, Any]],
+                 window_seconds: float = 1.0, max_batch_size: int = 100,
+                 max_concurrent_flushes: int = 2):
+        self.name = name
+        self.flush_func = flush_func
+        self.window_seconds = window_seconds
+        self.max_batch_size = max_batch_size
+        self._queue = queue.Queue()
+        self._flushers = ThreadPoolExecutor(max_workers=max_concurrent_flushes,
+                                            thread_name_prefix=f'{name}-flush')
+        self._stopping = threading.Event()
+        self._collector = threading.Thread(target=self._collect_loop, name=f'{name}-batcher',
+                                           daemon=True)
+        self._collector.start()
+
+    def submit(self, item: Hashable) -> Future:
+        """
+        Queue an item for the next batch
+        """
+        future = Future()
+        if self._stopping.is_set():
+            future.set_exception(RuntimeError(f'{self.name} batcher is shut down'))
+            return future
+        self._queue.put((item, future))
+        return future
+
+    def call(self, item: Hashable, timeout: float = None) -> Any:
+        """
+        Queue an item and wait for its individual result
+
+        timeout defaults to the batch window plus 60 seconds for the flush.
+        """
+        if timeout is None:
+            timeout = self.window_seconds + 60
+        return self.submit(item).result(timeout=timeout)
+
+    def shutdown(self) -> None:
+        """
+        Stop collecting and flush everything still queued
+        """
+        self._stopping.set()
+        self._collector.join(timeout=self.window_seconds + 1)
+
+        remaining = []
+        while True:
+            try:
+                remaining.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        for start in range(0, len(remaining), self.max_batch_size):
+            self._flushers.submit(self._flush, remaining[start:start + self.max_batch_size])
+        self._flushers.shutdown(wait=True)
+
+    def _collect_loop(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                first = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+
+            batch = [first]
+            deadline = time.monotonic() + self.window_seconds
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            self._flushers.submit(self._flush, batch)
+
+    def _flush(self, batch: List[tuple]) -> None:
+        items = list(dict.fromkeys(item for item, _ in batch))
+        logger.info(f"Flushing {self.name} batch of {len(items)} items")
+        try:
+            results = self.flush_func(items)
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        for item, future in batch:
+            future.set_result(results.get(item))
+
+    def pending(self) -> int:
+        """
+        Items waiting for the next batch
+        """
+        return self._queue.qsize()
@@ -0,0 +1,185 @@
+"""
+Circuit breakers and retry backoff for glue-worker upstream calls
+
+Each upstream gets a breaker with three states:
+
+    closed     calls flow normally; consecutive failures are counted
+    open       calls fail immediately until the reset timeout has passed
+    half_open  a single probe call is let through; success closes the
+               breaker, failure re-opens it with a longer timeout
+
+The reset timeout grows exponentially with every failed probe and is
+jittered, so several pods do not all probe a recovering upstream at once.
+"""
+import time
+import random
+import logging
+import threading
+from typing import Dict, Any, Callable, List, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+STATE_CLOSED = 'closed'
+STATE_OPEN = 'open'
+STATE_HALF_OPEN = 'half_open'
+
+# Numeric encoding used for the Prometheus state gauge
+STATE_VALUES = {STATE_CLOSED: 0, STATE_HALF_OPEN: 1, STATE_OPEN: 2}
+
+_breakers: Dict[str, 'CircuitBreaker'] = {}
+
+T = TypeVar('T')
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is rejected because the upstream's breaker is open"""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"Circuit breaker for {name} is open; retry in {retry_after:.0f}s")
+        self.name = name
+        self.retry_after = retry_after
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """
+    Exponential backoff with full jitter for the given attempt (0-based)
+    """
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class CircuitBreaker:
+    """
+    Per-upstream circuit breaker
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 max_reset_timeout: float = 600.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+
+        self._lock = threading.Lock()
+        self._state = STATE_CLOSED
+        self._failures = 0
+        self._trips = 0
+        self._opened_at = 0.0
+        self._open_for = 0.0
+        self._probe_in_flight = False
+        self._rejected = 0
+        _breakers[name] = self
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._maybe_half_open()
+            return self._state
+
+    def _maybe_half_open(self) -> None:
+        if self._state == STATE_OPEN and time.monotonic() - self._opened_at >= self._open_for:
+            self._state = STATE_HALF_OPEN
+            self._probe_in_flight = False
+            logger.info(f"Circuit breaker for {self.name} is half-open; probing upstream")
+
+    def before_call(self) -> None:
+        """
+        Reserve permission for a call, raising CircuitOpenError if not allowed
+        """
+        with self._lock:
+            self._maybe_half_open()
+            if self._state == STATE_CLOSED:
+                return
+            if self._state == STATE_HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return
+            self._rejected += 1
+            remaining = max(0.0, self._open_for - (time.monotonic() - self._opened_at))
+        raise CircuitOpenError(self.name, remaining)
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self._state != STATE_CLOSED:
+                logger.info(f"Circuit breaker for {self.name} closed")
+            self._state = STATE_CLOSED
+            self._failures = 0
+            self._trips = 0
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._state == STATE_HALF_OPEN or self._failures >= self.failure_threshold:
+                self._trip()
+
+    def _trip(self) -> None:
+        base = min(self.max_reset_timeout, self.reset_timeout * (2 ** self._trips))
+        # Jitter by +/-20% so replicas do not probe in lockstep
+        self._open_for = base * random.uniform(0.8, 1.2)
+        self._trips += 1
+        self._state = STATE_OPEN
+        self._opened_at = time.monotonic()
+        self._probe_in_flight = False
+        logger.warning(f"Circuit breaker for {self.name} opened for {self._open_for:.0f}s "
+                       f"after {self._failures} failures")
+
+    def stats(self) -> Dict[str, Any]:
+        state = self.state
+        with self._lock:
+            return {
+                'name': self.name,
+                'state': state,
+                'consecutive_failures': self._failures,
+                'trips': self._trips,
+                'rejected_calls': self._rejected,
+                'retry_after_seconds': round(
+                    max(0.0, self._open_for - (time.monotonic() - self._opened_at)), 1
+                ) if state == STATE_OPEN else 0.0
+            }
+
+    def call(self, func: Callable[[], T], is_failure: Callable[[T], bool] = lambda result: False,
+             retries: int = 0, backoff_base: float = 0.5, backoff_cap: float = 10.0,
+             should_retry: Callable[[Optional[T], Optional[BaseException]], bool] = lambda result, error: True) -> T:
+        """
+        Run func under the breaker, retrying failures with jittered backoff
+
+        A call counts as failed if it raises or if is_failure returns True
+        for its result. should_retry(result, error) decides whether a failed
+        attempt may be repeated; callers use it to keep non-idempotent
+        requests from being sent twice. The whole call, retries included,
+        counts once toward the breaker. The last result (or exception) is
+        returned once retries are exhausted or the breaker opens.
+        """
+        self.before_call()
+        probing = self.state == STATE_HALF_OPEN
+        attempt = 0
+        while True:
+            error: Optional[BaseException] = None
+            result: Optional[T] = None
+            try:
+                result = func()
+            except Exception as e:
+                error = e
+            else:
+                if not is_failure(result):
+                    self.record_success()
+                    return result
+
+            # A half-open probe gets a single attempt; another thread may also have opened the breaker
+            if (attempt >= retries or probing or self.state == STATE_OPEN
+                    or not should_retry(result, error)):
+                self.record_failure()
+                if error is not None:
+                    raise error
+                return result
+
+            delay = backoff_delay(attempt, backoff_base, backoff_cap)
+            logger.info(f"Retrying {self.name} in {delay:.1f}s (attempt {attempt + 2}/{retries + 1})")
+            time.sleep(delay)
+            attempt += 1
+
+
+def all_stats() -> List[Dict[str, Any]]:
+    """
+    State of every circuit breaker
+    """
+    return [breaker.stats() for breaker in _breakers.values()]
@@ -0,0 +1,248 @@
+"""
+Dead-letter store for failed pipeline steps
+
+When a pipeline step does not succeed (an upstream error, a timeout, or a
+step skipped because its dependency failed) the document, step, request
+payload and error are written to a local SQLite database. Entries stay
+pending until the step succeeds for that document again, either through
+a replay or a later webhook, so an outage can be repaired by replaying only
+what failed instead of reprocessing the whole archive.
+
+A document has at most one pending entry per step; repeated failures update
+it and count up `failures`. Step "pipeline" records runs that raised before
+any step result was available.
+"""
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+STATUS_PENDING = 'pending'
+STATUS_RESOLVED = 'resolved'
+STATUS_DISCARDED = 'discarded'
+
+PIPELINE_STEP = 'pipeline'
+
+
+class DeadLetterStore:
+    """
+    Failed pipeline steps in a local SQLite database
+
+    Resolved and discarded entries are removed after `retention_seconds`.
+    """
+
+    def __init__(self, path: str, retention_seconds: float = 2592000):
+        self.path = path
+        self.retention_seconds = retention_seconds
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._local = threading.local()
+        self._last_prune = 0.0
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS dead_letters (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    document_id INTEGER NOT NULL,
+                    step TEXT NOT NULL,
+                    event TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    payload TEXT,
+                    error TEXT,
+                    result TEXT,
+                    failures INTEGER NOT NULL DEFAULT 1,
+                    replays INTEGER NOT NULL DEFAULT 0,
+                    first_failed_at REAL NOT NULL,
+                    last_failed_at REAL NOT NULL,
+                    resolved_at REAL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS dead_letters_status ON dead_letters (status, step, id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS dead_letters_document ON dead_letters (document_id, status)")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _row_to_entry(row: sqlite3.Row) -> Dict[str, Any]:
+        entry = dict(row)
+        for column in ('payload', 'result'):
+            entry[column] = json.loads(entry[column]) if entry[column] else None
+        return entry
+
+    def record(self, document_id: int, step: str, event: str, payload: Dict[str, Any],
+               error: str, result: Optional[Dict[str, Any]] = None) -> int:
+        """
+        Record a failed step, updating the document's pending entry for it if there is one
+        """
+        now = time.time()
+        fields = {
+            'document_id': document_id,
+            'step': step,
+            'event': event,
+            'payload': json.dumps(payload, default=str),
+            'error': error,
+            'result': json.dumps(result, default=str) if result is not None else None,
+            'now': now,
+            'pending': STATUS_PENDING
+        }
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT id FROM dead_letters WHERE document_id = ? AND step = ? AND status = ?",
+                (document_id, step, STATUS_PENDING)
+            ).fetchone()
+            if row is not None:
+                conn.execute(
+                    """
+                    UPDATE dead_letters SET event = :event, payload = :payload, error = :error,
+                        result = :result, failures = failures + 1, last_failed_at = :now
+                    WHERE id = :id
+                    """,
+                    dict(fields, id=row['id'])
+                )
+                entry_id = row['id']
+            else:
+                cursor = conn.execute(
+                    """
+                    INSERT INTO dead_letters (document_id, step, event, status, payload, error, result,
+                        first_failed_at, last_failed_at)
+                    VALUES (:document_id, :step, :event, :pending, :payload, :error, :result, :now, :now)
+                    """,
+                    fields
+                )
+                entry_id = cursor.lastrowid
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        self._maybe_prune()
+        return entry_id
+
+    def resolve(self, document_id: int, steps: Iterable[str]) -> int:
+        """
+        Mark the document's pending entries for `steps` as resolved
+        """
+        steps = list(steps)
+        if not steps:
+            return 0
+        placeholders = ', '.join('?' for _ in steps)
+        cursor = self._connect().execute(
+            f"""
+            UPDATE dead_letters SET status = ?, resolved_at = ?
+            WHERE document_id = ? AND status = ? AND step IN ({placeholders})
+            """,
+            (STATUS_RESOLVED, time.time(), document_id, STATUS_PENDING, *steps)
+        )
+        return cursor.rowcount
+
+    def mark_replayed(self, entry_ids: Iterable[int]) -> None:
+        entry_ids = list(entry_ids)
+        if entry_ids:
+            placeholders = ', '.join('?' for _ in entry_ids)
+            self._connect().execute(
+                f"UPDATE dead_letters SET replays = replays + 1 WHERE id IN ({placeholders})", entry_ids
+            )
+
+    def discard(self, entry_id: int) -> bool:
+        """
+        Give up on a pending entry without replaying it
+        """
+        cursor = self._connect().execute(
+            "UPDATE dead_letters SET status = ?, resolved_at = ? WHERE id = ? AND status = ?",
+            (STATUS_DISCARDED, time.time(), entry_id, STATUS_PENDING)
+        )
+        return cursor.rowcount > 0
+
+    def get(self, entry_id: int) -> Optional[Dict[str, Any]]:
+        row = self._connect().execute("SELECT * FROM dead_letters WHERE id = ?", (entry_id,)).fetchone()
+        return self._row_to_entry(row) if row else None
+
+    def _filters(self, status: Optional[str], step: Optional[str],
+                 document_ids: Optional[List[int]], entry_ids: Optional[List[int]]):
+        clauses, params = [], []
+        if status:
+            clauses.append('status = ?')
+            params.append(status)
+        if step:
+            clauses.append('step = ?')
+            params.append(step)
+        for column, values in (('document_id', document_ids), ('id', entry_ids)):
+            if values is not None:
+                clauses.append(f"{column} IN ({', '.join('?' for _ in values) or 'NULL'})")
+                params.extend(values)
+        return (' WHERE ' + ' AND '.join(clauses)) if clauses else '', params
+
+    def list(self, status: Optional[str] = STATUS_PENDING, step: Optional[str] = None,
+             document_ids: Optional[List[int]] = None, entry_ids: Optional[List[int]] = None,
+             limit: int = 100, offset: int = 0) -> List[Dict[str, Any]]:
+        """
+        Entries matching the filters, oldest first
+        """
+        where, params = self._filters(status, step, document_ids, entry_ids)
+        rows = self._connect().execute(
+            f"SELECT * FROM dead_letters{where} ORDER BY id LIMIT ? OFFSET ?",
+            (*params, limit, offset)
+        ).fetchall()
+        return [self._row_to_entry(row) for row in rows]
+
+    def count(self, status: Optional[str] = STATUS_PENDING, step: Optional[str] = None,
+              document_ids: Optional[List[int]] = None) -> int:
+        where, params = self._filters(status, step, document_ids, None)
+        return self._connect().execute(f"SELECT COUNT(*) FROM dead_letters{where}", params).fetchone()[0]
+
+    def stats(self) -> Dict[str, Any]:
+        rows = self._connect().execute(
+            "SELECT status, step, COUNT(*) AS n FROM dead_letters GROUP BY status, step"
+        ).fetchall()
+        by_status: Dict[str, int] = {}
+        pending_by_step: Dict[str, int] = {}
+        for row in rows:
+            by_status[row['status']] = by_status.get(row['status'], 0) + row['n']
+            if row['status'] == STATUS_PENDING:
+                pending_by_step[row['step']] = row['n']
+        return {'by_status': by_status, 'pending_by_step': pending_by_step}
+
+    def prune(self, older_than: float) -> int:
+        cursor = self._connect().execute(
+            "DELETE FROM dead_letters WHERE status != ? AND resolved_at < ?",
+            (STATUS_PENDING, older_than)
+        )
+        return cursor.rowcount
+
+    def _maybe_prune(self) -> None:
+        if time.time() - self._last_prune < 3600:
+            return
+        self._last_prune = time.time()
+        try:
+            removed = self.prune(time.time() - self.retention_seconds)
+            if removed:
+                logger.info(f"Pruned {removed} resolved dead letters")
+        except Exception as e:
+            logger.warning(f"Error pruning dead letters: {str(e)}")
+
+
+def entry_to_dict(entry: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Render a dead-letter entry for API responses
+    """
+    def iso(ts):
+        return datetime.utcfromtimestamp(ts).isoformat() if ts else None
+
+    return dict(
+        entry,
+        first_failed_at=iso(entry['first_failed_at']),
+        last_failed_at=iso(entry['last_failed_at']),
+        resolved_at=iso(entry['resolved_at'])
+    )
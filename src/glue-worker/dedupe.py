@@ -0,0 +1,181 @@
+"""
+Duplicate webhook suppression for glue-worker
+
+Paperless typically sends document_added followed by document_updated for
+the same document within seconds. The deduplicator folds such events into a
+job that is already queued or running, and drops repeats of an event that
+was seen recently, so the expensive GPT step only runs once per change.
+
+Recent events are keyed on (document_id, content_hash) when the webhook
+carries the document body, and on (document_id, event) otherwise. The
+document's `modified` timestamp is part of the key when present, so a later
+edit is never mistaken for a repeat, even one that leaves the hashed fields
+alone (e.g. a tag change).
+"""
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple, List
+
+from jobqueue import JobQueue, STATUS_FAILED, STATUS_RUNNING
+
+logger = logging.getLogger(__name__)
+
+DECISION_QUEUED = 'queued'
+DECISION_MERGED = 'merged'
+DECISION_DUPLICATE = 'duplicate'
+
+
+def content_hash(document: Optional[Dict[str, Any]], fields: List[str]) -> Optional[str]:
+    """
+    Stable hash of the selected document fields, or None if there is nothing to hash
+    """
+    if not document or not fields:
+        return None
+    selected = {field: document.get(field) for field in fields if field in document}
+    if not selected:
+        return None
+    encoded = json.dumps(selected, sort_keys=True, default=str).encode('utf-8')
+    return hashlib.sha256(encoded).hexdigest()
+
+
+class RecentEvents:
+    """
+    Bounded in-memory LRU of recently seen event keys and the job they created
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[str, Tuple[str, float]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            job_id, seen_at = entry
+            if time.time() - seen_at > self.ttl_seconds:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return job_id
+
+    def put(self, key: str, job_id: str) -> None:
+        with self._lock:
+            self._entries[key] = (job_id, time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteRecentEvents(RecentEvents):
+    """
+    Recent events kept in SQLite so suppression survives restarts and is
+    shared between worker processes; the in-memory LRU fronts the database
+    """
+
+    def __init__(self, path: str, ttl_seconds: float, max_entries: int):
+        super().__init__(ttl_seconds, max_entries)
+        self.path = path
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._local = threading.local()
+        self._writes = 0
+        self._connect().execute("""
+            CREATE TABLE IF NOT EXISTS recent_events (
+                key TEXT PRIMARY KEY,
+                job_id TEXT NOT NULL,
+                seen_at REAL NOT NULL
+            )
+        """)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[str]:
+        job_id = super().get(key)
+        if job_id is not None:
+            return job_id
+        row = self._connect().execute(
+            "SELECT job_id, seen_at FROM recent_events WHERE key = ? AND seen_at >= ?",
+            (key, time.time() - self.ttl_seconds)
+        ).fetchone()
+        return row[0] if row else None
+
+    def put(self, key: str, job_id: str) -> None:
+        super().put(key, job_id)
+        conn = self._connect()
+        conn.execute(
+            "INSERT OR REPLACE INTO recent_events (key, job_id, seen_at) VALUES (?, ?, ?)",
+            (key, job_id, time.time())
+        )
+        self._writes += 1
+        if self._writes % 1000 == 0:
+            conn.execute("DELETE FROM recent_events WHERE seen_at < ?",
+                         (time.time() - self.ttl_seconds,))
+
+
+class Deduplicator:
+    """
+    Decides whether a webhook event needs a new pipeline job
+    """
+
+    def __init__(self, job_queue: JobQueue, recent: RecentEvents, hash_fields: List[str]):
+        self.job_queue = job_queue
+        self.recent = recent
+        self.hash_fields = hash_fields
+
+    def submit(self, document_id: int, event: str,
+               document: Optional[Dict[str, Any]] = None) -> Tuple[str, Dict[str, Any]]:
+        """
+        Queue the event unless it duplicates or can be merged into existing work
+
+        Returns the decision and the job that will cover the event.
+        """
+        modified = document.get('modified') if document else None
+        digest = content_hash(document, self.hash_fields)
+        if digest and modified:
+            digest = content_hash(document, self.hash_fields + ['modified'])
+        key = f'{document_id}:{digest or event}'
+        if modified and not digest:
+            key = f'{key}:{modified}'
+
+        # Document already queued or processing: fold this event into that job. A running
+        # job may already have read the old content, so it runs again afterwards unless
+        # the event carries exactly the version it is processing. This comes before the
+        # repeat check so that an edit made while the job runs is never dropped.
+        active = self.job_queue.store.find_active(document_id)
+        if active is not None:
+            changed = (active['status'] == STATUS_RUNNING
+                       and (digest is None or active.get('content_hash') != digest))
+            if self.job_queue.store.merge(active['id'], rerun=changed, modified=modified):
+                self.recent.put(key, active['id'])
+                logger.info(f"Merged '{event}' for document {document_id} into job {active['id']}"
+                            f"{' (follow-up scheduled)' if changed else ''}")
+                return DECISION_MERGED, active
+
+        # Same event (or same version) seen recently and its job did not fail
+        job_id = self.recent.get(key)
+        if job_id is not None:
+            job = self.job_queue.get(job_id)
+            if job is not None and job['status'] != STATUS_FAILED:
+                logger.info(f"Suppressing duplicate '{event}' for document {document_id} (job {job_id})")
+                return DECISION_DUPLICATE, job
+
+        job = self.job_queue.submit(document_id, event, digest, modified=modified)
+        self.recent.put(key, job['id'])
+        return DECISION_QUEUED, job
@@ -0,0 +1,54 @@
+"""
+Gunicorn settings for glue-worker
+
+A single worker process is the default. Metrics, /stats and the in-memory
+deduplication window are per process, so one process with more threads
+gives one consistent view. With WEB_WORKERS above 1 the app splits its
+upstream rate limits between workers and deduplicates through SQLite.
+
+Loaded automatically by `gunicorn app:app` from the working directory. Each
+worker process runs its own job queue and pipeline threads against the
+shared job store, so the app is not preloaded: threads started before the
+fork would not survive it.
+
+On SIGTERM a worker stops accepting requests, finishes the ones in flight,
+then drains its running jobs (queued jobs stay in the store for the next
+process). Everything must fit in WEB_GRACEFUL_TIMEOUT; jobs cut off after
+that are picked up again when their lease expires.
+"""
+import os
+import sys
+
+from serving import available_cpus, worker_count
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers = worker_count(
+    os.getenv('WEB_WORKERS', '1'),
+    per_cpu=float(os.getenv('WEB_WORKERS_PER_CPU', '1')),
+    maximum=int(os.getenv('WEB_MAX_WORKERS', '4'))
+)
+# Lets the app split per-pod limits (PAPERLESS_GPT_RATE_LIMIT, PAPERLESS_AI_RATE_LIMIT) between workers
+os.environ['WEB_WORKER_PROCESSES'] = str(workers)
+worker_class = os.getenv('WEB_WORKER_CLASS', 'gthread')
+threads = int(os.getenv('WEB_THREADS', '8'))
+timeout = int(os.getenv('WEB_TIMEOUT', '120'))
+graceful_timeout = int(os.getenv('WEB_GRACEFUL_TIMEOUT', '60'))
+keepalive = int(os.getenv('WEB_KEEPALIVE', '5'))
+max_requests = int(os.getenv('WEB_MAX_REQUESTS', '0'))
+max_requests_jitter = max_requests // 10
+preload_app = False
+accesslog = '-' if os.getenv('WEB_ACCESS_LOG', 'false').lower() == 'true' else None
+
+
+def on_starting(server):
+    server.log.info(f"Starting {workers} {worker_class} workers x {threads} threads "
+                    f"({available_cpus()} CPUs available)")
+
+
+def worker_exit(server, worker):
+    """
+    Drain this worker's in-flight jobs before the process exits
+    """
+    app_module = sys.modules.get('app')
+    if app_module is not None:
+        app_module.shutdown()
@@ -0,0 +1,769 @@
+"""
+Job queue for the glue-worker pipeline
+
+Webhooks enqueue documents here and return immediately; a bounded pool of
+worker threads drains the queue in the background. Jobs are persisted in a
+pluggable local store (SQLite or plain JSON files) so that queued work
+survives a pod restart.
+
+Every job belongs to a priority lane: interactive (manual /process calls),
+live (Paperless webhooks) or backfill (bulk reprocessing). Free workers are
+shared between lanes by weight (stride scheduling) and each lane can be
+capped, so a large backfill cannot occupy every worker.
+"""
+import os
+import json
+import time
+import uuid
+import sqlite3
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Any, Optional, Callable
+
+logger = logging.getLogger(__name__)
+
+STATUS_QUEUED = 'queued'
+STATUS_RUNNING = 'running'
+STATUS_COMPLETED = 'completed'
+STATUS_FAILED = 'failed'
+
+LANE_INTERACTIVE = 'interactive'
+LANE_LIVE = 'live'
+LANE_BACKFILL = 'backfill'
+LANES = (LANE_INTERACTIVE, LANE_LIVE, LANE_BACKFILL)
+
+DEFAULT_LANE_WEIGHTS = {LANE_INTERACTIVE: 8, LANE_LIVE: 4, LANE_BACKFILL: 1}
+
+
+def parse_lane_settings(spec: str) -> Dict[str, float]:
+    """
+    Parse "interactive=8,live=4,backfill=1" into a dict keyed by lane
+    """
+    settings = {}
+    for part in filter(None, (item.strip() for item in spec.split(','))):
+        lane, _, value = part.partition('=')
+        lane = lane.strip()
+        if lane not in LANES:
+            raise ValueError(f"Unknown job lane '{lane}' (expected one of {', '.join(LANES)})")
+        settings[lane] = float(value)
+    return settings
+
+
+def new_job(document_id: int, event: str, content_hash: Optional[str] = None,
+            lane: str = LANE_LIVE, modified: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Build a fresh job record for a document event
+
+    modified is the Paperless `modified` timestamp of the document version
+    the event announced, if known.
+    """
+    return {
+        'id': uuid.uuid4().hex,
+        'document_id': document_id,
+        'event': event,
+        'lane': lane,
+        'content_hash': content_hash,
+        'modified': modified,
+        'status': STATUS_QUEUED,
+        'attempts': 0,
+        'merged': 0,
+        'rerun': 0,
+        'result': None,
+        'error': None,
+        'created_at': time.time(),
+        'started_at': None,
+        'finished_at': None,
+        'lease_until': None
+    }
+
+
+def job_to_dict(job: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Render a job record for API responses
+    """
+    def iso(ts):
+        return datetime.utcfromtimestamp(ts).isoformat() if ts else None
+
+    return {
+        'job_id': job['id'],
+        'document_id': job['document_id'],
+        'event': job['event'],
+        'lane': job.get('lane', LANE_LIVE),
+        'status': job['status'],
+        'attempts': job['attempts'],
+        'merged_events': job.get('merged', 0),
+        'result': job['result'],
+        'error': job['error'],
+        'created_at': iso(job['created_at']),
+        'started_at': iso(job['started_at']),
+        'finished_at': iso(job['finished_at'])
+    }
+
+
+class JobStore:
+    """
+    Base class for job persistence backends
+
+    A claimed job holds a lease that the running worker keeps renewing; if
+    the process dies while the job is running the lease expires and another
+    worker picks the job up again.
+    """
+
+    def put(self, job: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def claim(self, lease_seconds: float, lane: str = LANE_LIVE) -> Optional[Dict[str, Any]]:
+        """
+        Lease the oldest runnable job in `lane`, if any
+        """
+        raise NotImplementedError
+
+    def renew(self, job_id: str, lease_until: float) -> bool:
+        """
+        Extend the lease of a running job; False if it is no longer running
+        """
+        raise NotImplementedError
+
+    def find_active(self, document_id: int) -> Optional[Dict[str, Any]]:
+        """
+        Most recent queued or running job for a document, if any
+        """
+        raise NotImplementedError
+
+    def merge(self, job_id: str, rerun: bool = False, modified: Optional[str] = None) -> bool:
+        """
+        Fold another event into an active job
+
+        With rerun set, the document is queued once more after the job
+        finishes. The job takes over the event's `modified` timestamp (None
+        if unknown), since the event announced the newest version. Returns
+        False if the job is no longer active.
+        """
+        raise NotImplementedError
+
+    def update(self, job_id: str, **fields) -> None:
+        raise NotImplementedError
+
+    def depth(self, lane: Optional[str] = None) -> int:
+        """
+        Queued jobs, in one lane or in total
+        """
+        raise NotImplementedError
+
+    def prune(self, older_than: float) -> int:
+        raise NotImplementedError
+
+
+class SQLiteJobStore(JobStore):
+    """
+    Job store backed by a local SQLite database
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    document_id INTEGER NOT NULL,
+                    event TEXT NOT NULL,
+                    lane TEXT NOT NULL DEFAULT 'live',
+                    content_hash TEXT,
+                    modified TEXT,
+                    status TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    merged INTEGER NOT NULL DEFAULT 0,
+                    rerun INTEGER NOT NULL DEFAULT 0,
+                    result TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL,
+                    lease_until REAL
+                )
+            """)
+            self._migrate(conn)
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_document ON jobs (document_id, status)")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_lane ON jobs (lane, status, created_at)")
+
+    # Columns added after the first release of the job store
+    _added_columns = {
+        'content_hash': 'TEXT',
+        'merged': 'INTEGER NOT NULL DEFAULT 0',
+        'rerun': 'INTEGER NOT NULL DEFAULT 0',
+        'lane': "TEXT NOT NULL DEFAULT 'live'",
+        'modified': 'TEXT'
+    }
+
+    def _migrate(self, conn: sqlite3.Connection) -> None:
+        existing = {row['name'] for row in conn.execute("PRAGMA table_info(jobs)")}
+        for column, definition in self._added_columns.items():
+            if column not in existing:
+                conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {definition}")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _row_to_job(row: sqlite3.Row) -> Dict[str, Any]:
+        job = dict(row)
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        return job
+
+    def put(self, job: Dict[str, Any]) -> None:
+        record = dict(job)
+        record['result'] = json.dumps(record['result']) if record['result'] is not None else None
+        columns = ', '.join(record)
+        placeholders = ', '.join(f':{key}' for key in record)
+        self._connect().execute(
+            f"INSERT OR REPLACE INTO jobs ({columns}) VALUES ({placeholders})", record
+        )
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        row = self._connect().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row_to_job(row) if row else None
+
+    def claim(self, lease_seconds: float, lane: str = LANE_LIVE) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                """
+                SELECT * FROM jobs
+                WHERE lane = ? AND (status = ? OR (status = ? AND lease_until < ?))
+                ORDER BY created_at LIMIT 1
+                """,
+                (lane, STATUS_QUEUED, STATUS_RUNNING, now)
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                """
+                UPDATE jobs SET status = ?, attempts = attempts + 1,
+                    started_at = ?, lease_until = ?
+                WHERE id = ?
+                """,
+                (STATUS_RUNNING, now, now + lease_seconds, row['id'])
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return self.get(row['id'])
+
+    def renew(self, job_id: str, lease_until: float) -> bool:
+        cursor = self._connect().execute(
+            "UPDATE jobs SET lease_until = ? WHERE id = ? AND status = ?",
+            (lease_until, job_id, STATUS_RUNNING)
+        )
+        return cursor.rowcount > 0
+
+    def find_active(self, document_id: int) -> Optional[Dict[str, Any]]:
+        row = self._connect().execute(
+            """
+            SELECT * FROM jobs WHERE document_id = ? AND status IN (?, ?)
+            ORDER BY created_at DESC LIMIT 1
+            """,
+            (document_id, STATUS_QUEUED, STATUS_RUNNING)
+        ).fetchone()
+        return self._row_to_job(row) if row else None
+
+    def merge(self, job_id: str, rerun: bool = False, modified: Optional[str] = None) -> bool:
+        cursor = self._connect().execute(
+            """
+            UPDATE jobs SET merged = merged + 1, rerun = MAX(rerun, ?), modified = ?
+            WHERE id = ? AND status IN (?, ?)
+            """,
+            (int(rerun), modified, job_id, STATUS_QUEUED, STATUS_RUNNING)
+        )
+        return cursor.rowcount > 0
+
+    def update(self, job_id: str, **fields) -> None:
+        if 'result' in fields and fields['result'] is not None:
+            fields['result'] = json.dumps(fields['result'])
+        assignments = ', '.join(f"{key} = :{key}" for key in fields)
+        self._connect().execute(
+            f"UPDATE jobs SET {assignments} WHERE id = :job_id", dict(fields, job_id=job_id)
+        )
+
+    def depth(self, lane: Optional[str] = None) -> int:
+        if lane is None:
+            row = self._connect().execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = ?", (STATUS_QUEUED,)
+            ).fetchone()
+        else:
+            row = self._connect().execute(
+                "SELECT COUNT(*) FROM jobs WHERE lane = ? AND status = ?", (lane, STATUS_QUEUED)
+            ).fetchone()
+        return row[0]
+
+    def prune(self, older_than: float) -> int:
+        cursor = self._connect().execute(
+            "DELETE FROM jobs WHERE status IN (?, ?) AND finished_at < ?",
+            (STATUS_COMPLETED, STATUS_FAILED, older_than)
+        )
+        return cursor.rowcount
+
+
+class FileJobStore(JobStore):
+    """
+    Job store backed by one JSON file per job
+
+    Jobs live in a directory per status (queued jobs in a subdirectory per
+    lane); claiming a job is an atomic rename from queued/ to running/, so
+    several worker processes can share a volume. active/<document_id> names
+    the newest job submitted for a document, so find_active does not have to
+    read every queued file; entries of finished jobs are ignored and pruned.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        for status in (STATUS_QUEUED, STATUS_RUNNING, STATUS_COMPLETED, STATUS_FAILED):
+            os.makedirs(os.path.join(path, status), exist_ok=True)
+        for lane in LANES:
+            os.makedirs(os.path.join(path, STATUS_QUEUED, lane), exist_ok=True)
+        self._lock = threading.Lock()
+        self.index_dir = os.path.join(path, 'active')
+        if not os.path.isdir(self.index_dir):
+            os.makedirs(self.index_dir, exist_ok=True)
+            self._rebuild_index()
+
+    def _index_path(self, document_id: int) -> str:
+        return os.path.join(self.index_dir, str(document_id))
+
+    def _index(self, job: Dict[str, Any]) -> None:
+        target = self._index_path(job['document_id'])
+        tmp = f'{target}.tmp-{os.getpid()}-{threading.get_ident()}'
+        with open(tmp, 'w') as f:
+            f.write(job['id'])
+        os.replace(tmp, target)
+
+    def _rebuild_index(self) -> None:
+        """
+        Index jobs that were queued or running before the index existed
+        """
+        latest: Dict[int, Dict[str, Any]] = {}
+        for directory in [*self._queued_dirs(), os.path.join(self.path, STATUS_RUNNING)]:
+            for name in os.listdir(directory):
+                if not name.endswith('.json'):
+                    continue
+                job = self._read(os.path.join(directory, name))
+                if job and (job['document_id'] not in latest
+                            or job['created_at'] > latest[job['document_id']]['created_at']):
+                    latest[job['document_id']] = job
+        for job in latest.values():
+            self._index(job)
+
+    def _queued_dirs(self, lane: Optional[str] = None):
+        """
+        Directories holding queued jobs; files directly under queued/ predate lanes
+        """
+        root = os.path.join(self.path, STATUS_QUEUED)
+        for name in LANES:
+            if lane in (None, name):
+                yield os.path.join(root, name)
+        if lane in (None, LANE_LIVE):
+            yield root
+
+    def _file(self, status: str, job_id: str, lane: Optional[str] = None) -> str:
+        if status == STATUS_QUEUED:
+            return os.path.join(self.path, status, lane or LANE_LIVE, f'{job_id}.json')
+        return os.path.join(self.path, status, f'{job_id}.json')
+
+    def _write(self, job: Dict[str, Any]) -> None:
+        target = self._file(job['status'], job['id'], job.get('lane'))
+        tmp = f'{target}.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(job, f)
+        os.replace(tmp, target)
+
+    def _read(self, path: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _locate(self, job_id: str) -> Optional[str]:
+        paths = [self._file(STATUS_RUNNING, job_id)]
+        paths.extend(os.path.join(directory, f'{job_id}.json') for directory in self._queued_dirs())
+        paths.extend(self._file(status, job_id) for status in (STATUS_COMPLETED, STATUS_FAILED))
+        for path in paths:
+            if os.path.exists(path):
+                return path
+        return None
+
+    def put(self, job: Dict[str, Any]) -> None:
+        self._write(job)
+        if job['status'] in (STATUS_QUEUED, STATUS_RUNNING):
+            self._index(job)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        path = self._locate(job_id)
+        return self._read(path) if path else None
+
+    def _candidates(self, lane: str):
+        running_dir = os.path.join(self.path, STATUS_RUNNING)
+        now = time.time()
+        entries = []
+        for queued_dir in self._queued_dirs(lane):
+            for name in os.listdir(queued_dir):
+                if name.endswith('.json'):
+                    path = os.path.join(queued_dir, name)
+                    try:
+                        entries.append((os.path.getmtime(path), path))
+                    except OSError:
+                        continue
+        for name in os.listdir(running_dir):
+            if name.endswith('.json'):
+                path = os.path.join(running_dir, name)
+                job = self._read(path)
+                if (job and job.get('lease_until') and job['lease_until'] < now
+                        and job.get('lane', LANE_LIVE) == lane):
+                    entries.append((job['created_at'], path))
+        return [path for _, path in sorted(entries)]
+
+    def claim(self, lease_seconds: float, lane: str = LANE_LIVE) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            for path in self._candidates(lane):
+                job_id = os.path.basename(path)[:-len('.json')]
+                claimed = f'{self._file(STATUS_RUNNING, job_id)}.claim-{os.getpid()}'
+                try:
+                    os.rename(path, claimed)
+                except OSError:
+                    continue  # Another process claimed it first
+                job = self._read(claimed)
+                os.remove(claimed)
+                if job is None:
+                    continue
+                now = time.time()
+                job.update(status=STATUS_RUNNING, attempts=job['attempts'] + 1,
+                           started_at=now, lease_until=now + lease_seconds)
+                self._write(job)
+                return job
+        return None
+
+    def renew(self, job_id: str, lease_until: float) -> bool:
+        with self._lock:
+            job = self.get(job_id)
+            if job is None or job['status'] != STATUS_RUNNING:
+                return False
+            self._rewrite(job_id, lease_until=lease_until)
+            return True
+
+    def find_active(self, document_id: int) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._index_path(document_id)) as f:
+                job_id = f.read().strip()
+        except OSError:
+            return None
+        job = self.get(job_id) if job_id else None
+        if job is not None and job['status'] in (STATUS_QUEUED, STATUS_RUNNING):
+            return job
+        return None
+
+    def merge(self, job_id: str, rerun: bool = False, modified: Optional[str] = None) -> bool:
+        with self._lock:
+            job = self.get(job_id)
+            if job is None or job['status'] not in (STATUS_QUEUED, STATUS_RUNNING):
+                return False
+            self._rewrite(job_id, merged=job.get('merged', 0) + 1, rerun=max(job.get('rerun', 0), int(rerun)),
+                          modified=modified)
+            return True
+
+    def update(self, job_id: str, **fields) -> None:
+        with self._lock:
+            self._rewrite(job_id, **fields)
+
+    def _rewrite(self, job_id: str, **fields) -> None:
+        old_path = self._locate(job_id)
+        job = self._read(old_path) if old_path else None
+        if job is None:
+            return
+        job.update(fields)
+        self._write(job)
+        if self._file(job['status'], job_id, job.get('lane')) != old_path:
+            try:
+                os.remove(old_path)
+            except OSError:
+                pass
+
+    def depth(self, lane: Optional[str] = None) -> int:
+        return sum(1 for directory in self._queued_dirs(lane)
+                   for name in os.listdir(directory) if name.endswith('.json'))
+
+    def prune(self, older_than: float) -> int:
+        removed = 0
+        for status in (STATUS_COMPLETED, STATUS_FAILED):
+            directory = os.path.join(self.path, status)
+            for name in os.listdir(directory):
+                path = os.path.join(directory, name)
+                job = self._read(path)
+                if job and (job.get('finished_at') or 0) < older_than:
+                    try:
+                        os.remove(path)
+                        removed += 1
+                    except OSError:
+                        pass
+
+        # Index entries whose job has finished
+        for name in os.listdir(self.index_dir):
+            if not name.isdigit():
+                continue
+            if self.find_active(int(name)) is None:
+                try:
+                    os.remove(os.path.join(self.index_dir, name))
+                except OSError:
+                    pass
+        return removed
+
+
+def create_job_store(backend: str, path: str) -> JobStore:
+    """
+    Build the configured job store backend
+    """
+    if backend == 'sqlite':
+        return SQLiteJobStore(path)
+    if backend == 'file':
+        return FileJobStore(path)
+    raise ValueError(f"Unknown job store backend: {backend}")
+
+
+class JobQueue:
+    """
+    Bounded in-process worker pool draining a persistent job store
+
+    lane_weights sets each lane's share of free workers when several lanes
+    have work; lane_limits caps how many workers a lane may hold at once
+    (default: all of them, except backfill which gets half).
+
+    A heartbeat renews the lease of every job this process is running a
+    third of the way into the lease, so long jobs are not claimed again
+    while they are still running.
+
+    handler(document_id, event, modified) runs one job; modified is the
+    document version the job was queued for, or None.
+    """
+
+    def __init__(self, store: JobStore, handler: Callable[[int, str, Optional[str]], Dict[str, Any]],
+                 max_workers: int = 4, poll_interval: float = 1.0,
+                 lease_seconds: float = 600, retention_seconds: float = 86400,
+                 lane_weights: Optional[Dict[str, float]] = None,
+                 lane_limits: Optional[Dict[str, float]] = None):
+        self.store = store
+        self.handler = handler
+        self.max_workers = max_workers
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.retention_seconds = retention_seconds
+        self.lane_weights = dict(DEFAULT_LANE_WEIGHTS, **(lane_weights or {}))
+        self.lane_limits = {lane: max_workers for lane in LANES}
+        self.lane_limits[LANE_BACKFILL] = max(1, max_workers // 2)
+        self.lane_limits.update({lane: int(limit) for lane, limit in (lane_limits or {}).items()})
+        if any(weight <= 0 for weight in self.lane_weights.values()):
+            raise ValueError('Job lane weights must be positive')
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self._slots = threading.BoundedSemaphore(max_workers)
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._dispatcher = None
+        self._heartbeat = None
+        self._heartbeat_stop = threading.Event()
+        self._running = set()
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        # Stride scheduling: each lane advances its pass by 1/weight per job
+        self._pass = {lane: 0.0 for lane in LANES}
+        self._virtual_time = 0.0
+        self._lane_in_flight = {lane: 0 for lane in LANES}
+        self._dispatched = {lane: 0 for lane in LANES}
+        self._finished = threading.Condition()
+        self._finished_count = 0
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def start(self) -> None:
+        if self._dispatcher is not None:
+            return
+        self._dispatcher = threading.Thread(target=self._dispatch_loop, name='job-dispatcher',
+                                            daemon=True)
+        self._dispatcher.start()
+        self._heartbeat = threading.Thread(target=self._heartbeat_loop, name='job-heartbeat',
+                                           daemon=True)
+        self._heartbeat.start()
+        logger.info(f"Job queue started with {self.max_workers} workers")
+
+    def submit(self, document_id: int, event: str, content_hash: Optional[str] = None,
+               lane: str = LANE_LIVE, modified: Optional[str] = None) -> Dict[str, Any]:
+        if lane not in LANES:
+            raise ValueError(f"Unknown job lane '{lane}'")
+        job = new_job(document_id, event, content_hash, lane, modified)
+        self.store.put(job)
+        self._wakeup.set()
+        return job
+
+    def wait(self, job_id: str, timeout: float) -> Optional[Dict[str, Any]]:
+        """
+        Block until a job has finished or `timeout` passes; returns its latest state
+
+        Jobs finished by this process wake the caller immediately; jobs run by
+        another process sharing the store are noticed by polling.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._finished:
+                seen = self._finished_count
+            job = self.store.get(job_id)
+            remaining = deadline - time.monotonic()
+            if job is None or job['status'] in (STATUS_COMPLETED, STATUS_FAILED) or remaining <= 0:
+                return job
+            with self._finished:
+                if self._finished_count == seen:
+                    self._finished.wait(min(remaining, 0.5))
+
+    def lane_stats(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            stats = {
+                lane: {
+                    'weight': self.lane_weights[lane],
+                    'max_concurrent': self.lane_limits[lane],
+                    'in_flight': self._lane_in_flight[lane],
+                    'dispatched': self._dispatched[lane]
+                }
+                for lane in LANES
+            }
+        for lane in LANES:
+            stats[lane]['queued'] = self.store.depth(lane)
+        return stats
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self.store.get(job_id)
+
+    def depth(self) -> int:
+        return self.store.depth()
+
+    def shutdown(self, wait: bool = True) -> None:
+        """
+        Stop claiming new jobs and optionally wait for in-flight jobs to finish
+        """
+        self._stopping.set()
+        self._wakeup.set()
+        if self._dispatcher is not None:
+            self._dispatcher.join(timeout=5)
+        self._executor.shutdown(wait=wait)
+        # Jobs still draining keep their leases until the executor is done
+        self._heartbeat_stop.set()
+
+    def _dispatch_loop(self) -> None:
+        last_prune = 0.0
+        while not self._stopping.is_set():
+            self._slots.acquire()
+            if self._stopping.is_set():
+                self._slots.release()
+                break
+            try:
+                job = self._claim_next()
+            except Exception as e:
+                logger.error(f"Error claiming job: {str(e)}")
+                job = None
+
+            if job is None:
+                self._slots.release()
+                if time.time() - last_prune > 3600:
+                    last_prune = time.time()
+                    self._prune()
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+
+            self._executor.submit(self._run, job)
+
+    def _claim_next(self) -> Optional[Dict[str, Any]]:
+        """
+        Claim from the lane that is furthest behind its fair share and under its cap
+        """
+        with self._lock:
+            lanes = sorted(
+                (lane for lane in LANES if self._lane_in_flight[lane] < self.lane_limits[lane]),
+                key=lambda lane: (self._pass[lane], LANES.index(lane))
+            )
+        for lane in lanes:
+            job = self.store.claim(self.lease_seconds, lane)
+            if job is None:
+                continue
+            with self._lock:
+                # A lane that sat idle starts from the current virtual time, not with banked credit
+                start = max(self._pass[lane], self._virtual_time)
+                self._virtual_time = start
+                self._pass[lane] = start + 1 / self.lane_weights[lane]
+                self._lane_in_flight[lane] += 1
+                self._dispatched[lane] += 1
+                self._in_flight += 1
+                self._running.add(job['id'])
+            return job
+        return None
+
+    def _run(self, job: Dict[str, Any]) -> None:
+        try:
+            logger.info(f"Running job {job['id']} for document {job['document_id']}")
+            result = self.handler(job['document_id'], job['event'], job.get('modified'))
+            self.store.update(job['id'], status=STATUS_COMPLETED, result=result,
+                              error=None, finished_at=time.time(), lease_until=None)
+        except Exception as e:
+            logger.error(f"Job {job['id']} for document {job['document_id']} failed: {str(e)}")
+            self.store.update(job['id'], status=STATUS_FAILED, error=str(e),
+                              finished_at=time.time(), lease_until=None)
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+                self._lane_in_flight[job.get('lane', LANE_LIVE)] -= 1
+                self._running.discard(job['id'])
+            self._slots.release()
+            self._wakeup.set()
+            with self._finished:
+                self._finished_count += 1
+                self._finished.notify_all()
+
+        # Events merged into this job while it was running may need one more pass
+        finished = self.store.get(job['id'])
+        if finished and finished.get('rerun'):
+            followup = self.submit(job['document_id'], 'rerun', lane=job.get('lane', LANE_LIVE),
+                                   modified=finished.get('modified'))
+            logger.info(f"Queued follow-up job {followup['id']} for document {job['document_id']}")
+
+    def _heartbeat_loop(self) -> None:
+        interval = max(self.lease_seconds / 3, 0.1)
+        while not self._heartbeat_stop.wait(interval):
+            with self._lock:
+                running = list(self._running)
+            for job_id in running:
+                try:
+                    self.store.renew(job_id, time.time() + self.lease_seconds)
+                except Exception as e:
+                    logger.warning(f"Error renewing lease of job {job_id}: {str(e)}")
+
+    def _prune(self) -> None:
+        try:
+            removed = self.store.prune(time.time() - self.retention_seconds)
+            if removed:
+                logger.info(f"Pruned {removed} finished jobs")
+        except Exception as e:
+            logger.warning(f"Error pruning finished jobs: {str(e)}")
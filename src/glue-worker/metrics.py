@@ -0,0 +1,207 @@
+"""
+Prometheus metrics for glue-worker
+
+All counters live in a dedicated registry that backs both the /metrics
+endpoint and the JSON /stats summary. Values are per worker process.
+"""
+import time
+from typing import Dict, Any, Callable, List
+
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+REGISTRY = CollectorRegistry()
+START_TIME = time.time()
+
+REQUESTS = Counter(
+    'glue_worker_requests_total',
+    'HTTP requests handled, by route and Paperless event type',
+    ['route', 'event', 'status'],
+    registry=REGISTRY
+)
+
+DOCUMENTS_PROCESSED = Counter(
+    'glue_worker_documents_processed_total',
+    'Documents that finished the pipeline, by outcome',
+    ['outcome'],
+    registry=REGISTRY
+)
+
+BATCHED_STEPS = Counter(
+    'glue_worker_batched_steps_total',
+    'Queued pipeline steps whose batch has run, by step and outcome',
+    ['step', 'outcome'],
+    registry=REGISTRY
+)
+
+STEP_LATENCY = Histogram(
+    'glue_worker_step_duration_seconds',
+    'Time spent in each pipeline step',
+    ['step'],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120),
+    registry=REGISTRY
+)
+
+UPSTREAM_ERRORS = Counter(
+    'glue_worker_upstream_errors_total',
+    'Failed upstream calls, by upstream and HTTP status code (or "connection")',
+    ['upstream', 'status_code'],
+    registry=REGISTRY
+)
+
+WEBHOOKS_DEDUPLICATED = Counter(
+    'glue_worker_webhooks_deduplicated_total',
+    'Webhook events that did not create a new job, by reason (duplicate or merged)',
+    ['reason'],
+    registry=REGISTRY
+)
+
+QUEUE_DEPTH = Gauge(
+    'glue_worker_queue_depth',
+    'Jobs waiting in the pipeline queue',
+    registry=REGISTRY
+)
+
+IN_FLIGHT = Gauge(
+    'glue_worker_jobs_in_flight',
+    'Pipeline jobs currently being processed by this process',
+    registry=REGISTRY
+)
+
+DEAD_LETTERS = Gauge(
+    'glue_worker_dead_letters',
+    'Failed pipeline steps waiting in the dead-letter store for a replay',
+    registry=REGISTRY
+)
+
+Gauge(
+    'glue_worker_uptime_seconds',
+    'Seconds since this worker process started',
+    registry=REGISTRY
+).set_function(lambda: time.time() - START_TIME)
+
+
+class UpstreamPoolCollector:
+    """
+    Exposes connection pool usage for every upstream client
+    """
+
+    def __init__(self, stats_func: Callable[[], List[Dict[str, Any]]]):
+        self.stats_func = stats_func
+
+    def collect(self):
+        gauges = {
+            'pool_size': GaugeMetricFamily(
+                'glue_worker_upstream_pool_size', 'Maximum connections per upstream',
+                labels=['upstream']),
+            'in_flight': GaugeMetricFamily(
+                'glue_worker_upstream_in_flight', 'Requests in flight per upstream',
+                labels=['upstream']),
+            'saturation': GaugeMetricFamily(
+                'glue_worker_upstream_pool_saturation', 'Fraction of the upstream pool in use',
+                labels=['upstream']),
+            'pool_waits': GaugeMetricFamily(
+                'glue_worker_upstream_pool_waits', 'Requests that had to wait for a free connection',
+                labels=['upstream']),
+            'pool_wait_seconds': GaugeMetricFamily(
+                'glue_worker_upstream_pool_wait_seconds', 'Total time spent waiting for a free connection',
+                labels=['upstream'])
+        }
+        for stats in self.stats_func():
+            for key, gauge in gauges.items():
+                gauge.add_metric([stats['name']], stats[key])
+        yield from gauges.values()
+
+
+class CircuitBreakerCollector:
+    """
+    Exposes circuit breaker state for every upstream
+    """
+
+    def __init__(self, stats_func: Callable[[], List[Dict[str, Any]]], state_values: Dict[str, int]):
+        self.stats_func = stats_func
+        self.state_values = state_values
+
+    def collect(self):
+        state = GaugeMetricFamily(
+            'glue_worker_circuit_breaker_state',
+            'Circuit breaker state per upstream (0 closed, 1 half-open, 2 open)',
+            labels=['upstream'])
+        failures = GaugeMetricFamily(
+            'glue_worker_circuit_breaker_consecutive_failures',
+            'Consecutive failed calls per upstream', labels=['upstream'])
+        rejected = CounterMetricFamily(
+            'glue_worker_circuit_breaker_rejected',
+            'Calls rejected while the breaker was open', labels=['upstream'])
+        for stats in self.stats_func():
+            state.add_metric([stats['name']], self.state_values[stats['state']])
+            failures.add_metric([stats['name']], stats['consecutive_failures'])
+            rejected.add_metric([stats['name']], stats['rejected_calls'])
+        yield from (state, failures, rejected)
+
+
+class LaneCollector:
+    """
+    Exposes queue depth, in-flight jobs and dispatch counts per job lane
+    """
+
+    def __init__(self, stats_func: Callable[[], Dict[str, Dict[str, Any]]]):
+        self.stats_func = stats_func
+
+    def collect(self):
+        queued = GaugeMetricFamily(
+            'glue_worker_lane_queue_depth', 'Jobs waiting per lane', labels=['lane'])
+        in_flight = GaugeMetricFamily(
+            'glue_worker_lane_in_flight', 'Jobs running in this process per lane', labels=['lane'])
+        limit = GaugeMetricFamily(
+            'glue_worker_lane_max_concurrent', 'Concurrency cap per lane', labels=['lane'])
+        dispatched = CounterMetricFamily(
+            'glue_worker_lane_dispatched', 'Jobs started by this process per lane', labels=['lane'])
+        for lane, stats in self.stats_func().items():
+            queued.add_metric([lane], stats['queued'])
+            in_flight.add_metric([lane], stats['in_flight'])
+            limit.add_metric([lane], stats['max_concurrent'])
+            dispatched.add_metric([lane], stats['dispatched'])
+        yield from (queued, in_flight, limit, dispatched)
+
+
+def register_collector(collector) -> None:
+    REGISTRY.register(collector)
+
+
+def render() -> bytes:
+    """
+    Prometheus text exposition of every registered metric
+    """
+    return generate_latest(REGISTRY)
+
+
+def counter_values(counter: Counter, label: str) -> Dict[str, float]:
+    """
+    Sum a labelled counter by one of its labels
+    """
+    totals = {}
+    for metric in counter.collect():
+        for sample in metric.samples:
+            if not sample.name.endswith('_total'):
+                continue
+            key = sample.labels[label]
+            totals[key] = totals.get(key, 0) + sample.value
+    return totals
+
+
+def histogram_summary(histogram: Histogram, label: str) -> Dict[str, Dict[str, float]]:
+    """
+    Count and mean of a labelled histogram, keyed by label value
+    """
+    summary = {}
+    for metric in histogram.collect():
+        for sample in metric.samples:
+            if sample.name.endswith('_count') or sample.name.endswith('_sum'):
+                entry = summary.setdefault(sample.labels[label], {'count': 0, 'sum': 0.0})
+                entry['count' if sample.name.endswith('_count') else 'sum'] += sample.value
+    for entry in summary.values():
+        entry['count'] = int(entry['count'])
+        entry['mean_seconds'] = round(entry['sum'] / entry['count'], 3) if entry['count'] else 0.0
+        entry['sum'] = round(entry['sum'], 3)
+    return summary
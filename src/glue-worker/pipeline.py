@@ -0,0 +1,177 @@
+"""
+Pipeline execution graph for glue-worker
+
+Steps declare which other steps they depend on. Steps whose dependencies are
+satisfied run together in a stage on a shared thread pool, so independent
+steps cost roughly the slowest step instead of the sum of all of them.
+
+A step can be given a timeout and a number of retries. A step is skipped if
+any step it explicitly depends on did not succeed.
+
+A step may return status "queued" when it handed the document to work that
+finishes later (e.g. a batched reindex). That is not a failure, so it is not
+retried, but it is not a success either: dependent steps are skipped and
+the step's latency is left for whoever sees the work finish.
+"""
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from dataclasses import dataclass, field
+from typing import Dict, Any, List, Callable, Optional
+
+from breaker import backoff_delay
+
+logger = logging.getLogger(__name__)
+
+PIPELINE_MODES = ('concurrent', 'sequential')
+
+STATUS_QUEUED = 'queued'
+
+
+@dataclass
+class PipelineStep:
+    """
+    A single step in the document pipeline
+    """
+    service: str
+    func: Callable[[int], Dict[str, Any]]
+    depends_on: List[str] = field(default_factory=list)
+    parallel: bool = True
+    timeout: Optional[float] = None
+    retries: int = 0
+    retry_backoff: float = 1.0
+
+
+def build_stages(steps: List[PipelineStep], mode: str = 'concurrent') -> List[List[PipelineStep]]:
+    """
+    Group steps into stages that can run at the same time
+
+    In sequential mode every step depends on the one declared before it.
+    Steps that are not marked parallel always run in a stage of their own.
+    """
+    if mode not in PIPELINE_MODES:
+        raise ValueError(f"Unknown pipeline mode: {mode}")
+
+    known = {step.service for step in steps}
+    dependencies = {}
+    for index, step in enumerate(steps):
+        missing = [dep for dep in step.depends_on if dep not in known]
+        if missing:
+            raise ValueError(f"Step {step.service} depends on unknown steps: {', '.join(missing)}")
+        deps = set(step.depends_on)
+        if mode == 'sequential' and index > 0:
+            deps.add(steps[index - 1].service)
+        dependencies[step.service] = deps
+
+    stages = []
+    done = set()
+    remaining = list(steps)
+    while remaining:
+        ready = [step for step in remaining if dependencies[step.service] <= done]
+        if not ready:
+            cycle = ', '.join(step.service for step in remaining)
+            raise ValueError(f"Pipeline steps have circular dependencies: {cycle}")
+
+        parallel = [step for step in ready if step.parallel]
+        if parallel:
+            stage = parallel
+        else:
+            stage = ready[:1]
+        stages.append(stage)
+        done.update(step.service for step in stage)
+        remaining = [step for step in remaining if step not in stage]
+
+    return stages
+
+
+class PipelineExecutor:
+    """
+    Runs pipeline stages, fanning out concurrent steps on a thread pool
+
+    on_step_finished, if given, is called with the step's service name and
+    its duration in seconds after every step that did not return "queued",
+    whether it succeeded or not.
+    Steps with a timeout run on a separate pool so an abandoned call does
+    not hold a stage worker.
+    """
+
+    def __init__(self, max_workers: int = 8,
+                 on_step_finished: Optional[Callable[[str, float], None]] = None):
+        self.max_workers = max_workers
+        self.on_step_finished = on_step_finished
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='step')
+        self._timed_executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='step-timed')
+
+    def run(self, steps: List[PipelineStep], document_id: int,
+            mode: str = 'concurrent') -> List[Dict[str, Any]]:
+        """
+        Execute the steps for a document and return results in declared order
+
+        Each entry carries the step's result, its duration in milliseconds
+        and the number of attempts made.
+        """
+        runs = {}
+        for stage in build_stages(steps, mode):
+            runnable = []
+            for step in stage:
+                failed = [dep for dep in step.depends_on if runs[dep]['result'].get('status') != 'success']
+                if failed:
+                    queued = [dep for dep in failed if runs[dep]['result'].get('status') == STATUS_QUEUED]
+                    reason = 'Dependency still queued' if queued == failed else 'Dependency failed'
+                    runs[step.service] = {
+                        'result': {'status': 'skipped', 'message': f"{reason}: {', '.join(failed)}"},
+                        'duration_ms': 0,
+                        'attempts': 0
+                    }
+                else:
+                    runnable.append(step)
+
+            if len(runnable) == 1:
+                step = runnable[0]
+                runs[step.service] = self._run_step(step, document_id)
+                continue
+
+            if runnable:
+                logger.info(f"Running steps {', '.join(s.service for s in runnable)} "
+                            f"concurrently for document {document_id}")
+            futures = {step.service: self._executor.submit(self._run_step, step, document_id)
+                       for step in runnable}
+            for service, future in futures.items():
+                runs[service] = future.result()
+
+        return [dict(runs[step.service], service=step.service) for step in steps]
+
+    def _run_step(self, step: PipelineStep, document_id: int) -> Dict[str, Any]:
+        started = time.monotonic()
+        attempts = 0
+        result = None
+        try:
+            while True:
+                attempts += 1
+                try:
+                    result = self._call(step, document_id)
+                except Exception as e:
+                    logger.warning(f"Step {step.service} failed for document {document_id}: {str(e)}")
+                    result = {'status': 'error', 'message': str(e)}
+                if result.get('status') in ('success', STATUS_QUEUED) or attempts > step.retries:
+                    break
+                time.sleep(backoff_delay(attempts - 1, step.retry_backoff, step.retry_backoff * 30))
+        finally:
+            elapsed = time.monotonic() - started
+            if self.on_step_finished is not None and (result or {}).get('status') != STATUS_QUEUED:
+                self.on_step_finished(step.service, elapsed)
+
+        return {'result': result, 'duration_ms': round(elapsed * 1000, 1), 'attempts': attempts}
+
+    def _call(self, step: PipelineStep, document_id: int) -> Dict[str, Any]:
+        if not step.timeout:
+            return step.func(document_id)
+        future = self._timed_executor.submit(step.func, document_id)
+        try:
+            return future.result(timeout=step.timeout)
+        except FutureTimeout:
+            return {'status': 'error', 'message': f'Step {step.service} timed out after {step.timeout:g}s'}
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait)
+        self._timed_executor.shutdown(wait=wait)
@@ -0,0 +1,51 @@
+"""
+Token-bucket rate limiting for glue-worker upstream calls
+"""
+import time
+import threading
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket
+
+    Tokens refill continuously at `rate` per second up to `burst`. acquire()
+    blocks until a token is available. A rate of 0 disables limiting.
+    """
+
+    def __init__(self, rate: float, burst: float = None):
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1.0, rate)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self._waited_seconds = 0.0
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, tokens: float = 1.0) -> float:
+        """
+        Take tokens from the bucket, sleeping until they are available
+
+        Returns the number of seconds spent waiting.
+        """
+        if self.rate <= 0:
+            return 0.0
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    self._waited_seconds += waited
+                    return waited
+                delay = (tokens - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    @property
+    def waited_seconds(self) -> float:
+        return self._waited_seconds
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Command-line client for the glue-worker dead-letter store
+
+    # what failed, and where
+    python replay.py list --step paperless-ai
+
+    # after an outage: run the failed steps again, 8 documents at a time
+    python replay.py replay --concurrency 8
+
+    # give up on an entry
+    python replay.py discard 42
+
+Talks to a running glue-worker (GLUE_WORKER_URL, default
+http://localhost:5000), so it can be run from the pod with kubectl exec or
+from anywhere the service is reachable.
+"""
+import os
+import sys
+import json
+import argparse
+
+import requests
+
+
+def list_entries(args) -> int:
+    params = {'status': args.status, 'limit': args.limit, 'offset': args.offset}
+    if args.step:
+        params['step'] = args.step
+    if args.document_id:
+        params['document_id'] = ','.join(str(doc_id) for doc_id in args.document_id)
+
+    response = requests.get(f'{args.url}/deadletters', params=params, timeout=args.timeout)
+    response.raise_for_status()
+    data = response.json()
+
+    if args.json:
+        print(json.dumps(data, indent=2))
+        return 0
+
+    for entry in data['entries']:
+        print(f"{entry['id']:>6}  document {entry['document_id']:<8} {entry['step']:<16} "
+              f"{entry['status']:<10} failures={entry['failures']} replays={entry['replays']}  "
+              f"{entry['last_failed_at']}  {(entry['error'] or '')[:80]}")
+    print(f"{len(data['entries'])} of {data['total']} entries", file=sys.stderr)
+    return 0
+
+
+def replay_entries(args) -> int:
+    payload = {'concurrency': args.concurrency}
+    if args.limit:
+        payload['limit'] = args.limit
+    if args.step:
+        payload['step'] = args.step
+    if args.document_id:
+        payload['document_ids'] = args.document_id
+    if args.id:
+        payload['ids'] = args.id
+
+    failed = 0
+    with requests.post(f'{args.url}/deadletters/replay', json=payload, stream=True,
+                       timeout=(args.timeout, None)) as response:
+        response.raise_for_status()
+        for line in response.iter_lines():
+            if not line:
+                continue
+            event = json.loads(line)
+            if args.json:
+                print(json.dumps(event))
+            elif event['type'] == 'start':
+                print(f"Replaying {event['total']} documents ({event['batch_id']}, "
+                      f"concurrency {event['concurrency']})", file=sys.stderr)
+            elif event['type'] == 'result':
+                steps = ', '.join(
+                    f"{step['service']}={step['result'].get('status')}"
+                    for step in event.get('pipeline_result', {}).get('steps', [])
+                ) or event.get('error', '')
+                print(f"[{event['done']}/{event['total']}] document {event['document_id']}: "
+                      f"{event['status']}  {steps}")
+            elif event['type'] == 'summary':
+                failed = event['failed']
+                print(f"Replayed {event['total']} documents in {event['elapsed_seconds']}s: "
+                      f"{event['succeeded']} succeeded, {event['failed']} still failing", file=sys.stderr)
+    return 1 if failed else 0
+
+
+def discard_entries(args) -> int:
+    status = 0
+    for entry_id in args.ids:
+        response = requests.delete(f'{args.url}/deadletters/{entry_id}', timeout=args.timeout)
+        if response.status_code == 200:
+            print(f"Discarded {entry_id}")
+        else:
+            print(f"{entry_id}: {response.json().get('error', response.status_code)}", file=sys.stderr)
+            status = 1
+    return status
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='List, replay and discard glue-worker dead letters')
+    parser.add_argument('--url', default=os.getenv('GLUE_WORKER_URL', 'http://localhost:5000'),
+                        help='glue-worker base URL (default: $GLUE_WORKER_URL or http://localhost:5000)')
+    parser.add_argument('--timeout', type=float, default=30.0, help='Request timeout in seconds')
+    parser.add_argument('--json', action='store_true', help='Print raw JSON')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    list_parser = commands.add_parser('list', help='Show dead-lettered steps')
+    list_parser.add_argument('--status', default='pending',
+                             choices=['pending', 'resolved', 'discarded', 'all'])
+    list_parser.add_argument('--step', help='Only entries for this pipeline step')
+    list_parser.add_argument('--document-id', type=int, action='append', help='Only this document (repeatable)')
+    list_parser.add_argument('--limit', type=int, default=100)
+    list_parser.add_argument('--offset', type=int, default=0)
+    list_parser.set_defaults(func=list_entries)
+
+    replay_parser = commands.add_parser('replay', help='Run failed steps again')
+    replay_parser.add_argument('--concurrency', type=int, default=4,
+                               help='Documents replayed at once (default: 4, capped by BATCH_MAX_CONCURRENCY)')
+    replay_parser.add_argument('--step', help='Only replay this pipeline step')
+    replay_parser.add_argument('--document-id', type=int, action='append', help='Only this document (repeatable)')
+    replay_parser.add_argument('--id', type=int, action='append', help='Only this entry (repeatable)')
+    replay_parser.add_argument('--limit', type=int, help='Most entries to replay in this run')
+    replay_parser.set_defaults(func=replay_entries)
+
+    discard_parser = commands.add_parser('discard', help='Stop replaying entries')
+    discard_parser.add_argument('ids', type=int, nargs='+')
+    discard_parser.set_defaults(func=discard_entries)
+
+    args = parser.parse_args()
+    args.url = args.url.rstrip('/')
+    try:
+        return args.func(args)
+    except requests.exceptions.RequestException as e:
+        print(f"Error talking to glue-worker at {args.url}: {str(e)}", file=sys.stderr)
+        return 2
+
+
+if __name__ == '__main__':
+    sys.exit(main())
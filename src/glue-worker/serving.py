@@ -0,0 +1,67 @@
+"""
+Production server sizing
+
+Worker processes are sized from the CPUs the container may actually use:
+the cgroup CPU quota (v2 cpu.max or v1 cfs_quota_us / cfs_period_us) when
+one is set, otherwise the CPUs this process is allowed to run on. A pod with
+`limits.cpu: 1500m` on a 32-core node therefore gets workers for 2 CPUs,
+not 32.
+"""
+import os
+import math
+from typing import Optional
+
+
+def _read(path: str) -> Optional[str]:
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def cgroup_cpu_limit(root: str = '/sys/fs/cgroup') -> Optional[float]:
+    """
+    CPUs allowed by the cgroup quota, or None when unlimited or unknown
+    """
+    # cgroup v2: "<quota> <period>" or "max <period>"
+    cpu_max = _read(os.path.join(root, 'cpu.max'))
+    if cpu_max:
+        quota, _, period = cpu_max.partition(' ')
+        if quota != 'max' and period:
+            return int(quota) / int(period)
+        return None
+
+    # cgroup v1
+    for directory in ('cpu', 'cpu,cpuacct', 'cpuacct,cpu'):
+        quota = _read(os.path.join(root, directory, 'cpu.cfs_quota_us'))
+        period = _read(os.path.join(root, directory, 'cpu.cfs_period_us'))
+        if quota and period:
+            if int(quota) > 0 and int(period) > 0:
+                return int(quota) / int(period)
+            return None
+    return None
+
+
+def available_cpus() -> int:
+    """
+    Whole CPUs this container can use, rounded up
+    """
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+
+    limit = cgroup_cpu_limit()
+    if limit is not None:
+        cpus = min(cpus, math.ceil(limit))
+    return max(1, cpus)
+
+
+def worker_count(configured: str = '', per_cpu: float = 2, minimum: int = 2, maximum: int = 8) -> int:
+    """
+    Worker processes: `configured` if set, otherwise per_cpu × CPUs + 1 within [minimum, maximum]
+    """
+    if configured and int(configured) > 0:
+        return int(configured)
+    return max(minimum, min(maximum, int(per_cpu * available_cpus()) + 1))
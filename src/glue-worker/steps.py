@@ -0,0 +1,230 @@
+"""
+Pipeline step registry for glue-worker
+
+Which steps run for a document is configuration, not code. Each step names
+a type from the registry plus its own settings:
+
+    name        unique step name, used in results, metrics and depends_on
+    type        registered step type (defaults to the step name)
+    depends_on  steps that must succeed before this one runs
+    timeout     seconds before the step is abandoned (default: none)
+    retries     extra attempts after a failed run (default: 0)
+    retry_backoff  base seconds for jittered exponential backoff (default: 1)
+    parallel    may share a stage with other steps (default: true)
+    enabled     set false to keep a step in the file but skip it
+
+Built-in types are registered by the application (paperless-gpt,
+paperless-ai). Two generic types are always available:
+
+    http    POST (or `method`) the document ID to `url`; any JSON `body` is
+            sent with "{document_id}" placeholders filled in
+    plugin  call `function` ("package.module:function") with the document ID;
+            extra settings are passed as keyword arguments
+
+Steps are read from a YAML file (PIPELINE_CONFIG), or from environment
+variables: PIPELINE_STEPS lists the step names and PIPELINE_STEP_<NAME>__<KEY>
+sets a key, e.g. PIPELINE_STEP_NOTIFY__URL=http://hooks/notify. The double
+underscore keeps the keys of step "a" apart from those of step "a_b".
+"""
+import os
+import json
+import importlib
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+import requests
+
+from pipeline import PipelineStep
+from upstream import UpstreamClient
+
+logger = logging.getLogger(__name__)
+
+StepFunc = Callable[[int], Dict[str, Any]]
+
+_step_types: Dict[str, Callable[['StepSpec'], StepFunc]] = {}
+
+
+@dataclass
+class StepSpec:
+    """
+    Configuration of one pipeline step
+    """
+    name: str
+    type: str
+    depends_on: List[str] = field(default_factory=list)
+    timeout: Optional[float] = None
+    retries: int = 0
+    retry_backoff: float = 1.0
+    parallel: bool = True
+    enabled: bool = True
+    options: Dict[str, Any] = field(default_factory=dict)
+
+    _fields = ('name', 'type', 'depends_on', 'timeout', 'retries', 'retry_backoff', 'parallel', 'enabled')
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'StepSpec':
+        if not data.get('name'):
+            raise ValueError(f"Pipeline step is missing a name: {data}")
+        depends_on = data.get('depends_on') or []
+        if isinstance(depends_on, str):
+            depends_on = [dep.strip() for dep in depends_on.split(',') if dep.strip()]
+        timeout = data.get('timeout')
+        return cls(
+            name=str(data['name']),
+            type=str(data.get('type') or data['name']),
+            depends_on=list(depends_on),
+            timeout=float(timeout) if timeout not in (None, '', 0, '0') else None,
+            retries=int(data.get('retries', 0)),
+            retry_backoff=float(data.get('retry_backoff', 1.0)),
+            parallel=_as_bool(data.get('parallel', True)),
+            enabled=_as_bool(data.get('enabled', True)),
+            options={key: value for key, value in data.items() if key not in cls._fields}
+        )
+
+
+def _as_bool(value: Any) -> bool:
+    if isinstance(value, str):
+        return value.strip().lower() in ('1', 'true', 'yes', 'on')
+    return bool(value)
+
+
+def register_step_type(name: str, factory: Callable[[StepSpec], StepFunc]) -> None:
+    """
+    Make a step type available to configuration
+
+    factory(spec) returns the function that runs the step for a document ID.
+    """
+    _step_types[name] = factory
+
+
+def step_types() -> List[str]:
+    return sorted(_step_types)
+
+
+def load_step_specs(config_path: str = '', env: Optional[Dict[str, str]] = None) -> Optional[List[StepSpec]]:
+    """
+    Step specs from the YAML file, else from PIPELINE_STEPS; None if neither is set
+    """
+    env = os.environ if env is None else env
+
+    if config_path:
+        try:
+            import yaml
+        except ImportError as e:
+            raise RuntimeError('PyYAML is required to read PIPELINE_CONFIG') from e
+        with open(config_path) as f:
+            config = yaml.safe_load(f) or {}
+        return [StepSpec.from_dict(step) for step in config.get('steps', [])]
+
+    names = [name.strip() for name in env.get('PIPELINE_STEPS', '').split(',') if name.strip()]
+    if not names:
+        return None
+
+    specs = []
+    for name in names:
+        env_name = name.upper().replace('-', '_')
+        if '__' in env_name or env_name.endswith('_'):
+            raise ValueError(f"Step name '{name}' cannot be configured from the environment; "
+                             f"avoid repeated or trailing '_'/'-'")
+        prefix = f"PIPELINE_STEP_{env_name}__"
+        data = {key[len(prefix):].lower(): value for key, value in env.items() if key.startswith(prefix)}
+        if 'body' in data:
+            data['body'] = json.loads(data['body'])
+        specs.append(StepSpec.from_dict(dict(data, name=name)))
+    return specs
+
+
+def build_steps(specs: List[StepSpec]) -> List[PipelineStep]:
+    """
+    Instantiate enabled step specs into pipeline steps
+    """
+    enabled = [spec for spec in specs if spec.enabled]
+    names = [spec.name for spec in enabled]
+    duplicates = {name for name in names if names.count(name) > 1}
+    if duplicates:
+        raise ValueError(f"Duplicate pipeline step names: {', '.join(sorted(duplicates))}")
+
+    steps = []
+    for spec in enabled:
+        if spec.type not in _step_types:
+            raise ValueError(f"Step {spec.name} has unknown type '{spec.type}' "
+                             f"(available: {', '.join(step_types())})")
+        steps.append(PipelineStep(
+            service=spec.name,
+            func=_step_types[spec.type](spec),
+            depends_on=spec.depends_on,
+            parallel=spec.parallel,
+            timeout=spec.timeout,
+            retries=spec.retries,
+            retry_backoff=spec.retry_backoff
+        ))
+    return steps
+
+
+def _fill(value: Any, document_id: int) -> Any:
+    if isinstance(value, str):
+        return value.replace('{document_id}', str(document_id))
+    if isinstance(value, dict):
+        return {key: _fill(item, document_id) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_fill(item, document_id) for item in value]
+    return value
+
+
+def http_step(spec: StepSpec) -> StepFunc:
+    """
+    Generic webhook step: send the document ID to a URL
+    """
+    url = spec.options.get('url')
+    if not url:
+        raise ValueError(f"HTTP step {spec.name} needs a url")
+    method = str(spec.options.get('method', 'POST')).upper()
+    body = spec.options.get('body', {'document_id': '{document_id}'})
+    client = UpstreamClient.from_env(
+        f'step-{spec.name}',
+        f"STEP_{spec.name.upper().replace('-', '_')}",
+        url,
+        read_timeout=spec.timeout or 30
+    )
+
+    def run(document_id: int) -> Dict[str, Any]:
+        try:
+            response = client.request(method, '', json=_fill(body, document_id) if method != 'GET' else None,
+                                      params=_fill(spec.options.get('params'), document_id))
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Error calling {spec.name} step at {url}: {str(e)}")
+            return {'status': 'error', 'message': str(e)}
+        if response.ok:
+            try:
+                data = response.json()
+            except ValueError:
+                data = response.text
+            return {'status': 'success', 'data': data}
+        return {'status': 'error', 'code': response.status_code, 'message': response.text}
+
+    return run
+
+
+def plugin_step(spec: StepSpec) -> StepFunc:
+    """
+    Step implemented by an importable function, "package.module:function"
+    """
+    target = spec.options.get('function', '')
+    module_name, _, func_name = target.partition(':')
+    if not module_name or not func_name:
+        raise ValueError(f"Plugin step {spec.name} needs function: 'package.module:function'")
+    func = getattr(importlib.import_module(module_name), func_name)
+    kwargs = {key: value for key, value in spec.options.items() if key != 'function'}
+
+    def run(document_id: int) -> Dict[str, Any]:
+        result = func(document_id, **kwargs)
+        if not isinstance(result, dict):
+            result = {'status': 'success', 'data': result}
+        return result
+
+    return run
+
+
+register_step_type('http', http_step)
+register_step_type('plugin', plugin_step)
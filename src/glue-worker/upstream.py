@@ -0,0 +1,144 @@
+"""
+Pooled HTTP clients for upstream services
+
+Each upstream gets its own requests.Session with a bounded keep-alive
+connection pool and separate connect/read timeouts. Settings are read from
+environment variables using the upstream's prefix, falling back to the
+global HTTP_* defaults:
+
+    <PREFIX>_POOL_SIZE        maximum concurrent connections (HTTP_POOL_SIZE)
+    <PREFIX>_CONNECT_TIMEOUT  connect timeout in seconds (HTTP_CONNECT_TIMEOUT)
+    <PREFIX>_READ_TIMEOUT     read timeout in seconds (HTTP_READ_TIMEOUT)
+    <PREFIX>_KEEPALIVE        reuse connections between requests (HTTP_KEEPALIVE)
+"""
+import os
+import time
+import logging
+import threading
+from typing import Dict, Any, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+_clients: Dict[str, 'UpstreamClient'] = {}
+
+
+def _env(prefix: str, key: str, default: str) -> str:
+    return os.getenv(f'{prefix}_{key}', os.getenv(f'HTTP_{key}', default))
+
+
+class UpstreamClient:
+    """
+    Keep-alive HTTP client for a single upstream with pool-saturation tracking
+    """
+
+    def __init__(self, name: str, base_url: str, pool_size: int = 10,
+                 connect_timeout: float = 5.0, read_timeout: float = 60.0,
+                 keepalive: bool = True):
+        self.name = name
+        self.base_url = base_url.rstrip('/')
+        self.pool_size = pool_size
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.keepalive = keepalive
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=True)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        if not keepalive:
+            self.session.headers['Connection'] = 'close'
+
+        self._slots = threading.BoundedSemaphore(pool_size)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._peak_in_flight = 0
+        self._requests = 0
+        self._pool_waits = 0
+        self._pool_wait_seconds = 0.0
+
+    @classmethod
+    def from_env(cls, name: str, prefix: str, base_url: str,
+                 read_timeout: float = 60.0) -> 'UpstreamClient':
+        """
+        Build (or reuse) the client for an upstream from environment variables
+        """
+        if name in _clients:
+            return _clients[name]
+        client = cls(
+            name,
+            base_url,
+            pool_size=int(_env(prefix, 'POOL_SIZE', '10')),
+            connect_timeout=float(_env(prefix, 'CONNECT_TIMEOUT', '5')),
+            read_timeout=float(_env(prefix, 'READ_TIMEOUT', str(read_timeout))),
+            keepalive=_env(prefix, 'KEEPALIVE', 'true').lower() == 'true'
+        )
+        _clients[name] = client
+        return client
+
+    def request(self, method: str, path: str, timeout: Optional[float] = None,
+                **kwargs) -> requests.Response:
+        """
+        Send a request to the upstream, waiting for a free pool slot if needed
+        """
+        url = path if path.startswith(('http://', 'https://')) else f'{self.base_url}{path}'
+
+        started = time.monotonic()
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._pool_waits += 1
+            self._slots.acquire()
+        waited = time.monotonic() - started
+
+        with self._lock:
+            self._requests += 1
+            self._in_flight += 1
+            self._peak_in_flight = max(self._peak_in_flight, self._in_flight)
+            self._pool_wait_seconds += waited
+
+        try:
+            return self.session.request(
+                method,
+                url,
+                timeout=(self.connect_timeout, timeout or self.read_timeout),
+                **kwargs
+            )
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+            self._slots.release()
+
+    def get(self, path: str, **kwargs) -> requests.Response:
+        return self.request('GET', path, **kwargs)
+
+    def post(self, path: str, **kwargs) -> requests.Response:
+        return self.request('POST', path, **kwargs)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Pool usage counters; saturation is the fraction of the pool in use
+        """
+        with self._lock:
+            return {
+                'name': self.name,
+                'base_url': self.base_url,
+                'pool_size': self.pool_size,
+                'in_flight': self._in_flight,
+                'peak_in_flight': self._peak_in_flight,
+                'saturation': round(self._in_flight / self.pool_size, 3),
+                'requests': self._requests,
+                'pool_waits': self._pool_waits,
+                'pool_wait_seconds': round(self._pool_wait_seconds, 3),
+                'connect_timeout': self.connect_timeout,
+                'read_timeout': self.read_timeout,
+                'keepalive': self.keepalive
+            }
+
+
+def all_stats() -> List[Dict[str, Any]]:
+    """
+    Pool statistics for every configured upstream
+    """
+    return [client.stats() for client in _clients.values()]
@@ -3,12 +3,26 @@
 Paperless-GPT: GPT-powered document ingest, OCR, and metadata extraction
 """
 import os
+import json
+import time
+import asyncio
 import logging
-from flask import Flask, request, jsonify
-import openai
-import requests
+from contextlib import contextmanager
+from flask import Flask, Response, request, jsonify, stream_with_context
+from prometheus_client import CONTENT_TYPE_LATEST
 from datetime import datetime
 
+import metrics
+from backends import create_backend
+from batch import PackItem, fetch_documents, run_metadata_batch
+from cache import TieredCache, make_key
+from concurrency import BlockingRunner, ModelCallLimiter, Overloaded
+from documents import DocumentCache, DocumentFetchError
+from ocr import download_document, ocr_document
+from ratelimit import ModelRateLimiter
+from upstream import UpstreamClient, all_stats as upstream_stats
+from windowing import build_window, count_tokens
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -20,16 +34,137 @@ app = Flask(__name__)
 
 # Configuration
 PAPERLESS_API_URL = os.getenv('PAPERLESS_API_URL', 'http://paperless-ngx:8000')
-OPENAI_API_KEY = os.getenv('OPENAI_API_KEY', '')
+MODEL_BACKEND = os.getenv('MODEL_BACKEND', 'openai')
 GPT_MODEL = os.getenv('GPT_MODEL', 'gpt-4o')
 ENABLE_OCR = os.getenv('ENABLE_OCR', 'true').lower() == 'true'
 ENABLE_METADATA_EXTRACTION = os.getenv('ENABLE_METADATA_EXTRACTION', 'true').lower() == 'true'
+MAX_CONCURRENT_MODEL_CALLS = int(os.getenv('MAX_CONCURRENT_MODEL_CALLS', '4'))
+MODEL_QUEUE_LIMIT = int(os.getenv('MODEL_QUEUE_LIMIT', '16'))
+MODEL_QUEUE_TIMEOUT = float(os.getenv('MODEL_QUEUE_TIMEOUT', '60'))
+MODEL_RPM_LIMIT = float(os.getenv('MODEL_RPM_LIMIT', '0'))
+MODEL_TPM_LIMIT = float(os.getenv('MODEL_TPM_LIMIT', '0'))
+MODEL_RATE_QUEUE_LIMIT = int(os.getenv('MODEL_RATE_QUEUE_LIMIT', '64'))
+MODEL_RATE_MAX_WAIT = float(os.getenv('MODEL_RATE_MAX_WAIT', '60'))
+MODEL_OUTPUT_TOKENS_ESTIMATE = int(os.getenv('MODEL_OUTPUT_TOKENS_ESTIMATE', '400'))
+MODEL_OCR_TOKENS_ESTIMATE = int(os.getenv('MODEL_OCR_TOKENS_ESTIMATE', '2000'))
+# Set by gunicorn.conf.py; provider limits are per pod and split between worker processes
+WEB_WORKER_PROCESSES = max(1, int(os.getenv('WEB_WORKER_PROCESSES', '1')))
+IO_THREADS = int(os.getenv('IO_THREADS', '32'))
+DATA_DIR = os.getenv('DATA_DIR', '/data')
+BATCH_MAX_DOCUMENTS = int(os.getenv('BATCH_MAX_DOCUMENTS', '1000'))
+BATCH_PAGE_SIZE = int(os.getenv('BATCH_PAGE_SIZE', '100'))
+BATCH_CONCURRENCY = int(os.getenv('BATCH_CONCURRENCY', '2'))
+PACK_MAX_DOCUMENTS = int(os.getenv('PACK_MAX_DOCUMENTS', '8'))
+PACK_TOKEN_BUDGET = int(os.getenv('PACK_TOKEN_BUDGET', '4000'))
+PACK_DOCUMENT_MAX_TOKENS = int(os.getenv('PACK_DOCUMENT_MAX_TOKENS', '600'))
+OCR_MODE = os.getenv('OCR_MODE', 'single').lower()
+OCR_PAGE_CONCURRENCY = int(os.getenv('OCR_PAGE_CONCURRENCY', '4'))
+OCR_WORK_DIR = os.getenv('OCR_WORK_DIR', os.path.join(DATA_DIR, 'ocr'))
+METADATA_CACHE_ENABLED = os.getenv('METADATA_CACHE_ENABLED', 'true').lower() == 'true'
+METADATA_CACHE_MAX_ENTRIES = int(os.getenv('METADATA_CACHE_MAX_ENTRIES', '2000'))
+METADATA_CACHE_TTL_SECONDS = int(os.getenv('METADATA_CACHE_TTL_SECONDS', str(7 * 86400)))
+METADATA_CACHE_DIR = os.getenv('METADATA_CACHE_DIR', os.path.join(DATA_DIR, 'cache', 'metadata'))
+METADATA_CACHE_DISK_MAX_MB = int(os.getenv('METADATA_CACHE_DISK_MAX_MB', '256'))
+DOCUMENT_CACHE_ENABLED = os.getenv('DOCUMENT_CACHE_ENABLED', 'true').lower() == 'true'
+DOCUMENT_CACHE_MAX_ENTRIES = int(os.getenv('DOCUMENT_CACHE_MAX_ENTRIES', '500'))
+DOCUMENT_CACHE_MAX_AGE = float(os.getenv('DOCUMENT_CACHE_MAX_AGE', '0'))
+DOCUMENT_CACHE_TTL_SECONDS = int(os.getenv('DOCUMENT_CACHE_TTL_SECONDS', '86400'))
+DOCUMENT_CACHE_DIR = os.getenv('DOCUMENT_CACHE_DIR', '')
+DOCUMENT_CACHE_DISK_MAX_MB = int(os.getenv('DOCUMENT_CACHE_DISK_MAX_MB', '128'))
+METADATA_TOKEN_BUDGET = int(os.getenv('METADATA_TOKEN_BUDGET', '1500'))
+METADATA_CHUNK_TOKENS = int(os.getenv('METADATA_CHUNK_TOKENS', '250'))
+METADATA_MAP_REDUCE_TOKENS = int(os.getenv('METADATA_MAP_REDUCE_TOKENS', '0'))
+METADATA_MAP_CHUNK_TOKENS = int(os.getenv('METADATA_MAP_CHUNK_TOKENS', '3000'))
+METADATA_MAP_MAX_CHUNKS = int(os.getenv('METADATA_MAP_MAX_CHUNKS', '16'))
+
+# Bump METADATA_PROMPT_VERSION whenever the template changes so cached results are not reused
+METADATA_PROMPT_VERSION = '1'
+METADATA_PROMPT_TEMPLATE = """
+        Analyze this document and extract relevant metadata:
+
+        Title: {title}
+        Content: {content}
+
+        Please provide:
+        1. A concise summary (2-3 sentences)
+        2. Key topics/tags (comma-separated)
+        3. Document type (invoice, receipt, letter, form, etc.)
+        4. Any dates mentioned
+        5. Any important entities (people, organizations, amounts)
 
-# Initialize OpenAI client
-if OPENAI_API_KEY:
-    openai.api_key = OPENAI_API_KEY
-else:
-    logger.warning("OPENAI_API_KEY not set - GPT functionality will be disabled")
+        Respond in JSON format.
+        """
+PACKED_METADATA_PROMPT_TEMPLATE = """
+        Analyze each of the following documents separately and extract relevant metadata.
+
+        {documents}
+
+        For every document provide:
+        1. A concise summary (2-3 sentences)
+        2. Key topics/tags (comma-separated)
+        3. Document type (invoice, receipt, letter, form, etc.)
+        4. Any dates mentioned
+        5. Any important entities (people, organizations, amounts)
+
+        Respond with a JSON object keyed by document id.
+        """
+PACKED_DOCUMENT_TEMPLATE = """
+        --- Document id {document_id} ---
+        Title: {title}
+        Content: {content}
+        """
+SUMMARY_PROMPT_TEMPLATE = """
+        Summarize this excerpt of a longer document in a few sentences.
+        Keep names, dates, amounts and reference numbers.
+
+        Title: {title}
+        Excerpt: {content}
+        """
+
+# Pooled keep-alive client for the Paperless API
+paperless_api = UpstreamClient.from_env('paperless-ngx', 'PAPERLESS_API', PAPERLESS_API_URL, read_timeout=30)
+
+# Cap on concurrent model calls with a bounded wait queue for backpressure
+model_calls = ModelCallLimiter(
+    max_concurrent=MAX_CONCURRENT_MODEL_CALLS,
+    max_waiting=MODEL_QUEUE_LIMIT,
+    wait_timeout=MODEL_QUEUE_TIMEOUT
+)
+
+# Provider requests/tokens per minute, shared by every thread of this process
+model_rate = ModelRateLimiter(
+    requests_per_minute=MODEL_RPM_LIMIT / WEB_WORKER_PROCESSES,
+    tokens_per_minute=MODEL_TPM_LIMIT / WEB_WORKER_PROCESSES,
+    max_waiting=MODEL_RATE_QUEUE_LIMIT,
+    max_wait=MODEL_RATE_MAX_WAIT,
+    on_wait=metrics.MODEL_RATE_WAIT.observe
+)
+
+# Shared pool for blocking work started from async views
+blocking = BlockingRunner(max_workers=IO_THREADS)
+
+# Metadata results keyed on prompt inputs, model and prompt version
+metadata_cache = TieredCache(
+    'metadata',
+    max_entries=METADATA_CACHE_MAX_ENTRIES,
+    ttl_seconds=METADATA_CACHE_TTL_SECONDS,
+    disk_dir=METADATA_CACHE_DIR or None,
+    disk_max_bytes=METADATA_CACHE_DISK_MAX_MB * 1024 * 1024
+) if METADATA_CACHE_ENABLED else None
+
+# Paperless document JSON, revalidated by modified timestamp or ETag
+documents = DocumentCache(paperless_api, TieredCache(
+    'documents',
+    max_entries=DOCUMENT_CACHE_MAX_ENTRIES,
+    ttl_seconds=DOCUMENT_CACHE_TTL_SECONDS,
+    disk_dir=DOCUMENT_CACHE_DIR or None,
+    disk_max_bytes=DOCUMENT_CACHE_DISK_MAX_MB * 1024 * 1024
+) if DOCUMENT_CACHE_ENABLED else None, max_age=DOCUMENT_CACHE_MAX_AGE)
+
+# OpenAI or the offline stub, see backends.py
+model_backend = create_backend(MODEL_BACKEND, GPT_MODEL)
+if not model_backend.available():
+    logger.warning(f"Model backend {model_backend.name} is not configured - GPT functionality will be disabled")
 
 
 @app.route('/')
@@ -43,9 +178,16 @@ def index():
             'paperless_api': PAPERLESS_API_URL,
             'gpt_model': GPT_MODEL,
             'ocr_enabled': ENABLE_OCR,
+            'ocr_mode': OCR_MODE,
             'metadata_extraction_enabled': ENABLE_METADATA_EXTRACTION,
-            'openai_configured': bool(OPENAI_API_KEY)
-        }
+            'metadata_prompt_version': METADATA_PROMPT_VERSION
+        },
+        'model_backend': model_backend.describe(),
+        'caches': [cache.stats() for cache in (metadata_cache, documents.cache) if cache is not None],
+        'documents': documents.stats(),
+        'model_calls': model_calls.stats(),
+        'model_rate': model_rate.stats(),
+        'upstreams': upstream_stats()
     })
 
 
@@ -55,21 +197,34 @@ def health():
     return jsonify({'status': 'healthy'}), 200
 
 
+@app.route('/metrics')
+def prometheus_metrics():
+    """
+    Prometheus metrics in text exposition format
+    """
+    return Response(metrics.render(), mimetype=CONTENT_TYPE_LATEST)
+
+
 @app.route('/process', methods=['POST'])
-def process_document():
+async def process_document():
     """
     Process a document with GPT for OCR and metadata extraction
 
+    OCR and metadata extraction run concurrently when action is "both".
+    Returns 503 with Retry-After when the model call queue is full or the
+    rate limit would delay a model call by more than MODEL_RATE_MAX_WAIT.
+
     Expected payload:
     {
         "document_id": 123,
+        "document_modified": "2024-03-01T10:00:00Z",  (optional, skips refetching an unchanged document)
         "document_url": "http://paperless/api/documents/123/download/",
         "action": "ocr" | "metadata" | "both"
     }
     """
-    if not OPENAI_API_KEY:
+    if not model_backend.available():
         return jsonify({
-            'error': 'OpenAI API key not configured',
+            'error': f'Model backend {model_backend.name} not configured',
             'status': 'error'
         }), 500
 
@@ -87,38 +242,43 @@ def process_document():
     logger.info(f"Processing document {document_id} with action: {action}")
 
     try:
-        # Fetch document from Paperless
-        doc_response = requests.get(
-            f"{PAPERLESS_API_URL}/api/documents/{document_id}/",
-            timeout=30
-        )
-
-        if doc_response.status_code != 200:
+        # Fetch document from Paperless (or the document cache)
+        try:
+            document = await blocking.run(documents.get, document_id, data.get('document_modified'))
+        except DocumentFetchError as e:
             return jsonify({
-                'error': f'Failed to fetch document from Paperless: {doc_response.status_code}',
+                'error': f'Failed to fetch document from Paperless: {e.status_code}',
                 'status': 'error'
             }), 500
 
-        document = doc_response.json()
-
         result = {
             'document_id': document_id,
             'status': 'success',
             'processed_at': datetime.utcnow().isoformat()
         }
 
+        tasks = {}
+
         # Perform OCR if enabled
         if ENABLE_OCR and action in ['ocr', 'both']:
-            ocr_result = perform_ocr(document)
-            result['ocr'] = ocr_result
+            tasks['ocr'] = blocking.run(perform_ocr, document)
 
         # Extract metadata if enabled
         if ENABLE_METADATA_EXTRACTION and action in ['metadata', 'both']:
-            metadata_result = extract_metadata(document)
-            result['metadata'] = metadata_result
+            tasks['metadata'] = blocking.run(extract_metadata, document)
+
+        for key, value in zip(tasks, await asyncio.gather(*tasks.values())):
+            result[key] = value
 
         return jsonify(result), 200
 
+    except Overloaded as e:
+        logger.warning(f"Rejecting document {document_id}: {str(e)}")
+        return jsonify({
+            'error': str(e),
+            'status': 'overloaded'
+        }), 503, {'Retry-After': str(e.retry_after)}
+
     except Exception as e:
         logger.error(f"Error processing document {document_id}: {str(e)}")
         return jsonify({
@@ -127,19 +287,151 @@ def process_document():
         }), 500
 
 
+@app.route('/process/batch', methods=['POST'])
+def process_batch():
+    """
+    Extract metadata for many documents, streaming results as NDJSON
+
+    Documents are fetched from Paperless in pages and short documents are
+    packed several to a model request.
+
+    Expected payload:
+    {
+        "document_ids": [1, 2, 3],
+        "concurrency": 2
+    }
+    """
+    if not model_backend.available():
+        return jsonify({
+            'error': f'Model backend {model_backend.name} not configured',
+            'status': 'error'
+        }), 500
+
+    if not ENABLE_METADATA_EXTRACTION:
+        return jsonify({
+            'error': 'Metadata extraction is disabled',
+            'status': 'error'
+        }), 400
+
+    data = request.get_json(silent=True) or {}
+
+    try:
+        document_ids = list(dict.fromkeys(int(doc_id) for doc_id in data.get('document_ids') or []))
+        concurrency = max(1, min(int(data.get('concurrency', BATCH_CONCURRENCY)), MAX_CONCURRENT_MODEL_CALLS))
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': f'Invalid batch request: {str(e)}', 'status': 'error'}), 400
+
+    if not document_ids:
+        return jsonify({'error': 'Missing document_ids in request', 'status': 'error'}), 400
+
+    if len(document_ids) > BATCH_MAX_DOCUMENTS:
+        return jsonify({
+            'error': f'At most {BATCH_MAX_DOCUMENTS} documents per batch',
+            'status': 'error'
+        }), 400
+
+    logger.info(f"Starting metadata batch: {len(document_ids)} documents, concurrency {concurrency}")
+
+    def generate():
+        events = run_metadata_batch(
+            document_ids,
+            fetch_documents(paperless_api, document_ids, page_size=BATCH_PAGE_SIZE),
+            prepare_batch_document,
+            extract_metadata_packed,
+            pack_token_budget=PACK_TOKEN_BUDGET,
+            pack_max_documents=PACK_MAX_DOCUMENTS,
+            pack_max_document_tokens=PACK_DOCUMENT_MAX_TOKENS,
+            concurrency=concurrency
+        )
+        try:
+            for event in events:
+                yield json.dumps(event) + '\n'
+        except Exception as e:
+            # Headers are already sent; report the failure in-band
+            logger.error(f"Metadata batch failed: {str(e)}")
+            yield json.dumps({'type': 'error', 'error': str(e)}) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
+@contextmanager
+def model_call(estimated_tokens):
+    """
+    Admit one model call: rate limit capacity first, then a concurrency slot
+
+    Waiting for rate capacity does not hold a slot. The token estimate is
+    replaced with the usage the backend reports once the call returns; a
+    call that failed without reporting usage is settled at 0 tokens.
+    """
+    reservation = model_rate.acquire(estimated_tokens)
+    failed = True
+    try:
+        with model_calls.slot():
+            model_backend.last_call_tokens()
+            yield
+        failed = False
+    except Overloaded:
+        # Never got a slot: hand back the request as well as the tokens
+        model_rate.release(reservation)
+        reservation = None
+        raise
+    finally:
+        if reservation is not None:
+            used_tokens = model_backend.last_call_tokens()
+            model_rate.settle(reservation, 0 if failed and used_tokens is None else used_tokens)
+
+
 def perform_ocr(document):
     """
     Use GPT-4o vision to perform OCR on document
+
+    With OCR_MODE=streaming the original file is downloaded in chunks and
+    OCR'd page by page with bounded concurrency (see ocr.py).
     """
-    logger.info(f"Performing OCR on document {document.get('id')}")
+    document_id = document.get('id')
+    logger.info(f"Performing OCR on document {document_id}")
+
+    if OCR_MODE == 'streaming':
+        result = ocr_document(paperless_api, document, ocr_page, OCR_WORK_DIR,
+                              concurrency=OCR_PAGE_CONCURRENCY)
+        return dict(result, method=model_backend.model, mode='streaming')
+
+    path = download_document(paperless_api, document_id, os.path.join(OCR_WORK_DIR, 'downloads'))
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    finally:
+        os.remove(path)
+
+    with model_call(MODEL_OCR_TOKENS_ESTIMATE):
+        result = model_backend.ocr(data, f'document-{document_id}')
+    return dict(result, method=model_backend.model)
 
-    # For now, return a simulated response
-    # In production, this would use GPT-4o's vision capabilities
-    return {
-        'text': f"[Simulated OCR for document {document.get('id')}]",
-        'confidence': 0.95,
-        'method': 'gpt-4o-vision'
-    }
+
+def ocr_page(document_id, page_number, page_bytes):
+    """
+    Use GPT-4o vision to OCR a single page
+    """
+    with model_call(MODEL_OCR_TOKENS_ESTIMATE):
+        return model_backend.ocr(page_bytes, f'document-{document_id}-page-{page_number}')
+
+
+def metadata_window(document):
+    """
+    Content window and cache key for a document's metadata prompt
+    """
+    title = document.get('title', '')
+    window = build_window(
+        document.get('content', ''),
+        METADATA_TOKEN_BUDGET,
+        chunk_tokens=METADATA_CHUNK_TOKENS,
+        map_reduce_tokens=METADATA_MAP_REDUCE_TOKENS,
+        summarize=lambda chunk: summarize_chunk(title, chunk),
+        map_chunk_tokens=METADATA_MAP_CHUNK_TOKENS,
+        max_map_chunks=METADATA_MAP_MAX_CHUNKS,
+        model=GPT_MODEL
+    )
+    return window, make_key(METADATA_PROMPT_VERSION, model_backend.model, title, window.text)
 
 
 def extract_metadata(document):
@@ -156,38 +448,30 @@ def extract_metadata(document):
             'error': 'No content available for metadata extraction'
         }
 
+    window, cache_key = metadata_window(document)
+    if metadata_cache is not None:
+        cached = metadata_cache.get(cache_key)
+        if cached is not None:
+            logger.info(f"Metadata cache hit for document {document.get('id')}")
+            return dict(cached, cached=True)
+
     try:
         # Create a prompt for GPT to extract metadata
-        prompt = f"""
-        Analyze this document and extract relevant metadata:
-
-        Title: {title}
-        Content: {content[:2000]}  # First 2000 chars
-
-        Please provide:
-        1. A concise summary (2-3 sentences)
-        2. Key topics/tags (comma-separated)
-        3. Document type (invoice, receipt, letter, form, etc.)
-        4. Any dates mentioned
-        5. Any important entities (people, organizations, amounts)
+        prompt = METADATA_PROMPT_TEMPLATE.format(title=title, content=window.text)
 
-        Respond in JSON format.
-        """
+        # Overloaded propagates so the caller can answer 503
+        with model_call(count_tokens(prompt, GPT_MODEL) + MODEL_OUTPUT_TOKENS_ESTIMATE):
+            metadata = model_backend.extract_metadata(prompt, [document.get('id')])[document.get('id')]
+        metadata['content_window'] = window.stats()
 
-        # Simulate GPT response for now
-        # In production, use: openai.ChatCompletion.create(...)
-        metadata = {
-            'summary': f'Document about {title}',
-            'tags': ['document', 'automated'],
-            'document_type': 'general',
-            'dates': [],
-            'entities': [],
-            'method': 'gpt-4o',
-            'note': 'This is a simulated response. Configure OpenAI API key for real extraction.'
-        }
+        if metadata_cache is not None:
+            metadata_cache.set(cache_key, metadata)
 
         return metadata
 
+    except Overloaded:
+        raise
+
     except Exception as e:
         logger.error(f"Error extracting metadata: {str(e)}")
         return {
@@ -195,6 +479,107 @@ def extract_metadata(document):
         }
 
 
+def prepare_batch_document(document):
+    """
+    Cached result, error, or PackItem still needing a model call (batch API)
+    """
+    documents.put(document)
+
+    if not document.get('content'):
+        return {'error': 'No content available for metadata extraction'}
+
+    try:
+        window, cache_key = metadata_window(document)
+    except Exception as e:
+        logger.error(f"Error preparing document {document.get('id')}: {str(e)}")
+        return {'error': str(e)}
+
+    if metadata_cache is not None:
+        cached = metadata_cache.get(cache_key)
+        if cached is not None:
+            return dict(cached, cached=True)
+
+    return PackItem(document, window, cache_key)
+
+
+def extract_metadata_packed(items, max_attempts=3):
+    """
+    Use one GPT request to extract metadata for several documents
+
+    Results are cached under the same keys as single-document extraction.
+    A pack of one (final flush, oversized document) uses the single-document
+    prompt, so its cached result matches what /process would produce.
+    In a batch, a full model call queue is waited out rather than reported.
+    """
+    if len(items) == 1:
+        prompt = METADATA_PROMPT_TEMPLATE.format(title=items[0].document.get('title', ''),
+                                                 content=items[0].window.text)
+    else:
+        prompt = PACKED_METADATA_PROMPT_TEMPLATE.format(documents=''.join(
+            PACKED_DOCUMENT_TEMPLATE.format(
+                document_id=item.document_id,
+                title=item.document.get('title', ''),
+                content=item.window.text
+            )
+            for item in items
+        ))
+
+    estimated_tokens = count_tokens(prompt, GPT_MODEL) + MODEL_OUTPUT_TOKENS_ESTIMATE * len(items)
+    for attempt in range(1, max_attempts + 1):
+        try:
+            with model_call(estimated_tokens):
+                results = model_backend.extract_metadata(prompt, [item.document_id for item in items])
+            break
+        except Overloaded as e:
+            if attempt == max_attempts:
+                raise
+            logger.warning(f"Model call not admitted ({str(e)}), retrying pack in {e.retry_after}s")
+            time.sleep(e.retry_after)
+
+    for item in items:
+        if item.document_id in results:
+            results[item.document_id]['content_window'] = item.window.stats()
+            if metadata_cache is not None:
+                metadata_cache.set(item.cache_key, results[item.document_id])
+
+    return results
+
+
+def summarize_chunk(title, chunk):
+    """
+    Use GPT to summarise one chunk of a long document (map step)
+    """
+    cache_key = make_key('summary', METADATA_PROMPT_VERSION, model_backend.model, title, chunk)
+    if metadata_cache is not None:
+        cached = metadata_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+    prompt = SUMMARY_PROMPT_TEMPLATE.format(title=title, content=chunk)
+
+    with model_call(count_tokens(prompt, GPT_MODEL) + MODEL_OUTPUT_TOKENS_ESTIMATE):
+        summary = model_backend.summarize(prompt)
+
+    if metadata_cache is not None:
+        metadata_cache.set(cache_key, summary)
+
+    return summary
+
+
+def shutdown(wait: bool = True) -> None:
+    """
+    Finish blocking calls still running on the shared pool
+
+    Called by the production server when a worker exits.
+    """
+    blocking.shutdown(wait=wait)
+    logger.info("Shutdown complete")
+
+
+metrics.register_collector(metrics.ModelRateCollector(model_rate.stats))
+metrics.register_collector(metrics.ModelCallCollector(model_calls.stats))
+
+
 if __name__ == '__main__':
     port = int(os.getenv('PORT', 8080))
     app.run(host='0.0.0.0', port=port, debug=False)
@@ -0,0 +1,174 @@
+"""
+Batch metadata extraction for paperless-gpt
+
+Documents are fetched from Paperless a page at a time with
+`/api/documents/?id__in=...` instead of one GET per document. Short
+documents are packed together so a single model request covers several of
+them; long documents get a request of their own. Packs run with bounded
+concurrency and per-document results are yielded as soon as their pack
+finishes, so memory use does not grow with the size of the batch.
+"""
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterator, List, Union
+
+from upstream import UpstreamClient
+from windowing import ContentWindow
+
+logger = logging.getLogger(__name__)
+
+
+def fetch_documents(paperless_api: UpstreamClient, document_ids: List[int],
+                    page_size: int = 100) -> Iterator[Dict[str, Any]]:
+    """
+    Yield the documents for `document_ids`, fetched in pages via id__in
+    """
+    for start in range(0, len(document_ids), page_size):
+        group = document_ids[start:start + page_size]
+        response = paperless_api.get('/api/documents/', params={
+            'id__in': ','.join(str(doc_id) for doc_id in group),
+            'page_size': page_size
+        })
+        response.raise_for_status()
+        page = response.json()
+        yield from page.get('results', [])
+
+        while page.get('next'):
+            response = paperless_api.get(page['next'])
+            response.raise_for_status()
+            page = response.json()
+            yield from page.get('results', [])
+
+
+@dataclass
+class PackItem:
+    """
+    A document ready for extraction: its prompt window, size and cache key
+    """
+    document: Dict[str, Any]
+    window: ContentWindow
+    cache_key: str
+
+    @property
+    def document_id(self) -> int:
+        return self.document.get('id')
+
+
+class Packer:
+    """
+    Groups items into packs of at most `max_documents` and `token_budget` tokens
+
+    Items whose window is larger than `max_document_tokens` are never packed.
+    """
+
+    def __init__(self, token_budget: int, max_documents: int, max_document_tokens: int):
+        self.token_budget = token_budget
+        self.max_documents = max_documents
+        self.max_document_tokens = max_document_tokens
+        self._pack: List[PackItem] = []
+        self._tokens = 0
+
+    def add(self, item: PackItem) -> List[List[PackItem]]:
+        """
+        Add an item, returning any packs that are now ready to send
+        """
+        tokens = item.window.tokens
+        if tokens > self.max_document_tokens or self.max_documents <= 1:
+            return [[item]]
+
+        ready = []
+        if self._pack and (len(self._pack) >= self.max_documents or self._tokens + tokens > self.token_budget):
+            ready.append(self.flush())
+        self._pack.append(item)
+        self._tokens += tokens
+        return ready
+
+    def flush(self) -> List[PackItem]:
+        pack, self._pack, self._tokens = self._pack, [], 0
+        return pack
+
+
+def run_metadata_batch(document_ids: List[int], documents: Iterator[Dict[str, Any]],
+                       prepare: Callable[[Dict[str, Any]], Union[PackItem, Dict[str, Any]]],
+                       extract_pack: Callable[[List[PackItem]], Dict[int, Dict[str, Any]]],
+                       pack_token_budget: int, pack_max_documents: int, pack_max_document_tokens: int,
+                       concurrency: int = 2) -> Iterator[Dict[str, Any]]:
+    """
+    Extract metadata for a batch, yielding NDJSON-ready events
+
+    prepare(document) returns a cached result dict, an error dict, or a
+    PackItem that still needs a model call. extract_pack(items) returns
+    metadata keyed by document ID.
+    """
+    total = len(document_ids)
+    counts = {'succeeded': 0, 'failed': 0, 'cache_hits': 0, 'model_calls': 0}
+    seen = set()
+    started = time.monotonic()
+
+    yield {'type': 'start', 'total': total, 'concurrency': concurrency}
+
+    def result_event(document_id, result, packed_with=1):
+        ok = 'error' not in result
+        counts['succeeded' if ok else 'failed'] += 1
+        event = {
+            'type': 'result',
+            'document_id': document_id,
+            'status': 'success' if ok else 'error',
+            'done': counts['succeeded'] + counts['failed'],
+            'total': total
+        }
+        if ok:
+            event.update(metadata=result, packed_with=packed_with)
+        else:
+            event['error'] = result['error']
+        return event
+
+    def collect(in_flight):
+        finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+        for future in finished:
+            pack = in_flight.pop(future)
+            try:
+                results = future.result()
+            except Exception as e:
+                logger.error(f"Metadata pack of {len(pack)} documents failed: {str(e)}")
+                results = {}
+                error = str(e)
+            else:
+                error = 'No result returned for document'
+            for item in pack:
+                yield result_event(item.document_id, results.get(item.document_id, {'error': error}), len(pack))
+
+    packer = Packer(pack_token_budget, pack_max_documents, pack_max_document_tokens)
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='pack') as executor:
+        in_flight = {}
+
+        def submit(packs):
+            for pack in packs:
+                while len(in_flight) >= concurrency:
+                    yield from collect(in_flight)
+                in_flight[executor.submit(extract_pack, pack)] = pack
+                counts['model_calls'] += 1
+
+        for document in documents:
+            seen.add(document.get('id'))
+            prepared = prepare(document)
+            if isinstance(prepared, PackItem):
+                yield from submit(packer.add(prepared))
+                continue
+            if prepared.get('cached'):
+                counts['cache_hits'] += 1
+            yield result_event(document.get('id'), prepared)
+
+        last = packer.flush()
+        yield from submit([last] if last else [])
+        while in_flight:
+            yield from collect(in_flight)
+
+    for document_id in document_ids:
+        if document_id not in seen:
+            yield result_event(document_id, {'error': 'Document not found in Paperless'})
+
+    yield dict(counts, type='summary', total=total, elapsed_seconds=round(time.monotonic() - started, 1))
@@ -0,0 +1,175 @@
+"""
+Two-tier result cache for paperless-gpt
+
+Entries live in a bounded in-memory LRU and, optionally, in a directory of
+JSON files on disk. Both tiers expire entries after a TTL; the disk tier is
+trimmed oldest-first when it grows past its size limit. Lookups that miss
+memory but hit disk are promoted back into memory.
+"""
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def make_key(*parts: Any) -> str:
+    """
+    Stable SHA-256 key for a set of JSON-serialisable inputs
+    """
+    encoded = json.dumps(parts, sort_keys=True, default=str, ensure_ascii=False).encode('utf-8')
+    return hashlib.sha256(encoded).hexdigest()
+
+
+class TieredCache:
+    """
+    In-memory LRU in front of an optional on-disk tier
+    """
+
+    def __init__(self, name: str, max_entries: int = 1000, ttl_seconds: float = 86400,
+                 disk_dir: Optional[str] = None, disk_max_bytes: int = 256 * 1024 * 1024):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+
+        self._memory: 'OrderedDict[str, tuple]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'writes': 0, 'evictions': 0}
+        self._disk_bytes = 0
+
+        if disk_dir:
+            try:
+                os.makedirs(disk_dir, exist_ok=True)
+                self._disk_bytes = sum(entry.stat().st_size for entry in self._disk_entries())
+            except OSError as e:
+                logger.warning(f"Disabling disk tier for {name} cache: {str(e)}")
+                self.disk_dir = None
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, key[:2], f'{key}.json')
+
+    def _disk_entries(self):
+        for shard in os.scandir(self.disk_dir):
+            if shard.is_dir():
+                for entry in os.scandir(shard.path):
+                    if entry.name.endswith('.json'):
+                        yield entry
+
+    def _count(self, counter: str) -> None:
+        with self._lock:
+            self._counters[counter] += 1
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, stored_at = entry
+                if now - stored_at <= self.ttl_seconds:
+                    self._memory.move_to_end(key)
+                    self._counters['memory_hits'] += 1
+                    return value
+                del self._memory[key]
+
+        if self.disk_dir:
+            value = self._disk_get(key, now)
+            if value is not None:
+                self._count('disk_hits')
+                return value
+
+        self._count('misses')
+        return None
+
+    def _disk_get(self, key: str, now: float) -> Optional[Any]:
+        path = self._path(key)
+        try:
+            with open(path) as f:
+                record = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if now - record.get('stored_at', 0) > self.ttl_seconds:
+            self._disk_remove(path)
+            return None
+
+        self._memory_put(key, record['value'], record['stored_at'])
+        return record['value']
+
+    def set(self, key: str, value: Any) -> None:
+        stored_at = time.time()
+        self._memory_put(key, value, stored_at)
+        self._count('writes')
+        if self.disk_dir:
+            self._disk_put(key, value, stored_at)
+
+    def _memory_put(self, key: str, value: Any, stored_at: float) -> None:
+        with self._lock:
+            self._memory[key] = (value, stored_at)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+                self._counters['evictions'] += 1
+
+    def _disk_put(self, key: str, value: Any, stored_at: float) -> None:
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            previous = os.path.getsize(path) if os.path.exists(path) else 0
+            tmp = f'{path}.{threading.get_ident()}.tmp'
+            with open(tmp, 'w') as f:
+                json.dump({'stored_at': stored_at, 'value': value}, f)
+            size = os.path.getsize(tmp)
+            os.replace(tmp, path)
+        except (OSError, TypeError, ValueError) as e:
+            logger.warning(f"Could not write {self.name} cache entry to disk: {str(e)}")
+            return
+
+        with self._lock:
+            self._disk_bytes += size - previous
+            over_limit = self._disk_bytes > self.disk_max_bytes
+        if over_limit:
+            self._trim_disk()
+
+    def _disk_remove(self, path: str) -> None:
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except OSError:
+            return
+        with self._lock:
+            self._disk_bytes -= size
+
+    def _trim_disk(self) -> None:
+        """
+        Drop the oldest disk entries until the tier is at 90% of its limit
+        """
+        entries = sorted(self._disk_entries(), key=lambda entry: entry.stat().st_mtime)
+        target = self.disk_max_bytes * 0.9
+        for entry in entries:
+            if self._disk_bytes <= target:
+                break
+            self._disk_remove(entry.path)
+            self._count('evictions')
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._counters['memory_hits'] + self._counters['disk_hits'] + self._counters['misses']
+            hits = lookups - self._counters['misses']
+            return dict(
+                self._counters,
+                name=self.name,
+                hit_ratio=round(hits / lookups, 3) if lookups else 0.0,
+                memory_entries=len(self._memory),
+                max_entries=self.max_entries,
+                disk_enabled=bool(self.disk_dir),
+                disk_bytes=self._disk_bytes,
+                disk_max_bytes=self.disk_max_bytes,
+                ttl_seconds=self.ttl_seconds
+            )
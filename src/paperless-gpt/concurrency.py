@@ -0,0 +1,100 @@
+"""
+Concurrency controls for paperless-gpt
+
+Model calls are expensive and rate limited upstream, so the number of calls
+in flight is capped per process. Callers beyond the cap wait in a bounded
+queue; once the queue is full new work is rejected immediately so clients
+can back off instead of piling up on blocked threads.
+"""
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import partial
+from typing import Any, Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+
+class Overloaded(Exception):
+    """Raised when no model call slot is available and the wait queue is full"""
+
+    def __init__(self, message: str, retry_after: int = 5):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class ModelCallLimiter:
+    """
+    Caps concurrent model calls with a bounded wait queue
+    """
+
+    def __init__(self, max_concurrent: int = 4, max_waiting: int = 16, wait_timeout: float = 60.0):
+        self.max_concurrent = max_concurrent
+        self.max_waiting = max_waiting
+        self.wait_timeout = wait_timeout
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._lock = threading.Lock()
+        self._active = 0
+        self._waiting = 0
+        self._peak_active = 0
+        self._rejected = 0
+
+    @contextmanager
+    def slot(self):
+        """
+        Hold a model call slot for the duration of the block
+        """
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                if self._waiting >= self.max_waiting:
+                    self._rejected += 1
+                    raise Overloaded(f"Model call queue is full ({self._waiting} waiting)")
+                self._waiting += 1
+            try:
+                acquired = self._slots.acquire(timeout=self.wait_timeout)
+            finally:
+                with self._lock:
+                    self._waiting -= 1
+            if not acquired:
+                with self._lock:
+                    self._rejected += 1
+                raise Overloaded(f"Timed out after {self.wait_timeout:.0f}s waiting for a model call slot")
+
+        with self._lock:
+            self._active += 1
+            self._peak_active = max(self._peak_active, self._active)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._active -= 1
+            self._slots.release()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'max_concurrent': self.max_concurrent,
+                'max_waiting': self.max_waiting,
+                'active': self._active,
+                'waiting': self._waiting,
+                'peak_active': self._peak_active,
+                'rejected': self._rejected
+            }
+
+
+class BlockingRunner:
+    """
+    Runs blocking calls (HTTP, model SDKs) from async views on a shared pool
+    """
+
+    def __init__(self, max_workers: int = 32):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='io')
+
+    async def run(self, func: Callable, *args, **kwargs) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(func, *args, **kwargs))
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait)
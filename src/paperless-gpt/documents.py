@@ -0,0 +1,102 @@
+"""
+Read-through cache of Paperless document JSON
+
+Cached documents are served without contacting Paperless when:
+
+- the caller passes the document's `modified` timestamp and it matches the
+  cached copy, or
+- the cached copy was validated less than `max_age` seconds ago. The
+  default of 0 always revalidates, so a reprocess triggered by an edit
+  never runs on the content it was meant to replace.
+
+Otherwise the entry is revalidated with a conditional GET (If-None-Match)
+when Paperless supplied an ETag, and re-fetched in full when it did not or
+the document changed. Storage is a TieredCache: bounded memory LRU plus an
+optional disk tier.
+"""
+import time
+import logging
+import threading
+from typing import Any, Dict, Optional
+
+from cache import TieredCache, make_key
+from upstream import UpstreamClient
+
+logger = logging.getLogger(__name__)
+
+
+class DocumentFetchError(Exception):
+    """Raised when Paperless answers a document request with an error status"""
+
+    def __init__(self, document_id: int, status_code: int):
+        super().__init__(f'Failed to fetch document {document_id} from Paperless: {status_code}')
+        self.status_code = status_code
+
+
+class DocumentCache:
+    """
+    Read-through cache in front of GET /api/documents/{id}/
+    """
+
+    def __init__(self, paperless_api: UpstreamClient, cache: Optional[TieredCache], max_age: float = 0):
+        self.paperless_api = paperless_api
+        self.cache = cache
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._counters = {'served_by_modified': 0, 'served_fresh': 0, 'revalidated': 0, 'fetched': 0}
+
+    def _count(self, counter: str) -> None:
+        with self._lock:
+            self._counters[counter] += 1
+
+    @staticmethod
+    def _key(document_id: int) -> str:
+        return make_key('document', document_id)
+
+    def put(self, document: Dict[str, Any], etag: Optional[str] = None) -> None:
+        """
+        Store a document obtained elsewhere, e.g. from a bulk list request
+        """
+        if self.cache is not None and document.get('id') is not None:
+            self.cache.set(self._key(document['id']), {
+                'document': document,
+                'etag': etag,
+                'validated_at': time.time()
+            })
+
+    def get(self, document_id: int, modified: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Document JSON for `document_id`, from cache when it is still valid
+        """
+        entry = self.cache.get(self._key(document_id)) if self.cache is not None else None
+        headers = {}
+
+        if entry is not None:
+            if modified:
+                if entry['document'].get('modified') == modified:
+                    self._count('served_by_modified')
+                    return entry['document']
+            elif self.max_age > 0 and time.time() - entry['validated_at'] < self.max_age:
+                self._count('served_fresh')
+                return entry['document']
+            elif entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+
+        response = self.paperless_api.get(f"/api/documents/{document_id}/", headers=headers)
+
+        if response.status_code == 304 and entry is not None:
+            self._count('revalidated')
+            self.put(entry['document'], entry['etag'])
+            return entry['document']
+
+        if response.status_code != 200:
+            raise DocumentFetchError(document_id, response.status_code)
+
+        self._count('fetched')
+        document = response.json()
+        self.put(document, response.headers.get('ETag'))
+        return document
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._counters, max_age=self.max_age, enabled=self.cache is not None)
@@ -0,0 +1,48 @@
+"""
+Gunicorn settings for paperless-gpt
+
+Loaded automatically by `gunicorn app:app` from the working directory.
+Requests spend most of their time waiting on Paperless and the model API,
+so each worker process serves several requests on threads; async views run
+their own event loop on the request thread. MAX_CONCURRENT_MODEL_CALLS and
+the caches are per worker process.
+
+On SIGTERM a worker stops accepting requests and finishes the ones in
+flight within WEB_GRACEFUL_TIMEOUT before it exits.
+"""
+import os
+import sys
+
+from serving import available_cpus, worker_count
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8080')}"
+workers = worker_count(
+    os.getenv('WEB_WORKERS', '0'),
+    per_cpu=float(os.getenv('WEB_WORKERS_PER_CPU', '2')),
+    maximum=int(os.getenv('WEB_MAX_WORKERS', '8'))
+)
+# Lets the app split per-pod limits (MODEL_RPM_LIMIT, MODEL_TPM_LIMIT) between workers
+os.environ['WEB_WORKER_PROCESSES'] = str(workers)
+worker_class = os.getenv('WEB_WORKER_CLASS', 'gthread')
+threads = int(os.getenv('WEB_THREADS', '8'))
+timeout = int(os.getenv('WEB_TIMEOUT', '120'))
+graceful_timeout = int(os.getenv('WEB_GRACEFUL_TIMEOUT', '120'))
+keepalive = int(os.getenv('WEB_KEEPALIVE', '5'))
+max_requests = int(os.getenv('WEB_MAX_REQUESTS', '0'))
+max_requests_jitter = max_requests // 10
+preload_app = False
+accesslog = '-' if os.getenv('WEB_ACCESS_LOG', 'false').lower() == 'true' else None
+
+
+def on_starting(server):
+    server.log.info(f"Starting {workers} {worker_class} workers x {threads} threads "
+                    f"({available_cpus()} CPUs available)")
+
+
+def worker_exit(server, worker):
+    """
+    Let background work started by finished requests complete before the process exits
+    """
+    app_module = sys.modules.get('app')
+    if app_module is not None:
+        app_module.shutdown()
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Load generator for paperless-gpt
+
+Drives POST /process at a fixed arrival rate and reports latency
+percentiles and throughput. Requests are scheduled open-loop: latency is
+measured from when a request was due, not when a free thread picked it up,
+so a saturated service shows up as growing latency instead of a quietly
+lower request rate.
+
+Fully offline sizing run (no OpenAI, no Paperless):
+
+    # terminal 1: stub Paperless on :8001 plus the load generator
+    python loadtest.py --stub-paperless 8001 --url http://localhost:8080 --rps 20 --duration 60
+
+    # terminal 2: the service under test with the stub model backend
+    MODEL_BACKEND=stub PAPERLESS_API_URL=http://localhost:8001 \\
+        gunicorn --bind 0.0.0.0:8080 app:app
+"""
+import io
+import sys
+import json
+import time
+import argparse
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List
+from urllib.parse import parse_qs, urlparse
+
+import requests
+
+STUB_CONTENT = (
+    "Invoice {id}\n\nACME Corporation\n123 Main Street\n\n"
+    "Invoice date: 2024-03-{day:02d}\nCustomer: Example Ltd\n\n"
+    + "Item {id}: consulting services, 1 x 100.00\n" * 20
+    + "\nTotal due: {total}.00 EUR\n"
+)
+
+
+def stub_document(document_id: int) -> Dict[str, Any]:
+    return {
+        'id': document_id,
+        'title': f'Invoice {document_id}',
+        'content': STUB_CONTENT.format(id=document_id, day=document_id % 28 + 1, total=document_id * 100),
+        'modified': '2024-03-01T00:00:00Z'
+    }
+
+
+def stub_pdf(document_id: int, pages: int) -> bytes:
+    """
+    Blank multi-page PDF, built with pypdf when available
+    """
+    try:
+        from pypdf import PdfWriter
+    except ImportError:
+        return f'Stub document {document_id}'.encode('utf-8')
+    writer = PdfWriter()
+    for _ in range(pages):
+        writer.add_blank_page(612, 792)
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+
+def start_stub_paperless(port: int, pages: int = 3) -> ThreadingHTTPServer:
+    """
+    Serve the few Paperless API routes paperless-gpt uses, in a background thread
+    """
+    pdf_cache: Dict[int, bytes] = {}
+
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, status: int, body: bytes, content_type: str = 'application/json'):
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            parts = [part for part in url.path.split('/') if part]
+
+            if parts == ['api', 'documents']:
+                ids = parse_qs(url.query).get('id__in', [''])[0]
+                results = [stub_document(int(doc_id)) for doc_id in ids.split(',') if doc_id]
+                body = {'count': len(results), 'next': None, 'results': results}
+                return self._send(200, json.dumps(body).encode('utf-8'))
+
+            if len(parts) >= 3 and parts[:2] == ['api', 'documents'] and parts[2].isdigit():
+                document_id = int(parts[2])
+                if len(parts) == 3:
+                    return self._send(200, json.dumps(stub_document(document_id)).encode('utf-8'))
+                if parts[3] == 'download':
+                    if document_id not in pdf_cache:
+                        pdf_cache[document_id] = stub_pdf(document_id, pages)
+                    return self._send(200, pdf_cache[document_id], 'application/pdf')
+
+            self._send(404, b'{"detail": "Not found."}')
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('0.0.0.0', port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True, name='stub-paperless').start()
+    return server
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def run_load(url: str, rps: float, duration: float, document_ids: List[int], action: str,
+             max_outstanding: int, timeout: float) -> Dict[str, Any]:
+    """
+    Send requests at `rps` for `duration` seconds and summarise the results
+    """
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=max_outstanding)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    lock = threading.Lock()
+
+    def send(due: float, document_id: int):
+        try:
+            response = session.post(f'{url}/process', json={'document_id': document_id, 'action': action},
+                                    timeout=timeout)
+            outcome = str(response.status_code)
+        except requests.exceptions.RequestException as e:
+            outcome = type(e).__name__
+        elapsed = time.monotonic() - due
+        with lock:
+            statuses[outcome] += 1
+            if outcome == '200':
+                latencies.append(elapsed)
+
+    total = int(rps * duration)
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=max_outstanding, thread_name_prefix='load') as executor:
+        for n in range(total):
+            due = started + n / rps
+            delay = due - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            executor.submit(send, due, document_ids[n % len(document_ids)])
+    elapsed = time.monotonic() - started
+
+    return {
+        'target_rps': rps,
+        'requests': total,
+        'elapsed_seconds': round(elapsed, 2),
+        'throughput_rps': round(statuses['200'] / elapsed, 2) if elapsed else 0.0,
+        'statuses': dict(statuses),
+        'latency_seconds': {
+            'p50': round(percentile(latencies, 50), 3),
+            'p95': round(percentile(latencies, 95), 3),
+            'p99': round(percentile(latencies, 99), 3),
+            'max': round(max(latencies), 3) if latencies else 0.0
+        }
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Drive paperless-gpt /process at a target request rate')
+    parser.add_argument('--url', default='http://localhost:8080', help='paperless-gpt base URL')
+    parser.add_argument('--rps', type=float, default=5.0, help='Target requests per second')
+    parser.add_argument('--duration', type=float, default=30.0, help='Seconds to generate load for')
+    parser.add_argument('--documents', type=int, default=100,
+                        help='Cycle through document IDs 1..N (default: 100)')
+    parser.add_argument('--action', choices=['ocr', 'metadata', 'both'], default='both')
+    parser.add_argument('--max-outstanding', type=int, default=256,
+                        help='Most requests in flight at once (default: 256)')
+    parser.add_argument('--timeout', type=float, default=120.0, help='Per-request timeout in seconds')
+    parser.add_argument('--stub-paperless', type=int, metavar='PORT',
+                        help='Serve a stub Paperless API on PORT for the service under test')
+    parser.add_argument('--stub-pages', type=int, default=3, help='Pages per stub document (default: 3)')
+    parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+    args = parser.parse_args()
+
+    if args.rps <= 0 or args.duration <= 0:
+        parser.error('--rps and --duration must be positive')
+
+    if args.stub_paperless:
+        start_stub_paperless(args.stub_paperless, pages=args.stub_pages)
+        print(f"Stub Paperless API listening on :{args.stub_paperless}", file=sys.stderr)
+
+    print(f"Sending {args.rps:g} req/s to {args.url}/process for {args.duration:g}s", file=sys.stderr)
+    report = run_load(args.url, args.rps, args.duration, list(range(1, args.documents + 1)),
+                      args.action, args.max_outstanding, args.timeout)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    latency = report['latency_seconds']
+    print(f"Requests:    {report['requests']} in {report['elapsed_seconds']}s")
+    print(f"Throughput:  {report['throughput_rps']} req/s successful (target {report['target_rps']:g})")
+    print(f"Statuses:    {', '.join(f'{k}={v}' for k, v in sorted(report['statuses'].items()))}")
+    print(f"Latency:     p50={latency['p50']}s  p95={latency['p95']}s  p99={latency['p99']}s  max={latency['max']}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""
+Prometheus metrics for paperless-gpt
+
+Metrics live in a dedicated registry served by /metrics. Values are per
+worker process.
+"""
+import time
+from typing import Dict, Any, Callable
+
+from prometheus_client import CollectorRegistry, Gauge, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+REGISTRY = CollectorRegistry()
+START_TIME = time.time()
+
+MODEL_RATE_WAIT = Histogram(
+    'paperless_gpt_model_rate_wait_seconds',
+    'Time model calls spent queued for requests-per-minute and tokens-per-minute capacity',
+    buckets=(0.01, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60),
+    registry=REGISTRY
+)
+
+Gauge(
+    'paperless_gpt_uptime_seconds',
+    'Seconds since this worker process started',
+    registry=REGISTRY
+).set_function(lambda: time.time() - START_TIME)
+
+
+class ModelRateCollector:
+    """
+    Exposes model rate limiter capacity and queue state
+    """
+
+    def __init__(self, stats_func: Callable[[], Dict[str, Any]]):
+        self.stats_func = stats_func
+
+    def collect(self):
+        stats = self.stats_func()
+        waiting = GaugeMetricFamily(
+            'paperless_gpt_model_rate_waiting', 'Model calls queued for rate limit capacity')
+        waiting.add_metric([], stats['waiting'])
+        available = GaugeMetricFamily(
+            'paperless_gpt_model_rate_available',
+            'Capacity left in each rate limit bucket (requests or tokens)', labels=['bucket'])
+        for bucket in ('requests', 'tokens'):
+            if stats[f'available_{bucket}'] is not None:
+                available.add_metric([bucket], stats[f'available_{bucket}'])
+        granted = CounterMetricFamily(
+            'paperless_gpt_model_rate_granted', 'Model calls admitted by the rate limiter')
+        granted.add_metric([], stats['granted'])
+        rejected = CounterMetricFamily(
+            'paperless_gpt_model_rate_rejected', 'Model calls rejected because the wait would be too long')
+        rejected.add_metric([], stats['rejected'])
+        tokens = CounterMetricFamily(
+            'paperless_gpt_model_tokens', 'Model tokens used, as reported by the backend or estimated')
+        tokens.add_metric([], stats['tokens_used'])
+        yield from (waiting, available, granted, rejected, tokens)
+
+
+class ModelCallCollector:
+    """
+    Exposes the per-process model call concurrency limiter
+    """
+
+    def __init__(self, stats_func: Callable[[], Dict[str, Any]]):
+        self.stats_func = stats_func
+
+    def collect(self):
+        stats = self.stats_func()
+        active = GaugeMetricFamily('paperless_gpt_model_calls_active', 'Model calls in flight')
+        active.add_metric([], stats['active'])
+        waiting = GaugeMetricFamily('paperless_gpt_model_calls_waiting', 'Model calls waiting for a slot')
+        waiting.add_metric([], stats['waiting'])
+        rejected = CounterMetricFamily(
+            'paperless_gpt_model_calls_rejected', 'Model calls rejected because the slot queue was full')
+        rejected.add_metric([], stats['rejected'])
+        yield from (active, waiting, rejected)
+
+
+def register_collector(collector) -> None:
+    REGISTRY.register(collector)
+
+
+def render() -> bytes:
+    """
+    Prometheus text exposition of every registered metric
+    """
+    return generate_latest(REGISTRY)
@@ -0,0 +1,181 @@
+"""
+Streaming, page-chunked OCR for paperless-gpt
+
+Large documents are never held in memory whole:
+
+1. The original file is streamed from Paperless to a temporary file in chunks.
+2. Pages are split off one at a time by a generator (PDFs via pypdf; any
+   other file type is treated as a single page).
+3. Only a bounded window of pages is OCR'd concurrently; each finished page
+   is appended to a checkpoint so an interrupted run resumes where it left off.
+4. Page texts are reassembled in page order.
+"""
+import io
+import os
+import json
+import logging
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+from pypdf import PdfReader, PdfWriter
+
+from upstream import UpstreamClient
+
+logger = logging.getLogger(__name__)
+
+PDF_MAGIC = b'%PDF'
+
+_page_executor: Optional[ThreadPoolExecutor] = None
+_page_executor_lock = threading.Lock()
+
+
+def _executor(max_workers: int) -> ThreadPoolExecutor:
+    global _page_executor
+    with _page_executor_lock:
+        if _page_executor is None:
+            _page_executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='ocr-page')
+        return _page_executor
+
+
+def download_document(paperless_api: UpstreamClient, document_id: int, work_dir: str,
+                      chunk_size: int = 1024 * 1024) -> str:
+    """
+    Stream the original document from Paperless into a temporary file
+    """
+    os.makedirs(work_dir, exist_ok=True)
+    fd, path = tempfile.mkstemp(prefix=f'doc-{document_id}-', dir=work_dir)
+    try:
+        response = paperless_api.get(
+            f"/api/documents/{document_id}/download/",
+            params={'original': 'true'},
+            stream=True
+        )
+        with response:
+            response.raise_for_status()
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in response.iter_content(chunk_size=chunk_size):
+                    f.write(chunk)
+    except Exception:
+        os.remove(path)
+        raise
+    return path
+
+
+def iter_pages(path: str) -> Iterator[Tuple[int, bytes]]:
+    """
+    Yield (page_number, page_bytes) lazily, one single-page document at a time
+    """
+    with open(path, 'rb') as f:
+        is_pdf = f.read(len(PDF_MAGIC)) == PDF_MAGIC
+
+    if not is_pdf:
+        with open(path, 'rb') as f:
+            yield 1, f.read()
+        return
+
+    reader = PdfReader(path)
+    for index, page in enumerate(reader.pages):
+        writer = PdfWriter()
+        writer.add_page(page)
+        buffer = io.BytesIO()
+        writer.write(buffer)
+        yield index + 1, buffer.getvalue()
+
+
+class OCRCheckpoint:
+    """
+    Append-only log of OCR'd pages for one version of a document
+    """
+
+    def __init__(self, directory: str, document_id: int, version: str):
+        os.makedirs(directory, exist_ok=True)
+        safe_version = ''.join(c if c.isalnum() else '_' for c in str(version))
+        self.path = os.path.join(directory, f'{document_id}-{safe_version}.ndjson')
+        self._lock = threading.Lock()
+
+    def load(self) -> Dict[int, Dict[str, Any]]:
+        pages = {}
+        if not os.path.exists(self.path):
+            return pages
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # Partial line from an interrupted write
+                pages[entry['page']] = entry
+        return pages
+
+    def record(self, page_number: int, result: Dict[str, Any]) -> None:
+        with self._lock, open(self.path, 'a') as f:
+            f.write(json.dumps(dict(result, page=page_number)) + '\n')
+
+    def clear(self) -> None:
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+def ocr_document(paperless_api: UpstreamClient, document: Dict[str, Any],
+                 ocr_page: Callable[[int, int, bytes], Dict[str, Any]],
+                 work_dir: str, concurrency: int = 4) -> Dict[str, Any]:
+    """
+    OCR a document page by page, keeping at most `concurrency` pages in flight
+    """
+    document_id = document.get('id')
+    checkpoint = OCRCheckpoint(os.path.join(work_dir, 'checkpoints'), document_id,
+                               document.get('modified') or 'unknown')
+    done = checkpoint.load()
+    if done:
+        logger.info(f"Resuming OCR for document {document_id}: {len(done)} pages already done")
+
+    path = download_document(paperless_api, document_id, os.path.join(work_dir, 'downloads'))
+    executor = _executor(max(concurrency, 1) * 4)
+    results = {page: entry for page, entry in done.items()}
+    total_pages = 0
+
+    try:
+        in_flight = {}
+        for page_number, page_bytes in iter_pages(path):
+            total_pages = page_number
+            if page_number in done:
+                continue
+
+            while len(in_flight) >= concurrency:
+                _collect(in_flight, results, checkpoint)
+
+            in_flight[executor.submit(ocr_page, document_id, page_number, page_bytes)] = page_number
+
+        while in_flight:
+            _collect(in_flight, results, checkpoint)
+    except Exception:
+        # Keep whatever finished so a retry only redoes the missing pages
+        for future in wait(in_flight).done:
+            if future.exception() is None:
+                checkpoint.record(in_flight[future], future.result())
+        raise
+    finally:
+        os.remove(path)
+
+    checkpoint.clear()
+
+    ordered = [results[page] for page in sorted(results) if page <= total_pages]
+    confidences = [page['confidence'] for page in ordered if page.get('confidence') is not None]
+    return {
+        'text': '\n\n'.join(page.get('text', '') for page in ordered),
+        'confidence': round(sum(confidences) / len(confidences), 3) if confidences else None,
+        'pages': total_pages,
+        'resumed_pages': len(done)
+    }
+
+
+def _collect(in_flight: Dict, results: Dict[int, Dict[str, Any]], checkpoint: OCRCheckpoint) -> None:
+    finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+    for future in finished:
+        page_number = in_flight.pop(future)
+        result = future.result()
+        checkpoint.record(page_number, result)
+        results[page_number] = result
@@ -0,0 +1,190 @@
+"""
+Model provider rate limiting for paperless-gpt
+
+Providers limit both requests per minute (RPM) and tokens per minute (TPM).
+Each is modelled as a token bucket that holds up to one minute of capacity
+and refills continuously. A model call reserves one request and its
+estimated tokens before it starts; once the backend reports actual usage
+the reservation is settled, so a bucket may briefly go negative after an
+underestimate and later calls wait it off.
+
+Callers wait in a FIFO queue: a large call at the head is not starved by a
+stream of small ones behind it. When the queue is full, or the wait would
+exceed `max_wait`, Overloaded is raised so the request can be answered with
+503 and Retry-After instead of tying up a thread.
+"""
+import math
+import time
+import logging
+import threading
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional
+
+from concurrency import Overloaded
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Reservation:
+    """
+    Capacity taken for one model call
+    """
+    tokens: int
+    waited: float
+
+
+class ModelRateLimiter:
+    """
+    Requests-per-minute and tokens-per-minute limits shared by all threads of a process
+
+    A limit of 0 disables that bucket. on_wait, if given, is called with the
+    seconds each granted call spent queueing.
+    """
+
+    def __init__(self, requests_per_minute: float = 0, tokens_per_minute: float = 0,
+                 max_waiting: int = 64, max_wait: float = 60.0,
+                 on_wait: Optional[Callable[[float], None]] = None):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.max_waiting = max_waiting
+        self.max_wait = max_wait
+        self.on_wait = on_wait
+        self._requests = float(requests_per_minute)
+        self._tokens = float(tokens_per_minute)
+        self._updated = time.monotonic()
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._granted = 0
+        self._rejected = 0
+        self._tokens_used = 0
+        self._waited_seconds = 0.0
+        self._max_waited = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.requests_per_minute > 0 or self.tokens_per_minute > 0
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        elapsed = now - self._updated
+        self._updated = now
+        if self.requests_per_minute > 0:
+            self._requests = min(self.requests_per_minute,
+                                 self._requests + elapsed * self.requests_per_minute / 60)
+        if self.tokens_per_minute > 0:
+            self._tokens = min(self.tokens_per_minute,
+                               self._tokens + elapsed * self.tokens_per_minute / 60)
+
+    def _delay(self, tokens: int) -> float:
+        """
+        Seconds until both buckets can cover a call of `tokens`
+        """
+        delay = 0.0
+        if self.requests_per_minute > 0 and self._requests < 1:
+            delay = (1 - self._requests) * 60 / self.requests_per_minute
+        if self.tokens_per_minute > 0 and self._tokens < tokens:
+            delay = max(delay, (tokens - self._tokens) * 60 / self.tokens_per_minute)
+        return delay
+
+    def acquire(self, tokens: int) -> Reservation:
+        """
+        Wait in line until the call fits within both limits, then take the capacity
+        """
+        if not self.enabled:
+            return Reservation(tokens=tokens, waited=0.0)
+
+        # A call larger than a whole minute of tokens could never fit; let it through on a full bucket
+        tokens = max(0, tokens)
+        needed = min(tokens, self.tokens_per_minute) if self.tokens_per_minute > 0 else tokens
+        ticket = object()
+        started = time.monotonic()
+        deadline = started + self.max_wait
+
+        with self._cond:
+            self._refill()
+            if self._queue or self._delay(needed) > 0:
+                if len(self._queue) >= self.max_waiting:
+                    self._rejected += 1
+                    raise Overloaded(f"Model rate limit queue is full ({len(self._queue)} waiting)",
+                                     retry_after=max(1, math.ceil(self._delay(needed))))
+                self._queue.append(ticket)
+                try:
+                    while True:
+                        self._refill()
+                        delay = self._delay(needed)
+                        if self._queue[0] is ticket and delay <= 0:
+                            break
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0 or (self._queue[0] is ticket and delay > remaining):
+                            self._rejected += 1
+                            raise Overloaded(
+                                f"Model rate limit would delay this call by more than {self.max_wait:g}s",
+                                retry_after=max(1, math.ceil(delay))
+                            )
+                        self._cond.wait(min(remaining, delay) if self._queue[0] is ticket else remaining)
+                finally:
+                    self._queue.remove(ticket)
+                    self._cond.notify_all()
+
+            if self.requests_per_minute > 0:
+                self._requests -= 1
+            if self.tokens_per_minute > 0:
+                self._tokens -= tokens
+            waited = time.monotonic() - started
+            self._granted += 1
+            self._tokens_used += tokens
+            self._waited_seconds += waited
+            self._max_waited = max(self._max_waited, waited)
+
+        if self.on_wait is not None:
+            self.on_wait(waited)
+        return Reservation(tokens=tokens, waited=waited)
+
+    def release(self, reservation: Reservation) -> None:
+        """
+        Give back the capacity of a call that never reached the provider
+        """
+        if not self.enabled:
+            return
+        with self._cond:
+            if self.requests_per_minute > 0:
+                self._requests = min(self.requests_per_minute, self._requests + 1)
+                self._cond.notify_all()
+        self.settle(reservation, 0)
+
+    def settle(self, reservation: Reservation, used_tokens: Optional[int]) -> None:
+        """
+        Replace a reservation's estimate with the tokens the call actually used
+
+        None (usage not reported) leaves the estimate in place.
+        """
+        if used_tokens is None or not self.enabled:
+            return
+        difference = used_tokens - reservation.tokens
+        reservation.tokens = used_tokens
+        with self._cond:
+            self._refill()
+            if self.tokens_per_minute > 0:
+                self._tokens = min(self.tokens_per_minute, self._tokens - difference)
+            self._tokens_used += difference
+            if difference < 0:
+                self._cond.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            self._refill()
+            return {
+                'requests_per_minute': self.requests_per_minute,
+                'tokens_per_minute': self.tokens_per_minute,
+                'available_requests': round(self._requests, 1) if self.requests_per_minute > 0 else None,
+                'available_tokens': round(self._tokens) if self.tokens_per_minute > 0 else None,
+                'waiting': len(self._queue),
+                'max_waiting': self.max_waiting,
+                'granted': self._granted,
+                'rejected': self._rejected,
+                'tokens_used': self._tokens_used,
+                'average_wait_seconds': round(self._waited_seconds / self._granted, 3) if self._granted else 0.0,
+                'max_wait_seconds': round(self._max_waited, 3)
+            }
@@ -0,0 +1,220 @@
+"""
+Token-aware content selection for metadata extraction
+
+Rather than sending a fixed-length prefix of the document, content is
+cleaned and cut down to a token budget:
+
+1. Lines that repeat throughout the document (page headers, footers,
+   "Page 3 of 12") are dropped and runs of blank lines collapsed.
+2. If the cleaned text fits the budget it is used as-is.
+3. Otherwise it is split into paragraph-aligned chunks and the first chunk,
+   the last chunk and evenly spaced chunks from the middle are kept, in
+   document order, until the budget is spent.
+4. Very long documents can instead be map-reduced: chunks are summarised
+   individually and the summaries are windowed as above.
+
+Token counts use tiktoken when it is installed and fall back to an estimate
+of four characters per token otherwise.
+"""
+import re
+import logging
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, asdict
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+CHARS_PER_TOKEN = 4
+GAP_MARKER = '\n[...]\n'
+
+_encodings: Dict[str, Any] = {}
+
+
+def _encoding(model: str):
+    if tiktoken is None:
+        return None
+    if model not in _encodings:
+        try:
+            _encodings[model] = tiktoken.encoding_for_model(model)
+        except Exception as e:
+            logger.warning(f"No tiktoken encoding for {model}, estimating tokens: {str(e)}")
+            _encodings[model] = None
+    return _encodings[model]
+
+
+def count_tokens(text: str, model: str = 'gpt-4o') -> int:
+    """
+    Number of tokens `text` takes up for `model`
+    """
+    encoding = _encoding(model)
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def _normalise_line(line: str) -> str:
+    # Page numbers and dates differ between otherwise identical headers
+    return re.sub(r'\d+', '#', line.strip().lower())
+
+
+def strip_boilerplate(text: str, min_repeats: int = 3, max_line_length: int = 100) -> str:
+    """
+    Drop short lines that recur at least `min_repeats` times and collapse blank runs
+
+    Only lines up to `max_line_length` characters are considered, so repeated
+    body text such as table rows survives.
+    """
+    lines = text.splitlines()
+    counts = Counter(_normalise_line(line) for line in lines
+                     if line.strip() and len(line.strip()) <= max_line_length)
+    repeated = {line for line, count in counts.items() if count >= min_repeats}
+
+    kept = []
+    for line in lines:
+        if line.strip() and _normalise_line(line) in repeated:
+            continue
+        if not line.strip() and (not kept or not kept[-1].strip()):
+            continue
+        kept.append(line.rstrip())
+    return '\n'.join(kept).strip()
+
+
+def split_chunks(text: str, chunk_tokens: int, model: str = 'gpt-4o') -> List[str]:
+    """
+    Split text into chunks of roughly `chunk_tokens`, preferring paragraph breaks
+    """
+    chunks = []
+    current: List[str] = []
+    current_tokens = 0
+
+    for paragraph in re.split(r'\n\s*\n', text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        tokens = count_tokens(paragraph, model)
+
+        # Oversized paragraphs are cut on character boundaries
+        if tokens > chunk_tokens:
+            if current:
+                chunks.append('\n\n'.join(current))
+                current, current_tokens = [], 0
+            step = max(1, len(paragraph) * chunk_tokens // tokens)
+            chunks.extend(paragraph[i:i + step] for i in range(0, len(paragraph), step))
+            continue
+
+        if current and current_tokens + tokens > chunk_tokens:
+            chunks.append('\n\n'.join(current))
+            current, current_tokens = [], 0
+        current.append(paragraph)
+        current_tokens += tokens
+
+    if current:
+        chunks.append('\n\n'.join(current))
+    return chunks
+
+
+def spread(count: int, total: int) -> List[int]:
+    """
+    `count` indexes spread evenly over range(total), always including both ends
+    """
+    if count >= total:
+        return list(range(total))
+    if count <= 1:
+        return [0][:count]
+    return sorted({round(i * (total - 1) / (count - 1)) for i in range(count)})
+
+
+@dataclass
+class ContentWindow:
+    text: str
+    tokens: int
+    source_tokens: int
+    chunks_used: int
+    chunks_total: int
+    strategy: str
+
+    def stats(self) -> Dict[str, Any]:
+        return {key: value for key, value in asdict(self).items() if key != 'text'}
+
+
+def select_window(text: str, token_budget: int, chunk_tokens: int = 250,
+                  model: str = 'gpt-4o') -> ContentWindow:
+    """
+    Representative, boilerplate-free excerpt of `text` within `token_budget`
+    """
+    cleaned = strip_boilerplate(text)
+    source_tokens = count_tokens(cleaned, model)
+    if source_tokens <= token_budget:
+        return ContentWindow(cleaned, source_tokens, source_tokens, 1, 1, 'full')
+
+    chunks = split_chunks(cleaned, chunk_tokens, model)
+    sizes = [count_tokens(chunk, model) for chunk in chunks]
+    gap_tokens = count_tokens(GAP_MARKER, model)
+
+    # Head and tail first, then widen the spread over the middle until the budget is spent
+    chosen: List[int] = []
+    for count in range(2, len(chunks) + 1):
+        candidate = spread(count, len(chunks))
+        if sum(sizes[i] for i in candidate) + gap_tokens * (len(candidate) - 1) > token_budget:
+            break
+        chosen = candidate
+    if not chosen:
+        chosen = [0]
+
+    parts = []
+    for position, index in enumerate(chosen):
+        if position and index != chosen[position - 1] + 1:
+            parts.append(GAP_MARKER)
+        elif position:
+            parts.append('\n\n')
+        parts.append(chunks[index])
+    window = ''.join(parts)
+
+    # A single oversized first chunk can still exceed the budget
+    tokens = count_tokens(window, model)
+    if tokens > token_budget:
+        window = window[:token_budget * len(window) // tokens]
+        tokens = count_tokens(window, model)
+
+    return ContentWindow(window, tokens, source_tokens, len(chosen), len(chunks), 'excerpt')
+
+
+def map_reduce_window(text: str, token_budget: int, summarize: Callable[[str], str],
+                      map_chunk_tokens: int, max_map_chunks: int = 16, chunk_tokens: int = 250,
+                      max_workers: int = 4, model: str = 'gpt-4o') -> ContentWindow:
+    """
+    Summarise large chunks of `text` independently, then window the summaries
+
+    At most `max_map_chunks` chunks are summarised (spread evenly over the
+    document) so prompt latency stays bounded however long the document is.
+    """
+    cleaned = strip_boilerplate(text)
+    source_tokens = count_tokens(cleaned, model)
+    chunks = split_chunks(cleaned, map_chunk_tokens, model)
+    selected = [chunks[i] for i in spread(max_map_chunks, len(chunks))]
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='map') as executor:
+        summaries = list(executor.map(summarize, selected))
+
+    reduced = select_window('\n\n'.join(summaries), token_budget, chunk_tokens, model)
+    return ContentWindow(reduced.text, reduced.tokens, source_tokens, len(selected), len(chunks), 'map_reduce')
+
+
+def build_window(text: str, token_budget: int, chunk_tokens: int = 250,
+                 map_reduce_tokens: int = 0, summarize: Optional[Callable[[str], str]] = None,
+                 map_chunk_tokens: int = 3000, max_map_chunks: int = 16,
+                 model: str = 'gpt-4o') -> ContentWindow:
+    """
+    Pick the content window for a document, map-reducing when it is longer
+    than `map_reduce_tokens` (0 disables map-reduce)
+    """
+    if map_reduce_tokens and summarize is not None and count_tokens(text, model) > map_reduce_tokens:
+        return map_reduce_window(text, token_budget, summarize, map_chunk_tokens,
+                                 max_map_chunks=max_map_chunks, chunk_tokens=chunk_tokens, model=model)
+    return select_window(text, token_budget, chunk_tokens, model)